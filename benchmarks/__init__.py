@@ -0,0 +1 @@
+"""Benchmark offline (fixture registrate o sintetiche) per data layer e modelli."""
@@ -0,0 +1,150 @@
+"""Prova di carico offline dell'API JSON (valutatore.api): latenze p50 / p99.
+
+    python -m benchmarks.api                                   # fixture locali, 8 client, 2000 richieste
+    python -m benchmarks.api --clients 32 --requests 5000 --latency 0.05 --out api.json
+
+Il server gira in questo processo su una porta libera, con LocalProvider sulle
+fixture (`--latency` simula la rete al primo caricamento di ogni ticker) e una
+cache su disco vuota. Il carico mescola richieste ripetute (risposte in cache),
+parametri nuovi (solo calcolo) e batch; ogni client tiene una connessione aperta.
+I valori restituiti si confrontano con value_company chiamato direttamente.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from valutatore.api import ValuationService, make_server
+from valutatore.bundle import fetch_bundle
+from valutatore.data import company_data, multiples_from_bundle
+from valutatore.provider import LocalProvider
+from valutatore.store import FundamentalsStore
+from valutatore.valuation import ValuationParams, value_company
+
+from . import fixtures
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_FIXTURES = HERE / "fixtures"
+GROWTHS = (0.02, 0.04, 0.06, 0.08, 0.10)
+
+
+def workload(tickers, n, seed=0):
+    """(metodo, percorso, corpo) per `n` richieste: 70% GET ripetute, 20% parametri variati, 10% batch."""
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        r = rng.random()
+        t = rng.choice(tickers)
+        if r < 0.7:
+            out.append(("GET", f"/value/{t}", None))
+        elif r < 0.9:
+            out.append(("GET", f"/value/{t}?g_fcf={rng.choice(GROWTHS)}&rf={rng.choice((0.03, 0.035, 0.04))}", None))
+        else:
+            reqs = [{"ticker": rng.choice(tickers), "params": {"g_fcf": rng.choice(GROWTHS)}} for _ in range(10)]
+            out.append(("POST", "/value", json.dumps({"requests": reqs})))
+    return out
+
+
+def client(host, port, jobs, lat, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    for method, path, body in jobs:
+        t = time.perf_counter()
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"} if body else {})
+        resp = conn.getresponse()
+        data = resp.read()
+        lat.append((path.split("?")[0].split("/")[1] + (" batch" if body else ""), time.perf_counter() - t))
+        if resp.status != 200:
+            errors.append(f"{resp.status} {path}: {data[:200]!r}")
+    conn.close()
+
+
+def pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(q / 100 * (len(xs) - 1))))] if xs else None
+
+
+def check(service, provider, tickers):
+    """Le risposte dell'API coincidono con value_company (stessi dati, stessi parametri)?"""
+    diffs = []
+    p = ValuationParams(g_fcf=0.08)
+    for t in tickers:
+        B = fetch_bundle(t, provider=provider)
+        D = company_data(B)
+        if D.price is None:
+            continue
+        exp = value_company(D, multiples_from_bundle(B, D.shares) if D.shares else {}, p)
+        got = service.value(t, {"g_fcf": 0.08})
+        for k, v in exp.items():
+            g = got.get(k)
+            if isinstance(v, float) and v == v:
+                if g is None or abs(g - v) > 1e-9 * max(1.0, abs(v)):
+                    diffs.append((t, k, v, g))
+            elif v != g and not (v != v and g is None):
+                diffs.append((t, k, v, g))
+    return diffs
+
+
+def run(fixtures_dir, clients, requests, latency):
+    tickers = sorted(p.name for p in fixtures_dir.iterdir() if p.is_dir() and "=" not in p.name)
+    provider = LocalProvider(fixtures_dir, latency=latency, jitter=latency / 2)
+    with tempfile.TemporaryDirectory() as cache:
+        service = ValuationService(FundamentalsStore(cache), provider)
+        server = make_server(service, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        jobs = workload(tickers, requests)
+        lat, errors = [], []
+        threads = [threading.Thread(target=client, args=(host, port, jobs[i::clients], lat, errors))
+                   for i in range(clients)]
+        t0 = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        wall = time.perf_counter() - t0
+        diffs = check(service, provider, tickers)
+        stats = service.stats()
+        server.shutdown()
+        server.server_close()
+    rows = []
+    for kind in sorted({k for k, _ in lat}) + ["tutte"]:
+        xs = [s for k, s in lat if kind in ("tutte", k)]
+        rows.append({"kind": kind, "n": len(xs), "p50_ms": pct(xs, 50) * 1e3, "p99_ms": pct(xs, 99) * 1e3,
+                     "mean_ms": statistics.fmean(xs) * 1e3, "max_ms": max(xs) * 1e3})
+    return {"clients": clients, "requests": requests, "latency_s": latency, "tickers": len(tickers),
+            "wall_s": wall, "req_per_s": requests / wall, "latencies": rows, "service": stats,
+            "errors": errors[:20], "diffs": [list(map(str, d)) for d in diffs[:20]]}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="benchmarks.api", description="Prova di carico offline dell'API JSON")
+    ap.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--latency", type=float, default=0.02, help="latenza simulata del provider, s (default 0.02)")
+    ap.add_argument("--out", type=Path, help="file JSON dei risultati (default: stdout)")
+    a = ap.parse_args(argv)
+    if not a.fixtures.exists():
+        fixtures.build(a.fixtures)
+    res = run(a.fixtures, a.clients, a.requests, a.latency)
+    text = json.dumps(res, indent=1, default=str)
+    if a.out:
+        a.out.write_text(text + "\n")
+    else:
+        print(text)
+    for r in res["latencies"]:
+        print(f"{r['kind']:<14} n={r['n']:<6} p50 {r['p50_ms']:>8.2f} ms  p99 {r['p99_ms']:>8.2f} ms  "
+              f"max {r['max_ms']:>8.2f} ms", file=sys.stderr)
+    print(f"{res['req_per_s']:.0f} richieste/s con {a.clients} client; servizio: {res['service']}", file=sys.stderr)
+    print(f"errori: {len(res['errors'])}, differenze da value_company: {len(res['diffs'])}", file=sys.stderr)
+    return 1 if res["errors"] or res["diffs"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
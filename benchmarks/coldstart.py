@@ -0,0 +1,143 @@
+"""Avvio a freddo: tempo di import e di prima pagina, ogni misura in un processo nuovo.
+
+    python -m benchmarks.coldstart                  # confronto con BUDGET, uscita 1 se sforato
+    python -m benchmarks.coldstart --repeat 5 --out coldstart.json
+
+Come un container appena avviato: niente moduli gia' importati, cache su disco vuota,
+dati dalle fixture locali (nessuna rete). I casi base girano col pre-riscaldamento
+spento (VALUTATORE_WARM=0), per misurare solo la pagina; i casi "(predefinito)"
+con la configurazione di default, in cui il warmer parte in un thread all'avvio.
+Oltre ai tempi controlla che il corso non importi pandas (solo col warmer spento:
+acceso, e' il suo thread a importare i motori) e che la prima valutazione non
+importi matplotlib.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+APP = ROOT / "app_streamlit_fundamental_analysis.py"
+FIXTURES = HERE / "fixtures"
+
+# secondi (mediana); "paint" = prima esecuzione completa dello script della pagina.
+# "(predefinito)" = stesso caso con il pre-riscaldamento acceso, come in produzione.
+# Mediane misurate su un container da 1 CPU (--repeat 5) piu' circa il 50% di margine:
+# "paint corso" oscilla fra 0.38 e 0.52 s senza modifiche al codice
+BUDGET = {
+    "import valutatore": 0.05,
+    "import motori": 1.0,
+    "paint corso": 0.8,
+    "paint valutazione": 2.0,
+    "paint valutazione AAPL": 3.0,
+    "paint corso (predefinito)": 0.8,
+    "paint valutazione AAPL (predefinito)": 3.0,
+}
+HEAVY = ("pandas", "numpy", "matplotlib", "yfinance")
+
+_IMPORT = """
+import json, sys, time
+t = time.perf_counter()
+{stmt}
+print(json.dumps({{"s": time.perf_counter() - t, "modules": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_PAINT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+section = {section!r}
+if section:
+    at.session_state["section"] = section
+t = time.perf_counter()
+at.run()
+ticker = {ticker!r}
+if ticker:
+    t = time.perf_counter()   # solo la valutazione, la pagina vuota e' la misura precedente
+    at.text_input[0].input(ticker).run()
+print(json.dumps({{"s": time.perf_counter() - t, "modules": [m for m in {heavy!r} if m in sys.modules],
+                  "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+CASES = {
+    "import valutatore": _IMPORT.format(stmt="import valutatore", heavy=HEAVY),
+    "import motori": _IMPORT.format(stmt="import valutatore.data, valutatore.batch, valutatore.surface", heavy=HEAVY),
+    "paint corso": _PAINT.format(app=str(APP), section=":books: Corso di finanza", ticker=None, heavy=HEAVY),
+    "paint valutazione": _PAINT.format(app=str(APP), section=None, ticker=None, heavy=HEAVY),
+    "paint valutazione AAPL": _PAINT.format(app=str(APP), section=None, ticker="AAPL", heavy=HEAVY),
+}
+CASES["paint corso (predefinito)"] = CASES["paint corso"]
+CASES["paint valutazione AAPL (predefinito)"] = CASES["paint valutazione AAPL"]
+WARM = {"paint corso (predefinito)", "paint valutazione AAPL (predefinito)"}   # warmer acceso (default dell'app)
+# moduli che NON devono comparire (numpy no: lo importa Streamlit stesso per l'icona della pagina).
+# Il corso senza pandas vale solo a warmer spento: acceso, il suo thread importa i motori
+# (non la pagina: il tempo resta nel budget del caso predefinito)
+FORBIDDEN = {"paint corso": ("pandas", "matplotlib"), "paint corso (predefinito)": ("matplotlib",),
+             "paint valutazione AAPL": ("matplotlib",), "paint valutazione AAPL (predefinito)": ("matplotlib",)}
+
+
+def measure(code, env):
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, timeout=300)
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if out.returncode or not lines:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else f"uscita {out.returncode}")
+    return json.loads(lines[-1])
+
+
+def run(repeat=3):
+    rows, problems = [], []
+    with tempfile.TemporaryDirectory() as cache:
+        for name, code in CASES.items():
+            env = dict(os.environ, VALUTATORE_WARM="0", VALUTATORE_PROVIDER=f"local:{FIXTURES}",
+                       PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+            if name in WARM:
+                env.pop("VALUTATORE_WARM")   # default dell'app
+            times, last = [], {}
+            for i in range(repeat):
+                env["VALUTATORE_CACHE_DIR"] = str(Path(cache) / f"{len(rows)}-{i}")   # cache vuota ogni volta
+                last = measure(code, env)
+                times.append(last["s"])
+            med = statistics.median(times)
+            row = {"name": name, "repeat": repeat, "median_s": med, "min_s": min(times), "budget_s": BUDGET[name],
+                   "modules": last["modules"]}
+            rows.append(row)
+            if med > BUDGET[name]:
+                problems.append(f"{name}: {med:.3f}s oltre il budget di {BUDGET[name]:.3f}s")
+            bad = [m for m in FORBIDDEN.get(name, ()) if m in last["modules"]]
+            if bad:
+                problems.append(f"{name}: importa {', '.join(bad)}")
+            if last.get("exceptions"):
+                problems.append(f"{name}: eccezioni {last['exceptions']}")
+    return rows, problems
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="benchmarks.coldstart", description="Avvio a freddo della pagina")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--out", type=Path, help="file JSON dei risultati (default: stdout)")
+    a = ap.parse_args(argv)
+    if not FIXTURES.exists():
+        from . import fixtures
+        fixtures.build(FIXTURES)
+    rows, problems = run(a.repeat)
+    text = json.dumps({"budget": BUDGET, "results": rows, "problems": problems}, indent=1)
+    if a.out:
+        a.out.write_text(text + "\n")
+    else:
+        print(text)
+    w = max(len(r["name"]) for r in rows) + 1
+    for r in rows:
+        print(f"{r['name']:<{w}} {r['median_s']:>8.3f} s  (budget {r['budget_s']:.2f} s)  "
+              f"{', '.join(r['modules']) or '-'}", file=sys.stderr)
+    for p in problems:
+        print("PROBLEMA: " + p, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import pickle
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from valutatore.batch import PRESET
+from valutatore.bundle import CompanyBundle, fetch_bundle
+from valutatore.provider import YahooProvider, save_fixture
+from valutatore.quarterly import FLOWS, QUARTERLY
+
+# =============================================================
+#  FIXTURE PER I BENCHMARK (formato di LocalProvider)
+#  Universo rappresentativo: l'elenco PRESET piu' tre gruppi che
+#  stressano i casi limite del data layer e dei modelli:
+#    loss -> societa' in perdita (FCF ed EBIT negativi, niente dividendi)
+#    bank -> banche (niente EBIT/EBITDA, debito molto alto, dividendi alti)
+#    fx   -> prezzo in una valuta, bilanci in un'altra
+#  Due sorgenti:
+#    build()  -> dati sintetici deterministici (seme = ticker), nessuna rete,
+#                con 6 trimestrali coerenti con l'ultimo esercizio (base TTM)
+#    record() -> dati veri registrati da Yahoo con save_fixture
+# =============================================================
+
+UNIVERSE = {
+    "preset": list(PRESET.values()),
+    "loss": ["RIVN", "LCID", "PLUG"],
+    "bank": ["JPM", "BNP.PA", "UCG.MI"],
+    "fx": ["TSM", "BABA", "NVO"],
+}
+
+# valuta di bilancio dei titoli "fx" e cambio (unita' per 1 USD)
+FX_REPORTING = {"TSM": ("TWD", 32.0), "BABA": ("CNY", 7.2), "NVO": ("DKK", 6.9)}
+
+HISTORY_END = pd.Timestamp("2026-09-30")
+FISCAL_YEARS = (2025, 2024, 2023, 2022)
+QUARTER_ENDS = tuple(pd.Timestamp(d) for d in ("2026-06-30", "2026-03-31", "2025-12-31", "2025-09-30",
+                                                "2025-06-30", "2025-03-31"))
+
+
+def all_tickers(universe=UNIVERSE):
+    return [t for group in universe.values() for t in group]
+
+
+def profile_of(symbol, universe=UNIVERSE):
+    for group, tickers in universe.items():
+        if symbol in tickers:
+            return group
+    return "preset"
+
+
+def _market(symbol):
+    """(valuta del prezzo, fuso orario della borsa) dal suffisso del ticker."""
+    if symbol.endswith(".MI") or symbol.endswith(".PA"):
+        return "EUR", "Europe/Rome" if symbol.endswith(".MI") else "Europe/Paris"
+    if symbol.endswith(".SW"):
+        return "CHF", "Europe/Zurich"
+    return "USD", "America/New_York"
+
+
+def _statement(rows, dates):
+    """DataFrame nel formato yfinance: righe = voci, colonne = date di chiusura (dalla piu' recente)."""
+    return pd.DataFrame({d: [float(v[i]) for v in rows.values()] for i, d in enumerate(dates)}, index=list(rows))
+
+
+def synthetic_bundle(symbol, profile=None):
+    """Bundle sintetico deterministico con la forma dei dati di Yahoo."""
+    profile = profile or profile_of(symbol)
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    ccy, tz = _market(symbol)
+    fin_ccy, fx = FX_REPORTING.get(symbol, (ccy, 1.0)) if profile == "fx" else (ccy, 1.0)
+    dates = [pd.Timestamp(f"{y}-12-31") for y in FISCAL_YEARS]
+    k = len(dates)
+
+    shares = float(rng.uniform(2e8, 1.5e10))
+    growth = rng.uniform(-0.02, 0.15)
+    rev = rng.uniform(5e9, 3e11) * fx * (1 + growth) ** -np.arange(k) * rng.normal(1, 0.03, k)
+
+    if profile == "loss":
+        ebit = rev * rng.uniform(-0.35, -0.05, k)
+        ebitda = ebit + 0.08 * rev
+        pretax = ebit * 1.05
+        tax = np.zeros(k)
+        ni = pretax
+        cfo = ni * rng.uniform(0.4, 0.8, k)
+        capex = -rev * rng.uniform(0.10, 0.20, k)
+        debt, cash, equity = 0.6 * rev, 0.8 * rev, 1.2 * rev
+        dps_y = 0.0
+    elif profile == "bank":
+        pretax = rev * rng.uniform(0.30, 0.40, k)
+        tax = pretax * rng.uniform(0.20, 0.28, k)
+        ni = pretax - tax
+        ebit = ebitda = None
+        cfo = ni * rng.normal(1.0, 1.5, k)   # flussi di una banca: volatili, anche negativi
+        capex = -rev * 0.02 * np.ones(k)
+        debt, cash, equity = 3.0 * rev, 1.5 * rev, 2.0 * rev
+        dps_y = 0.6 * ni[0] / shares / fx
+    else:
+        margin = rng.uniform(0.10, 0.35)
+        ebit = rev * margin * rng.normal(1, 0.05, k)
+        ebitda = ebit + 0.05 * rev
+        pretax = ebit * 0.95
+        tax = pretax * rng.uniform(0.15, 0.25, k)
+        ni = pretax - tax
+        cfo = ni * rng.uniform(1.0, 1.3, k)
+        capex = -rev * rng.uniform(0.03, 0.10, k)
+        debt, cash, equity = 0.3 * rev, 0.15 * rev, 0.6 * rev
+        dps_y = (rng.uniform(0.2, 0.6) * ni[0] / shares / fx) if rng.random() < 0.6 else 0.0
+
+    inc = {"Total Revenue": rev}
+    if ebit is not None:
+        inc.update({"EBIT": ebit, "EBITDA": ebitda})
+    inc.update({"Net Income": ni, "Pretax Income": pretax, "Tax Provision": tax,
+                "Interest Expense": 0.01 * rev, "Diluted EPS": ni / shares})
+    bs = {"Total Debt": debt, "Cash And Cash Equivalents": cash, "Stockholders Equity": equity,
+          "Share Issued": np.full(k, shares)}
+    cf = {"Operating Cash Flow": cfo, "Capital Expenditure": capex, "Free Cash Flow": cfo + capex}
+
+    # prezzo: passeggiata casuale riscalata su un multiplo plausibile dell'ultimo anno
+    idx = pd.bdate_range(end=HISTORY_END, periods=252 * 6).tz_localize(tz)
+    path = np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(idx))))
+    if profile == "loss":
+        target = rng.uniform(1.0, 6.0) * rev[0] / shares / fx
+    elif profile == "bank":
+        target = rng.uniform(7.0, 12.0) * ni[0] / shares / fx
+    else:
+        target = rng.uniform(12.0, 35.0) * ni[0] / shares / fx
+    close = path * target / path[-1]
+    div = np.zeros(len(idx))
+    if dps_y:
+        div[len(idx) - 1 - 63 * np.arange(24)] = dps_y / 4   # trimestrale, dalla fine all'indietro
+    hist = pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Volume": rng.integers(1e5, 5e7, len(idx)), "Dividends": div,
+                         "Stock Splits": 0.0}, index=idx)
+
+    fxs = None
+    if fin_ccy != ccy:   # cambio valuta di bilancio -> prezzo: ~1/fx con una lieve deriva (seme = coppia)
+        pair = f"{fin_ccy}{ccy}=X"
+        frng = np.random.default_rng(zlib.crc32(pair.encode()))
+        fidx = pd.bdate_range(end=HISTORY_END, periods=252 * 10)
+        fxs = pd.Series(np.exp(np.cumsum(frng.normal(0, 0.004, len(fidx)))) / fx, index=fidx, name=pair)
+
+    price = float(close[-1])
+    info = {"shortName": f"{symbol} (sintetico)", "sector": {"bank": "Financial Services"}.get(profile, "Technology"),
+            "currency": ccy, "financialCurrency": fin_ccy, "currentPrice": price,
+            "sharesOutstanding": shares, "marketCap": price * shares, "beta": float(rng.uniform(0.6, 1.6)),
+            "trailingEps": float(ni[0] / shares / fx), "forwardEps": float(ni[0] * (1 + growth) / shares / fx),
+            "bookValue": float(equity[0] / shares / fx), "dividendRate": float(dps_y) or None}
+    return CompanyBundle(symbol, info, income_stmt=_statement(inc, dates), balance_sheet=_statement(bs, dates),
+                         cashflow=_statement(cf, dates), history=hist, fx=fxs)
+
+
+def synthetic_quarters(B):
+    """Prospetti trimestrali (formato yfinance) coerenti col bundle annuale: i 4 trimestri
+    del 2025 sommano all'esercizio 2025, il 2026 cresce su quelli dell'anno prima."""
+    rng = np.random.default_rng(zlib.crc32(f"{B.symbol}:q".encode()))
+    w = rng.uniform(0.8, 1.2, 4)
+    w = w / w.sum()
+    g = 1 + rng.uniform(-0.05, 0.12)
+    flows = {n for names in FLOWS.values() for n in names}
+    out = {}
+    for kind, qkind in QUARTERLY.items():
+        df = getattr(B, kind)
+        last = df.iloc[:, 0]
+        rows = {}
+        for item, v in last.items():
+            if kind == "balance_sheet":
+                rows[item] = v * rng.normal(1, 0.03, len(QUARTER_ENDS))
+            elif item in flows or item == "Free Cash Flow":
+                q25 = v * w[::-1]                               # 2025: Q4, Q3, Q2, Q1
+                rows[item] = np.concatenate([q25[2:] * g, q25])  # 2026: Q2, Q1
+        out[qkind] = _statement(rows, QUARTER_ENDS)
+    return out
+
+
+def build(directory, universe=UNIVERSE):
+    """Scrive le fixture sintetiche di tutto l'universo in `directory`."""
+    for group, tickers in universe.items():
+        for t in tickers:
+            B = synthetic_bundle(t, group)
+            save_fixture(B, directory)
+            for kind, df in synthetic_quarters(B).items():
+                with open(Path(directory) / t.upper() / f"{kind}.pkl", "wb") as fh:
+                    pickle.dump(df, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return Path(directory)
+
+
+def record(directory, tickers=None, provider=None):
+    """Registra dati veri da Yahoo (serve la rete). Ritorna i ticker non registrati."""
+    provider = provider or YahooProvider()
+    missing = []
+    for t in tickers or all_tickers():
+        B = fetch_bundle(t, provider=provider)
+        if not B.info or B.history is None or B.history.empty:
+            missing.append(t)
+            continue
+        save_fixture(B, directory)
+    return missing
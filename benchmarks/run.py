@@ -0,0 +1,242 @@
+"""Benchmark offline del data layer e dei modelli.
+
+    python -m benchmarks.run                        # fixture sintetiche, confronto con baseline.json
+    python -m benchmarks.run --out bench.json       # risultati in JSON (per confronti fra release)
+    python -m benchmarks.run --update-baseline      # riscrive i valori attesi
+    python -m benchmarks.run --record --fixtures D  # registra dati veri da Yahoo in D (serve la rete)
+
+Uscita 0 se tutti i valori coincidono con la baseline, 1 altrimenti.
+"""
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import valutatore
+from valutatore.batch import value_universe
+from valutatore.data import historical_multiples, load_company
+from valutatore.models import dcf_fcff, fcf_base, kd_auto, net_debt, reverse_dcf_growth, wacc
+from valutatore.provider import LocalProvider
+from valutatore.record import CompanyTable, value_table
+from valutatore.surface import sensitivity_grid, sensitivity_surface
+from valutatore.valuation import ValuationParams, value_company
+
+from . import fixtures
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_FIXTURES = HERE / "fixtures"
+BASELINE = HERE / "baseline.json"
+REL_TOL, ABS_TOL = 1e-9, 1e-9
+
+# =============================================================
+#  MISURA
+# =============================================================
+def bench(name, fn, ops, repeat):
+    """Esegue fn() `repeat` volte (dopo un giro di riscaldamento); `ops` = operazioni per giro."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    best, med = min(times), statistics.median(times)
+    return {"name": name, "ops": ops, "repeat": repeat, "min_s": best, "median_s": med,
+            "mean_s": statistics.fmean(times), "per_op_us": med / ops * 1e6, "ops_per_s": ops / med}
+
+
+def model_inputs(D, p):
+    """Gli stessi input che value_company passa ai modelli DCF."""
+    kd = p.kd if p.kd is not None else round(min(max(kd_auto(D)*100, 1.0), 12.0), 1)/100
+    w = wacc(D["beta"], p.rf, p.erp, kd, D["tax_rate"], D["mktcap"] or 0, D["total_debt"] or 0)
+    return fcf_base(D, p.use_norm), w, net_debt(D), D["shares"]
+
+# =============================================================
+#  VALORI DI CONFRONTO
+# =============================================================
+def _clean(v):
+    if isinstance(v, (np.floating, np.integer)):
+        v = v.item()
+    if isinstance(v, float) and not math.isfinite(v):
+        return None
+    return v
+
+
+def snapshot(D, HM, row, grid):
+    out = {k: _clean(D[k]) for k in ("price", "shares", "mktcap", "tax_rate", "fcf", "fcf_norm", "dps",
+                                      "total_debt", "cash", "currency", "fin_currency")}
+    out.update({f"hm {k}": [_clean(v[0]), v[1]] for k, v in HM.items()})
+    out.update({k: _clean(v) for k, v in row.items() if k not in ("name", "sector")})
+    out["sensitivity"] = [_clean(v) for v in np.asarray(grid.fair_value).ravel()] if grid is not None else None
+    return out
+
+
+def snapshot_ttm(D, HM):
+    """Valori su base TTM (trimestrali delle fixture)."""
+    out = {k: _clean(D[k]) for k in ("revenue", "ebit", "net_income", "fcf", "fcf_norm", "tax_rate",
+                                      "total_debt", "cash", "equity_bv", "basis")}
+    out.update({f"hm {k}": [_clean(v[0]), v[1]] for k, v in HM.items()})
+    return out
+
+
+def compare(expected, actual, path=""):
+    """Lista delle differenze (percorso, atteso, ottenuto)."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        diffs = []
+        for k in sorted(set(expected) | set(actual)):
+            diffs += compare(expected.get(k), actual.get(k), f"{path}/{k}")
+        return diffs
+    if isinstance(expected, list) and isinstance(actual, list) and len(expected) == len(actual):
+        return [d for i, (e, a) in enumerate(zip(expected, actual)) for d in compare(e, a, f"{path}[{i}]")]
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)) \
+            and not isinstance(expected, bool) and not isinstance(actual, bool):
+        return [] if math.isclose(expected, actual, rel_tol=REL_TOL, abs_tol=ABS_TOL) else [(path, expected, actual)]
+    return [] if expected == actual else [(path, expected, actual)]
+
+# =============================================================
+#  SUITE
+# =============================================================
+def run(fixture_dir, repeat=5, model_ops=2000):
+    prov = LocalProvider(fixture_dir)
+    tickers = fixtures.all_tickers()
+    p = ValuationParams()
+
+    D = {t: load_company(t, provider=prov) for t in tickers}
+    HM = {t: historical_multiples(t, D[t]["shares"], provider=prov) if D[t]["shares"] else {} for t in tickers}
+    inputs = {t: model_inputs(D[t], p) for t in tickers if D[t]["price"] is not None}
+    rows = {t: value_company(D[t], HM[t], p) for t in inputs}
+
+    values = {}
+    for t in tickers:
+        grid = None
+        if t in inputs:
+            fcf0, w, nd, sh = inputs[t]
+            grid = sensitivity_grid(fcf0, p.g_fcf, p.years, p.term_g, w, nd, sh) if (fcf0 and sh) else None
+        values[t] = snapshot(D[t], HM[t], rows.get(t, {}), grid)
+
+    T = {t: load_company(t, provider=prov, basis="ttm") for t in tickers}
+    for t in tickers:
+        HT = historical_multiples(t, T[t]["shares"], provider=prov, basis="ttm") if T[t]["shares"] else {}
+        values[t]["ttm"] = snapshot_ttm(T[t], HT)
+
+    # la valutazione batch deve dare le stesse righe della valutazione titolo per titolo
+    batch_rows = {r["symbol"]: r for r in value_universe(tickers, p, provider=prov, max_workers=8)}
+    batch_diffs = [d for t in rows for d in compare({k: _clean(v) for k, v in rows[t].items()},
+                                                     {k: _clean(v) for k, v in batch_rows.get(t, {}).items()},
+                                                     f"batch/{t}")]
+    # ... e cosi' la valutazione vettoriale sulla tabella colonnare
+    table = CompanyTable.from_records([D[t] for t in inputs], [HM[t] for t in inputs])
+    table_rows = {r["symbol"]: r for r in value_table(table, p).to_dict("records")}
+    batch_diffs += [d for t in rows for d in compare({k: _clean(v) for k, v in rows[t].items()},
+                                                      {k: _clean(v) for k, v in table_rows.get(t, {}).items()},
+                                                      f"table/{t}")]
+
+    calls = list(inputs.values())
+    n = len(tickers)
+    sweep = [(fcf0, p.g_fcf + 0.01 * (i % 7), p.years, p.term_g, w, nd, sh)
+             for i in range(model_ops // max(len(calls), 1)) for fcf0, w, nd, sh in calls]
+    rev_args = [(D[t]["price"], *inputs[t]) for t in inputs]
+
+    def loop_dcf():
+        for a in sweep:
+            dcf_fcff(*a)
+
+    def loop_reverse():
+        for price, fcf0, w, nd, sh in rev_args:
+            reverse_dcf_growth(price, fcf0, p.years, p.term_g, w, nd, sh)
+
+    def loop_grid():
+        for fcf0, w, nd, sh in calls:
+            if fcf0 and sh:
+                sensitivity_grid(fcf0, p.g_fcf, p.years, p.term_g, w, nd, sh)
+
+    def loop_surface():
+        for fcf0, w, nd, sh in calls:
+            if fcf0 and sh:
+                sensitivity_surface(fcf0, {"wacc": w, "term_g": p.term_g, "g_fcf": p.g_fcf, "years": p.years},
+                                    nd, sh, "wacc", "term_g", n=120)
+
+    results = [
+        bench("load_company", lambda: [load_company(t, provider=prov) for t in tickers], n, repeat),
+        bench("load_company ttm", lambda: [load_company(t, provider=prov, basis="ttm") for t in tickers], n, repeat),
+        bench("historical_multiples",
+              lambda: [historical_multiples(t, D[t]["shares"], provider=prov) for t in tickers if D[t]["shares"]],
+              sum(1 for t in tickers if D[t]["shares"]), repeat),
+        bench("dcf_fcff", loop_dcf, len(sweep), repeat),
+        bench("reverse_dcf_growth", loop_reverse, len(rev_args), repeat),
+        bench("sensitivity_grid 5x5", loop_grid, len(calls), repeat),
+        bench("sensitivity_surface 120x120", loop_surface, len(calls), repeat),
+        bench("value_table", lambda: value_table(table, p), len(table), repeat),
+        bench("value_universe", lambda: list(value_universe(tickers, p, provider=prov, max_workers=8)), n, repeat),
+    ]
+    return results, values, batch_diffs
+
+
+def meta(fixture_dir):
+    return {"valutatore": getattr(valutatore, "__version__", None) or _dist_version(),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "machine": platform.machine(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "fixtures": str(fixture_dir),
+            "tickers": fixtures.all_tickers()}
+
+
+def _dist_version():
+    try:
+        from importlib.metadata import version
+        return version("valutatore")
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="benchmarks.run", description="Benchmark offline di valutatore")
+    ap.add_argument("--fixtures", type=Path, default=DEFAULT_FIXTURES, help="cartella fixture (formato LocalProvider)")
+    ap.add_argument("--rebuild", action="store_true", help="rigenera le fixture sintetiche")
+    ap.add_argument("--record", action="store_true", help="registra dati veri da Yahoo nella cartella fixture")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out", type=Path, help="file JSON dei risultati (default: stdout)")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    a = ap.parse_args(argv)
+
+    if a.record:
+        missing = fixtures.record(a.fixtures)
+        if missing:
+            print("non registrati: " + ", ".join(missing), file=sys.stderr)
+    elif a.rebuild or not a.fixtures.exists():
+        fixtures.build(a.fixtures)
+
+    results, values, batch_diffs = run(a.fixtures, a.repeat)
+
+    if a.update_baseline:
+        a.baseline.write_text(json.dumps(values, indent=1, sort_keys=True) + "\n")
+        diffs = []
+    elif a.baseline.exists():
+        diffs = compare(json.loads(a.baseline.read_text()), values)
+    else:
+        print(f"baseline assente: {a.baseline} (usa --update-baseline)", file=sys.stderr)
+        diffs = []
+    diffs += batch_diffs
+
+    report = {"meta": meta(a.fixtures), "benchmarks": results,
+              "check": {"baseline": str(a.baseline), "tickers": len(values), "mismatches": len(diffs),
+                        "diffs": [{"path": p, "expected": e, "actual": v} for p, e, v in diffs[:200]]}}
+    text = json.dumps(report, indent=1, default=str)
+    if a.out:
+        a.out.write_text(text + "\n")
+    else:
+        print(text)
+    for r in results:
+        print(f"{r['name']:<28} {r['per_op_us']:>12.1f} us/op  {r['ops_per_s']:>12.0f} op/s", file=sys.stderr)
+    print(f"confronto baseline: {len(diffs)} differenze", file=sys.stderr)
+    return 1 if diffs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""Valutatore Aziende - motori di calcolo importabili senza Streamlit.
+
+I nomi pubblici si caricano al primo accesso (``valutatore.load_company`` importa solo
+valutatore.data e le sue dipendenze): importare il pacchetto o un suo modulo non
+trascina pandas, i motori di backtest o di snapshot se non servono."""
+import importlib
+
+# modulo -> nomi pubblici che esporta
+_EXPORTS = {
+    "api": ("ValuationService", "make_server", "serve"),
+    "backtest": ("backtest", "backtest_summary", "backtest_universe"),
+    "batch": ("PRESET", "read_tickers", "value_universe", "results_frame", "company_table"),
+    "bundle": ("CompanyBundle", "RequestCounter", "REQUESTS", "fetch_bundle", "fetch_bundle_async", "fetch_bundles"),
+    "data": ("load_company", "historical_multiples", "multiples_history", "MultipleHistory", "company_data",
+             "multiples_from_bundle", "multiple_history_from_bundle"),
+    "dcf": ("DCFResult", "dcf_kernel", "dcf_scalar"),
+    "models": ("wacc", "dcf_fcff", "dcf_diagnose", "reverse_dcf_growth", "ddm_gordon", "multiple_fv", "verdict"),
+    "solver": ("ImpliedResult", "implied_growth", "implied_growth_scalar", "implied_wacc", "implied_terminal_growth"),
+    "fx": ("FX", "FxRates", "fx_pair", "in_price_currency", "rates_at"),
+    "prices": ("PriceStore",),
+    "peers": ("PeerIndex", "build_peer_index", "current_multiples", "peer_default", "peer_index_path"),
+    "quarterly": ("quarter_frame", "merge_quarters", "ttm_values"),
+    "report": ("write_reports", "report_context", "render_html"),
+    "record": ("Company", "CompanyTable", "value_table"),
+    "provider": ("Provider", "YahooProvider", "LocalProvider", "ProviderError", "RateLimiter", "default_provider",
+                 "set_default_provider"),
+    "snapshot": ("Snapshot", "SnapshotProvider", "list_snapshots", "record_snapshot", "write_snapshot"),
+    "store": ("FundamentalsStore",),
+    "surface": ("Surface", "sensitivity_grid", "sensitivity_surface"),
+    "timing": ("TRACE", "Tracer", "span", "timed"),
+    "valuation": ("ValuationParams", "value_company"),
+}
+_MODULE = {name: mod for mod, names in _EXPORTS.items() for name in names}
+
+__all__ = list(_MODULE)
+
+
+def __getattr__(name):
+    mod = _MODULE.get(name)
+    if mod is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{mod}", __name__), name)
+    globals()[name] = value   # accessi successivi senza passare di qui
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,293 @@
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .batch import read_tickers
+from .bundle import fetch_bundle
+from .data import company_data, multiples_from_bundle
+from .valuation import ValuationParams, value_company
+
+log = logging.getLogger(__name__)
+
+# =============================================================
+#  API JSON DELLA VALUTAZIONE (solo libreria standard)
+#    GET  /value/AAPL?rf=0.04&g_fcf=0.08&multiples.P/E=15
+#    POST /value  {"ticker": "AAPL", "params": {...}}
+#                 {"requests": [{"ticker": ..., "params": {...}}, ...]}   (batch)
+#                 {"tickers": ["AAPL", "MSFT"], "params": {...}}          (stessi parametri)
+#    GET  /health, GET /stats
+#  Parametri = campi di ValuationParams, in decimali (rf 0.035 = 3,5%);
+#  "growth" e' un alias di g_fcf. Risposta: la stessa riga di value_company.
+#  Due livelli di memoria:
+#    dati societa'  (ticker, base) -> (Company, multipli storici), per `ttl`;
+#                   richieste concorrenti sullo stesso ticker aspettano un
+#                   solo caricamento (dietro c'e' anche la cache su disco)
+#    risposte       hash di (ticker, parametri) -> riga, LRU di `max_entries`
+#  Backend dati: quello di processo (VALUTATORE_PROVIDER, es. local:<fixture>
+#  per le prove di carico senza rete, vedi benchmarks/api.py).
+# =============================================================
+
+ALIASES = {"growth": "g_fcf"}
+FIELDS = {f.name: f for f in dataclasses.fields(ValuationParams)}
+MAX_BATCH = 500
+
+
+class BadRequest(ValueError):
+    """Richiesta non valida: risposta 400 con il messaggio."""
+
+
+def parse_params(raw):
+    """dict (JSON o query string) -> ValuationParams, con controllo di nomi e tipi."""
+    if raw is not None and not isinstance(raw, dict):
+        raise BadRequest("params: oggetto {nome: valore}")
+    raw = dict(raw or {})
+    mult = raw.pop("multiples", None) or {}
+    if not isinstance(mult, dict):
+        raise BadRequest("multiples: oggetto {multiplo: valore}")
+    kw, mult = {}, dict(mult)
+    for k, v in raw.items():
+        if k.startswith("multiples."):
+            mult[k[len("multiples."):]] = v
+            continue
+        name = ALIASES.get(k, k)
+        if name not in FIELDS or name == "multiples":
+            raise BadRequest(f"parametro sconosciuto: {k}")
+        try:
+            if name in ("basis", "multiple_default"):
+                kw[name] = str(v)
+            elif name == "use_norm":
+                kw[name] = v if isinstance(v, bool) else str(v).lower() in ("1", "true", "si", "yes")
+            elif name == "years":
+                kw[name] = int(v)
+            else:
+                kw[name] = None if v is None else float(v)
+        except (TypeError, ValueError):
+            raise BadRequest(f"valore non valido per {k}: {v!r}") from None
+    try:
+        kw["multiples"] = {str(k): float(v) for k, v in mult.items()}
+    except (TypeError, ValueError):
+        raise BadRequest("multipli non validi") from None
+    if kw.get("multiple_default", "hist") not in ("hist", "sector"):
+        raise BadRequest("multiple_default: hist oppure sector")
+    if kw.get("basis", "annual") not in ("annual", "ttm"):
+        raise BadRequest("basis: annual oppure ttm")
+    if not 1 <= kw.get("years", 7) <= 50:
+        raise BadRequest("years fra 1 e 50")
+    return ValuationParams(**kw)
+
+
+def params_key(symbol, p):
+    """Hash stabile di ticker + parametri (chiave della cache delle risposte)."""
+    blob = json.dumps([symbol, dataclasses.asdict(p)], sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()
+
+
+def _json_ready(v):
+    if isinstance(v, float) or hasattr(v, "dtype"):
+        v = float(v)
+        return v if math.isfinite(v) else None
+    return v
+
+
+class ValuationService:
+    """Valutazioni su richiesta con dati condivisi e risposte memorizzate (thread-safe)."""
+
+    def __init__(self, store=None, provider=None, peers=None, ttl=600, max_entries=4096, workers=16):
+        self.store, self.provider, self.peers = store, provider, peers
+        self.ttl, self.max_entries = ttl, max_entries
+        self._lock = threading.Lock()
+        self._companies = {}          # (ticker, base) -> (istante, (Company, multipli storici))
+        self._inflight = {}           # (ticker, base) -> concurrent.futures.Future
+        self._responses = OrderedDict()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="api")
+        self.counts = Counter()
+
+    # ---------- dati societa' (coalescenza) ----------
+    def company(self, symbol, basis="annual"):
+        key = (symbol, basis)
+        with self._lock:
+            hit = self._companies.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                self.counts["company_hit"] += 1
+                return hit[1]
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = concurrent.futures.Future()
+                self.counts["company_load"] += 1
+            else:
+                self.counts["company_coalesced"] += 1
+        if not owner:   # gia' in caricamento per un'altra richiesta: si aspetta quello
+            return fut.result()
+        try:
+            B = fetch_bundle(symbol, self.store, provider=self.provider, quarterly=basis == "ttm")
+            D = company_data(B, basis)
+            value = (D, multiples_from_bundle(B, D.shares, basis) if D.shares and D.price is not None else {})
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._companies[key] = (time.monotonic(), value)
+            self._inflight.pop(key, None)
+        fut.set_result(value)
+        return value
+
+    # ---------- valutazione ----------
+    def value(self, symbol, params=None):
+        """Riga di value_company per un ticker (dict pronto per JSON)."""
+        p = params if isinstance(params, ValuationParams) else parse_params(params)
+        symbol = symbol.strip().upper()
+        if not symbol:
+            raise BadRequest("ticker mancante")
+        key = params_key(symbol, p)
+        with self._lock:
+            hit = self._responses.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                self._responses.move_to_end(key)
+                self.counts["response_hit"] += 1
+                return hit[1]
+        D, HM = self.company(symbol, p.basis)
+        if D.price is None:
+            row = {"symbol": symbol, "name": D.name, "error": "prezzo non disponibile"}
+        else:
+            row = {k: _json_ready(v) for k, v in value_company(D, HM, p, self.peers).items()}
+        with self._lock:
+            self.counts["response_miss"] += 1
+            self._responses[key] = (time.monotonic(), row)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+        return row
+
+    def value_many(self, requests):
+        """[(ticker, parametri)] -> righe nello stesso ordine; i ticker si caricano in parallelo
+        e ogni ticker una volta sola anche se compare con parametri diversi."""
+        requests = [(t, p if isinstance(p, ValuationParams) else parse_params(p)) for t, p in requests]
+        if len(requests) > MAX_BATCH:
+            raise BadRequest(f"al massimo {MAX_BATCH} richieste per batch")
+
+        def one(req):
+            try:
+                return self.value(*req)
+            except BadRequest:
+                raise
+            except Exception as e:
+                return {"symbol": req[0].strip().upper(), "error": str(e) or type(e).__name__}
+        return list(self._pool.map(one, requests))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, companies=len(self._companies), responses=len(self._responses))
+
+    def clear(self):
+        with self._lock:
+            self._companies.clear()
+            self._responses.clear()
+
+
+# ---------- HTTP ----------
+def batch_from_body(body):
+    """Corpo JSON di POST /value -> [(ticker, parametri)]."""
+    if isinstance(body, list):
+        body = {"requests": body}
+    if not isinstance(body, dict):
+        raise BadRequest("corpo JSON: oggetto o lista")
+    if "requests" in body:
+        reqs = body["requests"]
+        if not isinstance(reqs, list) or not all(isinstance(r, dict) for r in reqs):
+            raise BadRequest("requests: lista di oggetti {ticker, params}")
+        return [(str(r.get("ticker") or r.get("symbol") or ""), r.get("params")) for r in reqs]
+    if "tickers" in body:
+        return [(t, body.get("params")) for t in read_tickers(body["tickers"])]
+    return [(str(body.get("ticker") or body.get("symbol") or ""), body.get("params"))]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    service = None            # ValuationService, assegnato da make_server
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # intestazioni e corpo in due write: senza, +40 ms con keep-alive
+    max_body = 1 << 20
+
+    def _send(self, code, payload, close=False):
+        data = json.dumps(payload, ensure_ascii=False, default=_json_ready).encode()
+        if close:   # corpo non letto: sulla connessione non si puo' piu' distinguere la richiesta successiva
+            self.close_connection = True
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if close:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, fn):
+        try:
+            self._send(200, fn())
+        except BadRequest as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            log.exception("errore su %s", self.path)
+            self._send(500, {"error": str(e) or type(e).__name__})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            return self._send(200, {"ok": True})
+        if url.path == "/stats":
+            return self._send(200, self.service.stats())
+        if url.path.startswith("/value/"):
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return self._handle(lambda: self.service.value_many([(unquote(url.path[len("/value/"):]), query)])[0])
+        self._send(404, {"error": "percorso sconosciuto"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/value":
+            return self._send(404, {"error": "percorso sconosciuto"}, close=True)
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            n = -1
+        if n < 0:
+            return self._send(400, {"error": "Content-Length non valido"}, close=True)
+        if n > self.max_body:
+            return self._send(413, {"error": "corpo troppo grande"}, close=True)
+
+        def run():
+            try:
+                body = json.loads(self.rfile.read(n) or b"{}")
+            except ValueError:
+                raise BadRequest("JSON non valido") from None
+            single = isinstance(body, dict) and "requests" not in body and "tickers" not in body
+            rows = self.service.value_many(batch_from_body(body))
+            return rows[0] if single else {"results": rows}
+        self._handle(run)
+
+    def log_message(self, fmt, *args):
+        log.debug("%s - " + fmt, self.address_string(), *args)
+
+
+def make_server(service, host="127.0.0.1", port=8000):
+    """Server HTTP (un thread per connessione) attorno a `service`; port=0 = porta libera."""
+    handler = type("Handler", (ApiHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(service, host="127.0.0.1", port=8000):
+    server = make_server(service, host, port)
+    log.info("API su http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
@@ -0,0 +1,248 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .bundle import fetch_bundles
+from .dcf import dcf_kernel
+from .fx import in_price_currency
+from .helpers import f
+from .models import MULTIPLE_FALLBACK, MULTIPLES, verdict
+from .provider import STATEMENTS
+from .valuation import ValuationParams
+
+# =============================================================
+#  BACKTEST PUNTO-NEL-TEMPO DEL FAIR VALUE
+#  Per ogni ticker e ogni data di bilancio annuale d:
+#    - data di valutazione t = d + ritardo di pubblicazione (default 90 giorni)
+#    - prezzo, dividendi ultimi 12 mesi e rendimenti futuri (1 e 3 anni)
+#      allineati con un solo merge_asof per ticker su tutto il pannello
+#    - stessi modelli della pagina con i soli dati noti a t: prospetti fino a d,
+#      FCF medio fino a d, multipli di default = mediana dei rapporti fino a d
+#  Tutti i modelli girano in forma vettoriale sull'intero pannello.
+#  Limite noto: il beta e' quello attuale (Yahoo non ne fornisce la storia).
+# =============================================================
+
+BUCKETS = tuple(verdict(u)[0] for u in (-50, -10, 0, 15, 50))   # dalla piu' cara alla piu' a sconto
+HORIZONS = (1, 3)
+
+
+def _col(P, *names):
+    """Prima voce disponibile fra `names`, data per data (NaN se nessuna)."""
+    out = pd.Series(np.nan, index=P.index)
+    for n in names:
+        if n in P:
+            out = out.fillna(pd.to_numeric(P[n], errors="coerce"))
+    return out
+
+
+ITEMS = ("Share Issued", "Ordinary Shares Number", "Total Revenue", "Operating Revenue", "EBITDA",
+         "Normalized EBITDA", "Net Income", "Net Income Common Stockholders", "Pretax Income", "Tax Provision",
+         "Interest Expense", "Interest Expense Non Operating", "Total Debt", "Long Term Debt", "Current Debt",
+         "Short Term Debt", "Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments",
+         "Stockholders Equity", "Total Equity Gross Minority Interest", "Operating Cash Flow",
+         "Cash Flow From Continuing Operating Activities", "Capital Expenditure", "Purchase Of PPE",
+         "Free Cash Flow", "Diluted EPS", "Basic EPS")
+_ITEMS = frozenset(ITEMS)
+
+
+def statement_panel(bundles):
+    """Una riga per (ticker, data di bilancio) con le voci dei tre prospetti usate dai modelli.
+    I prospetti si raccolgono in formato lungo e si ruotano una sola volta per tutto l'universo."""
+    syms, dates, items, values = [], [], [], []
+    for B in bundles:
+        for kind in STATEMENTS:
+            df = getattr(B, kind)
+            if df is None or df.empty:
+                continue
+            keep = np.fromiter((n in _ITEMS for n in df.index), bool, len(df.index))
+            if not keep.any():
+                continue
+            try:   # operazioni numpy dirette: su migliaia di prospetti l'indicizzazione pandas pesa
+                v = df.to_numpy(float, na_value=np.nan)[keep]
+            except (TypeError, ValueError):
+                v = df[keep].apply(pd.to_numeric, errors="coerce").to_numpy(float)
+            r, c = v.shape
+            cols = df.columns if isinstance(df.columns, pd.DatetimeIndex) else pd.to_datetime(df.columns)
+            if cols.tz is not None:
+                cols = cols.tz_localize(None)
+            syms.append(np.full(r * c, B.symbol, dtype=object))
+            items.append(np.repeat(df.index.to_numpy(object)[keep], c))
+            dates.append(np.tile(cols.values.astype("datetime64[ns]"), r))
+            values.append(v.ravel())
+    if not syms:
+        return pd.DataFrame(columns=["symbol", "date"])
+    L = pd.DataFrame({"symbol": np.concatenate(syms), "date": np.concatenate(dates),
+                      "item": np.concatenate(items), "value": np.concatenate(values)}).dropna(subset=["value"])
+    # stessa voce in piu' prospetti o ripetuta: vale la prima
+    W = L.drop_duplicates(["symbol", "date", "item"]).pivot(index=["symbol", "date"], columns="item", values="value")
+    return W.reset_index().rename_axis(columns=None).sort_values(["symbol", "date"], ignore_index=True)
+
+
+def price_panel(bundles):
+    """Chiusure e dividendi cumulati di tutti i ticker, in formato lungo."""
+    syms, dates, close, cumdiv = [], [], [], []
+    for B in bundles:
+        h = B.history
+        if h is None or h.empty or "Close" not in h:
+            continue
+        div = h["Dividends"].fillna(0).to_numpy(float) if "Dividends" in h else np.zeros(len(h))
+        syms.append(np.full(len(h), B.symbol, dtype=object))
+        dates.append(h.index.values.astype("datetime64[ns]"))   # storici gia' tz-naive (bundle / prices)
+        close.append(h["Close"].to_numpy(float))
+        cumdiv.append(np.cumsum(div))
+    if not syms:
+        return pd.DataFrame(columns=["symbol", "px_date", "close", "cumdiv"])
+    P = pd.DataFrame({"symbol": np.concatenate(syms), "px_date": np.concatenate(dates),
+                      "close": np.concatenate(close), "cumdiv": np.concatenate(cumdiv)}).dropna(subset=["close"])
+    return P.sort_values(["px_date", "symbol"], ignore_index=True)
+
+
+def _asof(left, prices, on, cols, prefix):
+    """Ultimo valore di `cols` alla data `on` (o subito prima), per ticker, in un solo passaggio."""
+    l = left[["symbol", on]].reset_index()
+    l[on] = l[on].astype("datetime64[ns]")   # stessa risoluzione delle date dei prezzi
+    l = l.sort_values(on)
+    r = prices[["symbol", "px_date"] + cols].rename(columns={c: prefix + c for c in cols})
+    m = pd.merge_asof(l, r, left_on=on, right_on="px_date", by="symbol", direction="backward")
+    return m.set_index("index").drop(columns=["symbol", on, "px_date"]).reindex(left.index)
+
+
+def _expanding_median(values, symbols, min_n=2):
+    """Mediana dei valori validi fino alla riga corrente, per ticker (NaN se meno di min_n)."""
+    g = values.groupby(symbols)
+    med = g.expanding().median().reset_index(level=0, drop=True).reindex(values.index)
+    n = g.expanding().count().reset_index(level=0, drop=True).reindex(values.index)
+    return med.where(n >= min_n)
+
+
+def backtest(bundles, params=None, lag_days=90, horizons=HORIZONS):
+    """Fair value punto-nel-tempo per ogni (ticker, data di bilancio), con rendimenti futuri.
+    Ritorna un DataFrame: una riga per valutazione, colonne fv per modello, upside, verdict, ret_<h>y."""
+    p = params or ValuationParams()
+    bundles = [in_price_currency(B) for B in bundles]   # bilanci nella valuta del prezzo
+    S = statement_panel(bundles)
+    P = price_panel(bundles)
+    if S.empty or P.empty:
+        return pd.DataFrame()
+    info = {B.symbol: B.info or {} for B in bundles}
+    last_px = P.groupby("symbol")["px_date"].max()
+
+    out = pd.DataFrame({"symbol": S["symbol"], "date": S["date"]})
+    out["val_date"] = out["date"] + pd.Timedelta(days=lag_days)
+    out = out[out["val_date"] <= out["symbol"].map(last_px)].copy()
+    S = S.loc[out.index]
+
+    # ---------- prezzi allineati (prezzo a d per i multipli, a t per la valutazione) ----------
+    at_d = _asof(out, P, "date", ["close"], "d_")
+    at_t = _asof(out, P, "val_date", ["close", "cumdiv"], "t_")
+    out["price"] = at_t["t_close"]
+    out["div_1y"] = at_t["t_cumdiv"] - _asof(out.assign(back=out["val_date"] - pd.DateOffset(years=1)),
+                                             P, "back", ["cumdiv"], "b_")["b_cumdiv"].fillna(0)
+    for h in horizons:
+        fwd = out["val_date"] + pd.DateOffset(years=h)
+        ok = fwd <= out["symbol"].map(last_px)
+        px = _asof(out.assign(fwd=fwd), P, "fwd", ["close"], "f_")["f_close"]
+        out[f"ret_{h}y"] = (px / out["price"] - 1).where(ok)
+
+    # ---------- dati di bilancio a d ----------
+    sym = out["symbol"]
+    shares_now = sym.map(lambda s: f(info[s].get("sharesOutstanding")))
+    shares = _col(S, "Share Issued", "Ordinary Shares Number").fillna(shares_now)
+    revenue = _col(S, "Total Revenue", "Operating Revenue")
+    ebitda = _col(S, "EBITDA", "Normalized EBITDA")
+    net_inc = _col(S, "Net Income", "Net Income Common Stockholders")
+    pretax = _col(S, "Pretax Income")
+    tax_prov = _col(S, "Tax Provision")
+    interest = _col(S, "Interest Expense", "Interest Expense Non Operating").abs()
+    debt = _col(S, "Total Debt")
+    debt = debt.fillna((_col(S, "Long Term Debt").fillna(0) + _col(S, "Current Debt", "Short Term Debt").fillna(0))
+                       .replace(0, np.nan))
+    cash = _col(S, "Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments")
+    equity = _col(S, "Stockholders Equity", "Total Equity Gross Minority Interest")
+    cfo = _col(S, "Operating Cash Flow", "Cash Flow From Continuing Operating Activities")
+    capex = _col(S, "Capital Expenditure", "Purchase Of PPE")
+    fcf = _col(S, "Free Cash Flow").fillna(cfo + capex)
+    fcf_norm = (cfo + capex).groupby(sym).expanding().mean().reset_index(level=0, drop=True).reindex(out.index)
+
+    tr = tax_prov / pretax.replace(0, np.nan)
+    tax = tr.where((tr >= 0) & (tr <= 0.40), 0.25)
+
+    # ---------- costo del capitale (come la pagina) ----------
+    price = out["price"]
+    beta = pd.Series(p.beta, index=out.index) if p.beta is not None else \
+        sym.map(lambda s: f(info[s].get("beta")) or 1.0)
+    kd = pd.Series(p.kd, index=out.index) if p.kd is not None else \
+        ((interest / debt).where((interest > 0) & (debt > 0), 0.05) * 100).clip(1.0, 12.0).round(1) / 100
+    ke = p.rf + beta * p.erp
+    e = (price * shares).fillna(0)
+    d = debt.fillna(0)
+    v = e + d
+    out["wacc"] = np.where(v <= 0, ke, ke * e / v.where(v > 0) + kd * (1 - tax) * d / v.where(v > 0))
+    out["ke"] = ke
+
+    # ---------- modelli ----------
+    nd = d - cash.fillna(0)
+    fcf0 = fcf_norm.where(p.use_norm & fcf_norm.notna() & (fcf_norm != 0), fcf)
+    out["fcf_base"] = fcf0
+    ok = fcf0.notna() & (shares > 0) & (out["wacc"] > p.term_g)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dcf = dcf_kernel(fcf0.to_numpy(float), p.g_fcf, p.years, p.term_g, out["wacc"].to_numpy(float),
+                         nd.to_numpy(float), shares.to_numpy(float)).fair_value
+    fv = {"DCF - FCFF": pd.Series(dcf, index=out.index).where(ok)}
+    dps = out["div_1y"]
+    ddm_ok = (dps > 0) & (dps / price >= 0.005) & (ke > p.g_ddm)
+    fv["DDM - Gordon"] = (dps * (1 + p.g_ddm) / (ke - p.g_ddm)).where(ddm_ok)
+
+    eps = _col(S, "Diluted EPS", "Basic EPS").fillna(net_inc / shares)
+    metrics = dict(zip(MULTIPLES, (eps, equity / shares, revenue / shares, ebitda / shares, fcf0 / shares)))
+    for key, m in metrics.items():
+        m = m.where(m != 0)
+        ratio = at_d["d_close"] / m
+        ratio = ratio.where((m > 0) & (ratio > 0) & (ratio < 1000))
+        mult = p.multiples.get(key) or None
+        if mult is None:
+            mult = _expanding_median(ratio, sym).round(1).fillna(MULTIPLE_FALLBACK[key])
+        fv[key] = m * mult
+
+    for k, s in fv.items():
+        out[f"fv {k}"] = s
+    F = np.column_stack([s.to_numpy(float) for s in fv.values()])
+    out["n_models"] = np.isfinite(F).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # righe senza alcun modello: NaN
+        out["fv_median"] = np.nanmedian(F, axis=1)
+    out["upside"] = (out["fv_median"] / price - 1) * 100
+    out["verdict"] = [verdict(u)[0] if u == u else None for u in out["upside"]]
+    return out.reset_index(drop=True)
+
+
+def backtest_summary(bt, horizons=HORIZONS):
+    """Per fascia di giudizio: numero, rendimento medio/mediano e hit rate per orizzonte.
+    Hit = il segno del rendimento futuro concorda con quello dell'upside.
+    Ritorna (tabella, spread) con spread = rendimento medio della fascia piu' a sconto
+    meno quello della piu' cara, per orizzonte."""
+    rows, spread = [], {}
+    for b in BUCKETS:
+        sub = bt[bt["verdict"] == b] if not bt.empty else bt
+        r = {"verdict": b}
+        for h in horizons:
+            ret = sub[f"ret_{h}y"].dropna() if not sub.empty else pd.Series(dtype=float)
+            hit = (np.sign(ret) == np.sign(sub.loc[ret.index, "upside"])) if not ret.empty else ret
+            r.update({f"n_{h}y": len(ret), f"mean_{h}y": ret.mean() if len(ret) else np.nan,
+                      f"median_{h}y": ret.median() if len(ret) else np.nan,
+                      f"hit_{h}y": hit.mean() if len(ret) else np.nan})
+        rows.append(r)
+    table = pd.DataFrame(rows).set_index("verdict")
+    for h in horizons:
+        m = table[f"mean_{h}y"].dropna()
+        spread[f"{h}y"] = float(m.iloc[-1] - m.iloc[0]) if len(m) >= 2 else None
+    return table, spread
+
+
+def backtest_universe(tickers, params=None, store=None, provider=None, lag_days=90, horizons=HORIZONS,
+                      max_concurrency=16, period="max"):
+    """Scarica (o legge da cache/snapshot) i bundle e lancia il backtest.
+    `period` dello storico prezzi: serve piu' lungo dei 6 anni della pagina per i rendimenti a 3 anni."""
+    bundles = fetch_bundles(tickers, store, provider, max_concurrency, period)
+    return backtest(bundles, params, lag_days, horizons)
@@ -0,0 +1,140 @@
+import asyncio
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from .bundle import HISTORY_PERIOD, REQUESTS, bulk_histories_async, fetch_bundle, fetch_bundles
+from .data import company_data, multiples_from_bundle
+from .provider import default_provider
+from .record import CompanyTable
+from .valuation import ValuationParams, value_company
+
+# =============================================================
+#  VALUTAZIONE BATCH DI UN UNIVERSO DI TITOLI
+#  - storici prezzi con download multiplo (provider.histories)
+#  - prospetti e info con un pool di thread limitato
+#  - le righe escono man mano che ogni ticker e' pronto
+# =============================================================
+
+PRESET = {
+    "Apple":"AAPL","Microsoft":"MSFT","NVIDIA":"NVDA","Alphabet":"GOOGL","Amazon":"AMZN",
+    "Coca-Cola":"KO","Johnson & Johnson":"JNJ","ENEL":"ENEL.MI","ENI":"ENI.MI",
+    "Intesa Sanpaolo":"ISP.MI","Ferrari":"RACE.MI","LVMH":"MC.PA","Nestle":"NESN.SW","ASML":"ASML",
+}
+
+
+def _csv_tickers(text):
+    """Colonna ticker/symbol/simbolo di un CSV con intestazione, altrimenti la prima colonna."""
+    rows = [r for r in csv.reader(io.StringIO(text)) if r and r[0].strip()]
+    col = 0
+    if rows:
+        head = [c.strip().lower() for c in rows[0]]
+        for name in ("ticker", "symbol", "simbolo"):
+            if name in head:
+                col = head.index(name); rows = rows[1:]
+                break
+    return [r[col] for r in rows if len(r) > col]
+
+
+def read_tickers(source):
+    """Ticker da: dict tipo PRESET, lista, file CSV (colonna ticker/symbol, altrimenti la prima;
+    percorso o file aperto, es. io.StringIO di un upload), file di costituenti (uno per riga)
+    o testo libero ("AAPL, MSFT ENEL.MI"). Duplicati rimossi, ordine mantenuto."""
+    if isinstance(source, dict):
+        items = list(source.values())
+    elif isinstance(source, (list, tuple, set)):
+        items = list(source)
+    elif hasattr(source, "read"):
+        text = source.read()
+        items = _csv_tickers(text.decode("utf-8", "ignore") if isinstance(text, bytes) else text)
+    elif isinstance(source, Path) or (isinstance(source, str) and "\n" not in source and Path(source).is_file()):
+        items = _csv_tickers(Path(source).read_text())
+    else:
+        items = str(source).replace(",", " ").replace(";", " ").split()
+    out = []
+    for t in items:
+        t = str(t).strip().upper()
+        if t and not t.startswith("#") and t not in out:
+            out.append(t)
+    return out
+
+
+def bulk_histories(tickers, provider=None, store=None):
+    """Storico prezzi (con dividendi) di molti ticker con poche richieste multiple
+    (con `store`: solo le sedute mancanti, vedi bundle.bulk_histories_async)."""
+    provider = provider or default_provider()
+    REQUESTS.hit("bulk_history")
+    return asyncio.run(bulk_histories_async(list(tickers), store, provider, HISTORY_PERIOD))
+
+
+def value_ticker(symbol, params=None, store=None, history=None, provider=None, peers=None):
+    basis = params.basis if params is not None else "annual"
+    B = fetch_bundle(symbol, store, history=history, provider=provider, quarterly=basis == "ttm")
+    D = company_data(B, basis)
+    if D["price"] is None:
+        return {"symbol": symbol, "name": D["name"], "error": "prezzo non disponibile"}
+    HM = multiples_from_bundle(B, D["shares"], basis) if D["shares"] else {}
+    return value_company(D, HM, params, peers)
+
+
+def value_universe(tickers, params=None, store=None, max_workers=8, bulk=True, provider=None, peers=None):
+    """Generatore: una riga di risultati per ticker, nell'ordine di completamento.
+    `peers` (PeerIndex): multipli di default dal settore e posizione nel settore."""
+    params = params or ValuationParams()
+    tickers = read_tickers(tickers)
+    hist = {}
+    if bulk:
+        need = [t for t in tickers if store is None or not store.is_fresh(f"{t}:history", "prices")]
+        if len(need) > 1:
+            hist = bulk_histories(need, provider, store)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch") as pool:
+        futs = {pool.submit(value_ticker, t, params, store, hist.get(t), provider, peers): t for t in tickers}
+        for fut in as_completed(futs):
+            try:
+                yield fut.result()
+            except Exception as e:
+                yield {"symbol": futs[fut], "error": str(e) or type(e).__name__}
+
+
+def company_table(tickers, store=None, provider=None, max_concurrency=16, basis="annual", chunk=256):
+    """Tabella colonnare (CompanyTable) di un universo, da valutare con record.value_table.
+    I bundle si scaricano a blocchi di `chunk` ticker e si scartano subito: in memoria
+    restano solo le colonne. Ticker senza prezzo esclusi."""
+    tickers = read_tickers(tickers)
+    records, hms = [], []
+    for i in range(0, len(tickers), chunk):
+        for B in fetch_bundles(tickers[i:i + chunk], store, provider, max_concurrency, quarterly=basis == "ttm"):
+            D = company_data(B, basis)
+            if D.price is None:
+                continue
+            records.append(D)
+            hms.append(multiples_from_bundle(B, D.shares, basis) if D.shares else {})
+    return CompanyTable.from_records(records, hms)
+
+
+def results_frame(rows):
+    """DataFrame dei risultati, ordinato per upside decrescente."""
+    df = pd.DataFrame(list(rows))
+    if "upside" in df:
+        df = df.sort_values("upside", ascending=False, na_position="last").reset_index(drop=True)
+    return df
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def export_bytes(df, fmt="csv"):
+    """Risultati serializzati per il download: "csv" oppure "parquet" (richiede pyarrow)."""
+    if fmt == "parquet":
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False)
+        return buf.getvalue()
+    return df.to_csv(index=False).encode("utf-8")
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .fx import FX, fx_pair
+from .prices import period_years
+from .provider import STATEMENTS, default_provider
+from .quarterly import QUARTERLY, merge_quarters, quarter_frame
+from .timing import span
+
+log = logging.getLogger(__name__)
+
+# =============================================================
+#  BUNDLE DATI PER TICKER
+#  Un solo download per ciascun dato (tramite il provider):
+#    info + 3 prospetti annuali + UNO storico prezzi (6 anni, con dividendi)
+#    (con la cache su disco lo storico vive in valutatore.prices e si scaricano
+#     solo le sedute dopo l'ultima salvata)
+#    (+ 3 prospetti trimestrali se serve la base TTM, vedi valutatore.quarterly)
+#    (+ storico del cambio se bilanci e prezzo sono in valute diverse, vedi valutatore.fx)
+#  Tutti i consumatori (prezzo spot, multipli storici, grafico 1 anno,
+#  dividendi ultimi 12 mesi) leggono fette di questo bundle.
+# =============================================================
+
+HISTORY_PERIOD = "6y"  # il piu' lungo richiesto (multipli storici)
+
+
+class RequestCounter:
+    """Conta le richieste di rete effettive (le letture da cache non contano)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def hit(self, what):
+        with self._lock:
+            self._counts[what] += 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    @property
+    def total(self):
+        with self._lock:
+            return sum(self._counts.values())
+
+
+REQUESTS = RequestCounter()
+
+
+@dataclass(repr=False)
+class CompanyBundle:
+    symbol: str
+    info: dict
+    income_stmt: pd.DataFrame = None
+    balance_sheet: pd.DataFrame = None
+    cashflow: pd.DataFrame = None
+    history: pd.DataFrame = None   # Close + Dividends, indice tz-naive
+    quarterly: pd.DataFrame = None # serie trimestrale con colonne ttm_* (solo se richiesta)
+    fx: pd.Series = None           # cambio giornaliero valuta di bilancio -> valuta del prezzo
+
+    def __repr__(self):
+        # compatto: asyncio.run (thread principale) formatta il risultato del task, e il repr
+        # di default stamperebbe tutti i DataFrame a ogni fetch_bundle
+        parts = [f"{k}={v.shape}" for k in ("income_stmt", "balance_sheet", "cashflow", "history", "quarterly", "fx")
+                 if (v := getattr(self, k)) is not None]
+        return f"CompanyBundle({self.symbol!r}, " + ", ".join(parts) + ")"
+
+    @property
+    def close(self):
+        if self.history is None or self.history.empty or "Close" not in self.history:
+            return pd.Series(dtype=float)
+        return self.history["Close"].dropna()
+
+    def last_close(self):
+        c = self.close
+        return float(c.iloc[-1]) if not c.empty else None
+
+    def close_since(self, years=1):
+        """Chiusure degli ultimi `years` anni (per il grafico)."""
+        c = self.close
+        if c.empty:
+            return c
+        return c[c.index >= c.index[-1] - pd.DateOffset(years=years)]
+
+    def dividends_since(self, years=1):
+        """Dividendi staccati negli ultimi `years` anni (solo le date di stacco).
+        La finestra parte dall'ultima seduta dello storico, non dall'orologio: con dati
+        appena scaricati e' lo stesso, con fixture registrate il risultato non cambia nel tempo."""
+        if self.history is None or self.history.empty or "Dividends" not in self.history:
+            return pd.Series(dtype=float)
+        d = self.history["Dividends"]
+        end = d.index[-1]
+        d = d[d > 0]
+        return d[d.index >= end - pd.DateOffset(years=years)]
+
+
+def _naive_index(h):
+    if h is not None and not h.empty and getattr(h.index, "tz", None) is not None:
+        h = h.copy()
+        h.index = h.index.tz_localize(None)  # uniforma a tz-naive una volta sola
+    return h
+
+
+async def fetch_bundle_async(symbol, store=None, counter=REQUESTS, history=None, provider=None, quarterly=False,
+                             period=HISTORY_PERIOD):
+    """Scarica (o legge dalla cache `store`) tutto cio' che serve per un ticker, con le
+    richieste in parallelo sul `provider` (default: valutatore.provider.default_provider()).
+    `history` gia' scaricato (es. download multiplo del batch) evita la richiesta dello storico.
+    `quarterly` aggiunge i prospetti trimestrali, fusi nella serie conservata in `store`.
+    `period`: quanto storico prezzi serve (il backtest chiede "max")."""
+    provider = provider or default_provider()
+    if not provider.cacheable:
+        store = None
+
+    async def get(what, kind, afn, default):
+        with span(f"fetch {what}", "fetch", symbol=symbol, cache="hit") as sp:
+            async def afetch():
+                counter.hit(what)
+                sp.note(cache="miss")
+                return await afn()
+            try:
+                if store is None:
+                    return await afetch()
+                return await store.aget_or_fetch(f"{symbol}:{what}", kind, afetch)
+            except Exception as e:
+                log.warning("%s: %s non disponibile (%s)", symbol, what, e)
+                return default
+
+    async def get_history():
+        if store is None:
+            return _naive_index(await provider.history(symbol, period))
+        return await store.prices.aupdate(symbol, provider, period)
+
+    jobs = [get("info", "info", lambda: provider.info(symbol), {})]
+    jobs += [get(attr, "statements", lambda a=attr: provider.statement(symbol, a), None) for attr in STATEMENTS]
+    # con la cache, uno storico salvato su un periodo piu' corto si riscarica subito (niente lease)
+    direct = store is not None and (history is not None or (
+        store.prices.last_date(symbol) is not None and not store.prices.covers(symbol, period)))
+    if history is None and not direct:
+        jobs.append(get("history", "prices", get_history, None))
+    if quarterly:
+        jobs += [get(attr, "statements", lambda a=attr: provider.statement(symbol, a), None)
+                 for attr in QUARTERLY.values()]
+    with span("fetch bundle", "fetch", symbol=symbol):
+        info, inc, bs, cf, *rest = await asyncio.gather(*jobs)
+    if store is not None:
+        if not direct:
+            got = rest.pop(0)   # solo il riassunto: lo storico si legge in memory-map
+            if isinstance(got, pd.DataFrame) and store.prices.last_date(symbol) is None:
+                store.prices.write(symbol, got, HISTORY_PERIOD)   # voce scritta da una versione precedente
+        else:
+            try:
+                if history is None:
+                    counter.hit("history")
+                marker = await store.prices.aupdate(symbol, provider, period, history)
+                if marker:
+                    store.put(f"{symbol}:history", "prices", marker)
+            except Exception as e:
+                log.warning("%s: storico non aggiornato (%s)", symbol, e)
+        hist = store.prices.frame(symbol)
+    elif history is not None:
+        hist = _naive_index(history)
+    else:
+        hist = rest.pop(0)
+    Q = update_quarterly(symbol, store, quarter_frame(*rest)) if quarterly else None
+    info = info or {}
+    pair, _ = fx_pair(info.get("financialCurrency"), info.get("currency"))
+    fx = await FX.series(pair, provider, store, counter) if pair else None
+    return CompanyBundle(symbol, info, income_stmt=inc, balance_sheet=bs, cashflow=cf, history=hist,
+                         quarterly=Q, fx=fx)
+
+
+def update_quarterly(symbol, store, fresh):
+    """Aggiunge i trimestri appena scaricati alla serie conservata (chiave <ticker>:quarterly):
+    si riscrive solo se e' arrivato un trimestre nuovo o rivisto."""
+    stored = store.get(f"{symbol}:quarterly")[0] if store is not None else None
+    Q, changed = merge_quarters(stored, fresh)
+    if changed and store is not None:
+        store.put(f"{symbol}:quarterly", "statements", Q)
+        log.info("%s: %d trimestri aggiornati", symbol, len(changed))
+    return Q
+
+
+def fetch_bundle(symbol, store=None, counter=REQUESTS, history=None, provider=None, quarterly=False,
+                 period=HISTORY_PERIOD):
+    """Versione sincrona di fetch_bundle_async (Streamlit, thread del batch, CLI)."""
+    return asyncio.run(fetch_bundle_async(symbol, store, counter, history, provider, quarterly, period))
+
+
+async def bulk_histories_async(tickers, store=None, provider=None, period=HISTORY_PERIOD):
+    """Storici di molti ticker con download multipli. Con la cache su disco si saltano i
+    ticker aggiornati da poco e per quelli gia' salvati si chiedono solo le sedute
+    dall'ultima data (un download per data: di solito una sola)."""
+    provider = provider or default_provider()
+    if store is None or not provider.cacheable:
+        return await provider.histories(list(tickers), period)
+    full, since = [], {}
+    for t in tickers:
+        m = store.prices.meta(t)
+        if not (m and m["rows"] and period_years(m["period"]) >= period_years(period)):
+            full.append(t)
+        elif not store.is_fresh(f"{t}:history", "prices"):
+            since.setdefault(m["last"], []).append(t)
+    out = await provider.histories(full, period) if full else {}
+    for start, group in since.items():
+        out.update(await provider.histories(group, period, start=start))
+    return out
+
+
+async def fetch_bundles_async(tickers, store=None, provider=None, max_concurrency=16, period=HISTORY_PERIOD,
+                              quarterly=False):
+    """Bundle di molti ticker: storici con download multiplo, il resto con al massimo
+    `max_concurrency` ticker in volo. Stesso ordine di `tickers`."""
+    provider = provider or default_provider()
+    tickers = list(dict.fromkeys(tickers))
+    hist = await bulk_histories_async(tickers, store, provider, period) \
+        if len(tickers) > 1 or period != HISTORY_PERIOD else {}
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def one(t):
+        async with sem:
+            return await fetch_bundle_async(t, store, history=hist.get(t), provider=provider, quarterly=quarterly,
+                                            period=period)
+    return await asyncio.gather(*(one(t) for t in tickers))
+
+
+def fetch_bundles(tickers, store=None, provider=None, max_concurrency=16, period=HISTORY_PERIOD, quarterly=False):
+    return asyncio.run(fetch_bundles_async(tickers, store, provider, max_concurrency, period, quarterly))
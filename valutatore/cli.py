@@ -0,0 +1,197 @@
+import argparse
+import json
+import sys
+import time
+
+from .backtest import backtest_summary, backtest_universe
+from .batch import PRESET, read_tickers, results_frame, value_universe
+from .peers import PeerIndex, build_peer_index, peer_index_path
+from .snapshot import SnapshotProvider, record_snapshot
+from .store import FundamentalsStore
+from .valuation import ValuationParams
+from .warmer import CacheWarmer
+
+# =============================================================
+#  CLI:  valuta AAPL MSFT --format json
+#        valuta AAPL --ttm                    (base ultimi 4 trimestri)
+#        valuta --file universo.csv --record-snapshot 2026-09-30 --as-of 2026-09-30
+#        valuta --file universo.csv --snapshot 2026-09-30
+#        valuta --file universo.csv --backtest
+#        valuta --file universo.csv --build-peers default    (indice di settore)
+#        valuta AAPL --peers default --sector-multiples
+#        valuta --file watchlist.csv --warm       (tiene calda la cache condivisa)
+#        valuta --file watchlist.csv --report report/ [--pdf]   (un HTML per titolo)
+#        valuta --serve 127.0.0.1:8000            (API JSON, vedi valutatore.api)
+#  Stessa valutazione della pagina Streamlit, senza interfaccia web.
+# =============================================================
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="valuta", description="Valutazione fondamentale (DCF, DDM, multipli, reverse DCF).")
+    p.add_argument("tickers", nargs="*", help="ticker (es. AAPL ENEL.MI); vuoto = elenco predefinito")
+    p.add_argument("--file", help="CSV con colonna ticker/symbol, o un ticker per riga")
+    p.add_argument("--format", choices=["json", "jsonl", "csv", "table"], default="table")
+    p.add_argument("--rf", type=float, default=3.5, help="risk-free, %% (default 3.5)")
+    p.add_argument("--erp", type=float, default=5.5, help="equity risk premium, %% (default 5.5)")
+    p.add_argument("--beta", type=float, help="beta (default: quello del titolo)")
+    p.add_argument("--kd", type=float, help="costo del debito ante imposte, %% (default: stimato)")
+    p.add_argument("--growth", type=float, default=6.0, help="crescita FCF, %%/anno (default 6)")
+    p.add_argument("--years", type=int, default=7, help="anni espliciti (default 7)")
+    p.add_argument("--term-g", type=float, default=2.0, help="crescita terminale, %% (default 2)")
+    p.add_argument("--g-ddm", type=float, default=2.5, help="crescita dividendi, %% (default 2.5)")
+    p.add_argument("--last-fcf", action="store_true", help="usa l'ultimo FCF invece della media pluriennale")
+    p.add_argument("--ttm", action="store_true", help="base TTM: ultimi 4 trimestri invece dell'ultimo esercizio")
+    p.add_argument("--multiple", action="append", default=[], metavar="NOME=VALORE",
+                   help='multiplo forzato, es. --multiple "P/E=15" (ripetibile)')
+    p.add_argument("--workers", type=int, default=8, help="download in parallelo (default 8)")
+    p.add_argument("--no-cache", action="store_true", help="non usare la cache su disco")
+    p.add_argument("--cache-stats", action="store_true",
+                   help="a fine esecuzione stampa su stderr i contatori della cache (processo e condivisi)")
+    p.add_argument("--snapshot", metavar="NOME", help="valuta sui dati di uno snapshot registrato (senza rete)")
+    p.add_argument("--record-snapshot", metavar="NOME", help="registra prima i dati dei ticker in uno snapshot")
+    p.add_argument("--as-of", metavar="AAAA-MM-GG",
+                   help="con --record-snapshot: solo bilanci e prezzi fino a questa data, "
+                        "di info solo i dati descrittivi (beta = 1)")
+    p.add_argument("--build-peers", metavar="NOME", help="calcola l'indice di settore dei ticker e lo salva come NOME")
+    p.add_argument("--peers", metavar="NOME", help="usa l'indice di settore NOME: colonne pct <multiplo> (0-100)")
+    p.add_argument("--sector-multiples", type=float, nargs="?", const=50.0, metavar="PERCENTILE",
+                   help="con --peers: multipli di default dal settore (default mediana = 50) invece dello storico")
+    p.add_argument("--warm", action="store_true",
+                   help="resta in esecuzione e tiene calda la cache su disco per i ticker (default PRESET)")
+    p.add_argument("--warm-budget", type=float, default=600, metavar="N",
+                   help="con --warm: massimo N richieste di rete all'ora (default 600)")
+    p.add_argument("--report", metavar="CARTELLA",
+                   help="scrive un report HTML per ticker (piu' index.html) nella cartella")
+    p.add_argument("--pdf", action="store_true", help="con --report: anche il PDF (richiede weasyprint)")
+    p.add_argument("--processes", type=int, metavar="N",
+                   help="con --report: processi per calcolo e impaginazione (default: uno per core)")
+    p.add_argument("--serve", metavar="[HOST:]PORTA",
+                   help="avvia l'API JSON di valutazione (GET /value/<ticker>, POST /value)")
+    p.add_argument("--backtest", action="store_true",
+                   help="backtest punto-nel-tempo: rendimenti a 1 e 3 anni per fascia di giudizio (csv = tutte le righe)")
+    return p
+
+
+def params_from_args(a):
+    mult = {}
+    for m in a.multiple:
+        k, _, v = m.partition("=")
+        mult[k.strip()] = float(v)
+    pct = lambda x: None if x is None else x / 100
+    return ValuationParams(rf=pct(a.rf), erp=pct(a.erp), beta=a.beta, kd=pct(a.kd), use_norm=not a.last_fcf,
+                           g_fcf=pct(a.growth), years=a.years, term_g=pct(a.term_g), g_ddm=pct(a.g_ddm),
+                           multiples=mult, basis="ttm" if a.ttm else "annual",
+                           multiple_default="hist" if a.sector_multiples is None else "sector",
+                           sector_q=50.0 if a.sector_multiples is None else a.sector_multiples)
+
+
+def main(argv=None):
+    a = build_parser().parse_args(argv)
+    tickers = read_tickers(a.tickers) + (read_tickers(a.file) if a.file else [])
+    tickers = list(dict.fromkeys(tickers)) or list(PRESET.values())
+    store = None if a.no_cache else FundamentalsStore.from_env()
+    provider = None
+    if a.record_snapshot:
+        path, missing = record_snapshot(a.record_snapshot, tickers, as_of=a.as_of, max_concurrency=a.workers)
+        print(f"snapshot {a.record_snapshot}: {len(tickers) - len(missing)} ticker in {path}"
+              + (f" (mancanti: {', '.join(missing)})" if missing else ""), file=sys.stderr)
+    if a.snapshot or a.record_snapshot:
+        provider = SnapshotProvider(a.snapshot or a.record_snapshot)
+    if a.backtest:
+        return run_backtest(a, tickers, store, provider)
+    if a.warm:
+        return run_warmer(a, tickers, store, provider)
+    params = params_from_args(a)
+    if a.report:
+        return run_report(a, tickers, params, store, provider)
+    if a.serve:
+        return run_server(a, store, provider)
+    if a.build_peers:
+        idx = build_peer_index(tickers, store, provider, max_concurrency=a.workers, basis=params.basis)
+        path = idx.save(peer_index_path(a.build_peers))
+        print(f"indice di settore {a.build_peers}: {len(idx)} ticker in {path}", file=sys.stderr)
+        return 0 if len(idx) else 1
+    peers = PeerIndex.load(peer_index_path(a.peers)) if a.peers else None
+    rows = []
+    for r in value_universe(tickers, params, store, max_workers=a.workers, provider=provider, peers=peers):
+        rows.append(r)
+        if a.format == "jsonl":
+            print(json.dumps(r, ensure_ascii=False, default=str), flush=True)
+    rows.sort(key=lambda r: tickers.index(r["symbol"]))  # ordine di input
+    if a.format == "json":
+        print(json.dumps(rows, ensure_ascii=False, indent=2, default=str))
+    elif a.format == "csv":
+        sys.stdout.write(results_frame(rows).to_csv(index=False))
+    elif a.format == "table":
+        cols = ["symbol", "price", "fv_median", "upside", "verdict", "g_implied", "pct P/E", "error"]
+        df = results_frame(rows)
+        print(df[[c for c in cols if c in df]].to_string(index=False, float_format=lambda x: f"{x:,.2f}"))
+    if a.cache_stats and store is not None:
+        print(f"cache: {store.stats()} | condivisa: {store.shared_stats()}", file=sys.stderr)
+    return 0 if any("error" not in r for r in rows) else 1
+
+
+def run_warmer(a, tickers, store, provider):
+    if store is None:
+        print("--warm richiede la cache su disco (senza --no-cache)", file=sys.stderr)
+        return 2
+    w = CacheWarmer(store, tickers, provider, workers=a.workers, budget=a.warm_budget, quarterly=a.ttm).start()
+    if not w.running:
+        print("niente da pre-riscaldare (snapshot o nessun ticker)", file=sys.stderr)
+        return 1
+    print(f"pre-riscaldamento di {len(w.tickers)} ticker (Ctrl+C per uscire)", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(60)
+            print(f"warm: {w.status()} | cache: {store.shared_stats()}", file=sys.stderr)
+    except KeyboardInterrupt:
+        w.stop(timeout=5)
+    return 0
+
+
+def run_server(a, store, provider):
+    from .api import ValuationService, serve
+    host, _, port = a.serve.rpartition(":")
+    peers = PeerIndex.load(peer_index_path(a.peers)) if a.peers else None
+    print(f"API su http://{host or '127.0.0.1'}:{port} (Ctrl+C per uscire)", file=sys.stderr)
+    try:
+        serve(ValuationService(store, provider, peers, workers=a.workers), host or "127.0.0.1", int(port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def run_report(a, tickers, params, store, provider):
+    from .report import write_reports
+    peers = PeerIndex.load(peer_index_path(a.peers)) if a.peers else None
+    t, ok = time.perf_counter(), 0
+    try:
+        for i, r in enumerate(write_reports(tickers, a.report, params, store, provider, peers, pdf=a.pdf,
+                                            processes=a.processes, max_concurrency=a.workers), 1):
+            ok += "error" not in r
+            print(f"[{i}/{len(tickers)}] {r['symbol']}: " + (r.get("error") or r["html"]), file=sys.stderr)
+    except ImportError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"{ok} report in {a.report} ({time.perf_counter() - t:.1f} s)", file=sys.stderr)
+    return 0 if ok else 1
+
+
+def run_backtest(a, tickers, store, provider):
+    bt = backtest_universe(tickers, params_from_args(a), store, provider, max_concurrency=a.workers)
+    table, spread = backtest_summary(bt)
+    if a.format == "csv":
+        sys.stdout.write(bt.to_csv(index=False))
+    elif a.format in ("json", "jsonl"):
+        print(json.dumps({"valuations": len(bt), "tickers": int(bt["symbol"].nunique()) if len(bt) else 0,
+                          "buckets": table.reset_index().astype(object).where(table.reset_index().notna(), None).to_dict("records"), "spread": spread},
+                         ensure_ascii=False, indent=2 if a.format == "json" else None, default=str))
+    else:
+        print(f"{len(bt)} valutazioni su {bt['symbol'].nunique() if len(bt) else 0} titoli")
+        print(table.to_string(float_format=lambda x: f"{x:,.3f}"))
+        for h, v in spread.items():
+            print(f"spread {h} (piu' a sconto - piu' cara): " + ("N/D" if v is None else f"{v*100:+.1f}%"))
+    return 0 if len(bt) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .bundle import fetch_bundle
+from .fx import in_price_currency
+from .helpers import f, full_row, row
+from .quarterly import ttm_series, ttm_values
+from .record import Company
+from .timing import timed
+
+BASES = ("annual", "ttm")   # annual = ultimo esercizio; ttm = ultimi 4 trimestri (se disponibili)
+
+# =============================================================
+#  MULTIPLI STORICI
+#  Le metriche per azione di ogni bilancio valgono a gradino fino al
+#  bilancio successivo e si uniscono alle chiusure giornaliere con un solo
+#  merge as-of: multipli giornalieri (P/E, P/BV, ...) con bande di percentili.
+#  La mediana di default (un punto per bilancio, al prezzo della data di
+#  bilancio) esce dallo stesso passaggio, con ricerche binarie sulle date.
+# =============================================================
+MULTIPLES = ("P/E", "P/BV", "P/Sales", "P/EBITDA", "P/FCF")   # come valutatore.models
+BANDS = (10, 25, 50, 75, 90)
+RATIO_MAX = 1000   # oltre (o <= 0) il multiplo non e' significativo
+
+def _naive(ts):
+    """Timestamp senza timezone, per confronti uniformi."""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize(None) if ts.tz is not None else ts
+
+def _ns(idx):
+    return pd.DatetimeIndex(idx).as_unit("ns")
+
+
+class MultipleHistory(NamedTuple):
+    daily: pd.DataFrame   # indice = sedute dal primo bilancio, colonne = MULTIPLES (NaN = non significativo)
+    points: dict          # multiplo -> Series dei rapporti alle date di bilancio (validi)
+
+    def medians(self):
+        """{multiplo: (mediana, n_punti)} alle date di bilancio (None con meno di 2 punti)."""
+        return {k: ((float(np.median(s.to_numpy())), len(s)) if len(s) >= 2 else (None, len(s)))
+                for k, s in self.points.items()}
+
+    def quantile(self, key, q=50):
+        """Percentile `q` (0-100) del multiplo giornaliero, None senza dati."""
+        v = self.daily[key].dropna().to_numpy() if key in self.daily else np.zeros(0)
+        return float(np.percentile(v, q)) if len(v) else None
+
+    def bands(self, q=BANDS):
+        """Percentili giornalieri per multiplo: righe = MULTIPLES, colonne p<q>, ultimo, giorni."""
+        rows = {}
+        for k in MULTIPLES:
+            v = self.daily[k].dropna() if k in self.daily else pd.Series(dtype=float)
+            rows[k] = dict({f"p{x}": float(np.percentile(v, x)) if len(v) else np.nan for x in q},
+                           ultimo=float(v.iloc[-1]) if len(v) else np.nan, giorni=len(v))
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def _with_ttm(annual, ttm):
+    """Punti annuali anteriori alla prima finestra TTM + i punti TTM a fine trimestre."""
+    if ttm is None:
+        return annual
+    if annual is None:
+        return ttm
+    a = annual.copy()
+    a.index = [_naive(d) for d in a.index]
+    return pd.concat([a[a.index < ttm.index[0]], ttm])
+
+def per_share_history(B, shares_now, basis="annual"):
+    """{multiplo: Series della metrica per azione, indicizzata per data di bilancio (tz-naive)}.
+    N. azioni: quello attuale come proxy stabile (l'EPS e' gia' per azione).
+    Con basis="ttm" un punto a ogni fine trimestre (flussi TTM, patrimonio del trimestre)."""
+    inc, bs, cf = B.income_stmt, B.balance_sheet, B.cashflow
+    eps_s    = full_row(inc, "Diluted EPS", "Basic EPS")
+    if eps_s is None:
+        ni = full_row(inc, "Net Income", "Net Income Common Stockholders")
+        eps_s = (ni / shares_now) if (ni is not None and shares_now) else None
+    equity_s = full_row(bs, "Stockholders Equity", "Total Equity Gross Minority Interest")
+    rev_s    = full_row(inc, "Total Revenue", "Operating Revenue")
+    ebitda_s = full_row(inc, "EBITDA", "Normalized EBITDA")
+    cfo_s    = full_row(cf, "Operating Cash Flow", "Cash Flow From Continuing Operating Activities")
+    capex_s  = full_row(cf, "Capital Expenditure", "Purchase Of PPE")
+    fcf_s = None
+    if cfo_s is not None and capex_s is not None:
+        fcf_s = (cfo_s + capex_s).dropna()
+
+    Q = B.quarterly if basis == "ttm" else None
+    ni_ttm = ttm_series(Q, "net_income")
+    if ni_ttm is not None and shares_now:
+        eps_s = _with_ttm(eps_s, ni_ttm / shares_now)
+    if Q is not None and Q["equity_bv"].notna().any():
+        equity_s = _with_ttm(equity_s, Q["equity_bv"].dropna())
+    rev_s    = _with_ttm(rev_s, ttm_series(Q, "revenue"))
+    ebitda_s = _with_ttm(ebitda_s, ttm_series(Q, "ebitda"))
+    fcf_s    = _with_ttm(fcf_s, ttm_series(Q, "fcf"))
+
+    def series(s, div):
+        if s is None or div in (None, 0):
+            return pd.Series(dtype=float, index=_ns([]))
+        d = {_naive(k): float(v) / div for k, v in s.items() if v == v}   # data ripetuta: vale l'ultima
+        return pd.Series(list(d.values()), index=_ns(list(d.keys())), dtype=float).sort_index()
+
+    return {"P/E": series(eps_s, 1.0), "P/BV": series(equity_s, shares_now), "P/Sales": series(rev_s, shares_now),
+            "P/EBITDA": series(ebitda_s, shares_now), "P/FCF": series(fcf_s, shares_now)}
+
+@timed("multiples_history", cat="data")
+def multiple_history_from_bundle(B, shares_now, basis="annual"):
+    """Multipli giornalieri e punti alle date di bilancio (MultipleHistory) dal bundle.
+    Bilanci convertiti nella valuta del prezzo al cambio di ciascuna data."""
+    B = in_price_currency(B)
+    ph = B.close  # gia' tz-naive
+    metrics = per_share_history(B, shares_now, basis)
+    dates = _ns(ph.index)
+    close = ph.to_numpy(dtype=float)
+
+    # un solo merge as-of: per ogni seduta l'ultimo valore noto di ciascuna metrica
+    M = pd.DataFrame({k: s for k, s in metrics.items() if not s.empty}).sort_index().ffill()
+    if len(ph) and not M.empty:
+        J = pd.merge_asof(pd.DataFrame({"date": dates}), M.rename_axis("date").reset_index(), on="date",
+                          direction="backward").set_index("date")
+        start = dates.searchsorted(M.index[0])   # prima seduta con un bilancio noto
+        V = J.to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            R = close[:, None] / V
+        R[~((V > 0) & (R > 0) & (R < RATIO_MAX))] = np.nan
+        daily = pd.DataFrame(R[start:], index=dates[start:], columns=J.columns).reindex(columns=list(MULTIPLES))
+    else:
+        daily = pd.DataFrame(columns=list(MULTIPLES), index=_ns([]), dtype=float)
+
+    # punti di bilancio: chiusura all'ultima seduta <= data del bilancio
+    points = {}
+    for k, s in metrics.items():
+        pos = dates.searchsorted(s.index, side="right") - 1
+        px = np.where(pos >= 0, close[np.maximum(pos, 0)] if len(close) else np.nan, np.nan)
+        ps = s.to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = px / ps
+        ok = (px == px) & (px != 0) & (ps > 0) & (r > 0) & (r < RATIO_MAX)
+        points[k] = pd.Series(r[ok], index=s.index[ok], dtype=float)
+    return MultipleHistory(daily, points)
+
+@timed("historical_multiples", cat="data")
+def multiples_from_bundle(B, shares_now, basis="annual"):
+    """P/E, P/BV, P/Sales, P/EBITDA, P/FCF storici del titolo: {multiplo: (mediana, n_punti)},
+    mediana dei rapporti prezzo/metrica alle date di bilancio (vedi multiple_history_from_bundle)."""
+    return multiple_history_from_bundle(B, shares_now, basis).medians()
+
+# =============================================================
+#  DATA LAYER
+# =============================================================
+@timed("company_data", cat="data")
+def company_data(B, basis="annual"):
+    """Dati di bilancio e di mercato letti dal bundle del ticker (Company, si legge come un dict).
+    Con basis="ttm" flussi (ricavi, EBIT, utile, FCF...) degli ultimi 4 trimestri e stato
+    patrimoniale dell'ultimo trimestre; senza trimestrali sufficienti resta l'ultimo esercizio.
+    Importi di bilancio nella valuta del prezzo (vedi valutatore.fx)."""
+    B = in_price_currency(B)
+    symbol = B.symbol
+    info = B.info
+    inc, bs, cf = B.income_stmt, B.balance_sheet, B.cashflow
+
+    price = f(info.get("currentPrice"))
+    if price is None:
+        price = B.last_close()
+
+    shares = f(info.get("sharesOutstanding")) or row(bs, "Share Issued", "Ordinary Shares Number")
+
+    revenue   = row(inc, "Total Revenue", "Operating Revenue")
+    ebit      = row(inc, "EBIT", "Operating Income")
+    ebitda    = row(inc, "EBITDA", "Normalized EBITDA") or f(info.get("ebitda"))
+    net_inc   = row(inc, "Net Income", "Net Income Common Stockholders")
+    pretax    = row(inc, "Pretax Income")
+    tax_prov  = row(inc, "Tax Provision")
+    interest  = row(inc, "Interest Expense", "Interest Expense Non Operating")
+
+    total_debt = row(bs, "Total Debt") \
+                 or ((row(bs, "Long Term Debt") or 0) + (row(bs, "Current Debt", "Short Term Debt") or 0)) or None
+    cash       = row(bs, "Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments")
+    equity_bv  = row(bs, "Stockholders Equity", "Total Equity Gross Minority Interest")
+
+    cfo   = row(cf, "Operating Cash Flow", "Cash Flow From Continuing Operating Activities")
+    capex = row(cf, "Capital Expenditure", "Purchase Of PPE")
+    fcf   = row(cf, "Free Cash Flow")
+    if fcf is None and cfo is not None and capex is not None:
+        fcf = cfo + capex
+
+    cfo_s   = full_row(cf, "Operating Cash Flow", "Cash Flow From Continuing Operating Activities")
+    capex_s = full_row(cf, "Capital Expenditure", "Purchase Of PPE")
+    fcf_hist = (cfo_s + capex_s).dropna() if (cfo_s is not None and capex_s is not None) else None
+
+    T = ttm_values(B.quarterly) if basis == "ttm" else None
+    if T is not None:
+        # flussi TTM dove disponibili; consistenze dall'ultimo trimestre
+        pick = lambda k, old: T[k] if T.get(k) is not None else old
+        revenue, ebit, ebitda, net_inc = (pick("revenue", revenue), pick("ebit", ebit),
+                                          pick("ebitda", ebitda), pick("net_income", net_inc))
+        pretax, tax_prov, interest = pick("pretax", pretax), pick("tax", tax_prov), pick("interest", interest)
+        cfo, capex, fcf = pick("cfo", cfo), pick("capex", capex), pick("fcf", fcf)
+        total_debt, cash, equity_bv = pick("total_debt", total_debt), pick("cash", cash), pick("equity_bv", equity_bv)
+        shares = shares or T.get("shares")
+        if T.get("fcf") is not None:
+            # media: FCF TTM + esercizi chiusi almeno un anno prima (nessuna sovrapposizione)
+            older = [] if fcf_hist is None else \
+                [v for d, v in fcf_hist.items() if _naive(d) <= T["ttm_date"] - pd.DateOffset(days=360)]
+            fcf_hist = pd.Series([T["fcf"]] + older, dtype=float)
+
+    tax_rate = 0.25
+    if pretax and tax_prov is not None and pretax != 0:
+        tr = tax_prov / pretax
+        if 0 <= tr <= 0.40:
+            tax_rate = tr
+
+    fcf_norm = None
+    if fcf_hist is not None and not fcf_hist.empty:
+        fcf_norm = f(fcf_hist.mean())
+
+    dps = None
+    last = B.dividends_since(years=1)
+    if not last.empty:
+        dps = f(last.sum())
+    if dps is None:
+        dps = f(info.get("dividendRate"))
+
+    return Company(
+        symbol=symbol,
+        name=info.get("shortName") or info.get("longName") or symbol,
+        sector=info.get("sector"),
+        currency=info.get("currency") or "",
+        fin_currency=info.get("reportedCurrency") or info.get("financialCurrency") or info.get("currency") or "",
+        fx_rate=f(info.get("fxRate")),
+        price=price, shares=shares,
+        mktcap=f(info.get("marketCap")) or ((price*shares) if (price and shares) else None),
+        beta=f(info.get("beta")) or 1.0,
+        revenue=revenue, ebit=ebit, ebitda=ebitda, net_income=net_inc,
+        interest=abs(interest) if interest else None, tax_rate=tax_rate,
+        total_debt=total_debt, cash=cash, equity_bv=equity_bv,
+        cfo=cfo, capex=capex, fcf=fcf, fcf_norm=fcf_norm,
+        dps=dps if (dps and dps > 0) else None,
+        eps_t=f(info.get("trailingEps")), eps_f=f(info.get("forwardEps")),
+        bvps=f(info.get("bookValue")),
+        basis="ttm" if T is not None else "annual",
+        ttm_date=T["ttm_date"] if T is not None else None,
+    )
+
+
+def load_company(symbol, store=None, provider=None, basis="annual"):
+    """Dati della societa' (senza Streamlit): bundle dal provider o da `store`."""
+    return company_data(fetch_bundle(symbol, store, provider=provider, quarterly=basis == "ttm"), basis)
+
+
+def historical_multiples(symbol, shares_now, store=None, provider=None, basis="annual"):
+    return multiples_from_bundle(fetch_bundle(symbol, store, provider=provider, quarterly=basis == "ttm"),
+                                 shares_now, basis)
+
+def multiples_history(symbol, shares_now, store=None, provider=None, basis="annual"):
+    return multiple_history_from_bundle(fetch_bundle(symbol, store, provider=provider, quarterly=basis == "ttm"),
+                                        shares_now, basis)
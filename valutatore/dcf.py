@@ -0,0 +1,60 @@
+import math
+import numpy as np
+from typing import NamedTuple
+
+# =============================================================
+#  KERNEL DCF VETTORIALE (forma chiusa)
+#  PV dei flussi espliciti come rendita crescente:
+#      sum_{t=1..n} fcf0 * q^t,   q = (1+g)/(1+r)
+#    = fcf0 * q * (q^n - 1) / (q - 1)
+#  Valore terminale: fcf0 * q^n * (1+tg) / (r - tg)   (gia' scontato)
+#  Tutti gli input sono broadcastabili fra loro (scalari o array).
+#  dcf_scalar: stessa formula per un solo scenario, in aritmetica Python
+#  (dcf_fcff / dcf_diagnose di un titolo, senza il costo fisso di NumPy).
+# =============================================================
+
+class DCFResult(NamedTuple):
+    ev: np.ndarray          # enterprise value
+    equity: np.ndarray      # ev - debito netto
+    fair_value: np.ndarray  # equity / azioni
+    tv_weight: np.ndarray   # quota dell'EV dovuta al valore terminale
+
+
+def dcf_kernel(fcf0, g, years, term_g, discount, net_debt=0.0, shares=1.0):
+    """DCF FCFF in forma chiusa, su qualunque combinazione di parametri.
+    Dove discount <= term_g (valore terminale non definito) restituisce NaN."""
+    fcf0, g, n, tg, r, nd, sh = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (fcf0, g, years, term_g, discount, net_debt, shares)))
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        d = (g - r) / (1 + r)                     # q - 1, calcolato senza cancellazione
+        lq = np.log1p(d)
+        qn = np.exp(n * lq)                       # q^n
+        # sum_{t=1..n} q^t = q * (q^n - 1)/(q - 1); per q == 1 vale n
+        annuity = np.where(d == 0, n, (1 + d) * np.expm1(n * lq) / np.where(d == 0, 1.0, d))
+        explicit = fcf0 * annuity
+        pv_tv = fcf0 * qn * (1 + tg) / (r - tg)
+        ev = explicit + pv_tv
+        ok = r > tg
+        ev = np.where(ok, ev, np.nan)
+        pv_tv = np.where(ok, pv_tv, np.nan)
+        equity = ev - nd
+        fv = np.where(sh > 0, equity / sh, np.nan)
+        tv_w = np.where(ev != 0, pv_tv / ev, 0.0)
+    return DCFResult(ev, equity, fv, tv_w)
+
+
+def dcf_scalar(fcf0, g, years, term_g, discount, net_debt=0.0, shares=1.0):
+    """dcf_kernel per un solo scenario: DCFResult di float (NaN dove discount <= term_g)."""
+    if not discount > term_g:
+        return DCFResult(math.nan, math.nan, math.nan, math.nan)
+    try:
+        d = (g - discount) / (1 + discount)
+        lq = math.log1p(d)
+        qn = math.exp(years * lq)
+        annuity = years if d == 0 else (1 + d) * math.expm1(years * lq) / d
+    except (OverflowError, ValueError, ZeroDivisionError):   # casi limite: come il kernel
+        return DCFResult(*(float(v) for v in dcf_kernel(fcf0, g, years, term_g, discount, net_debt, shares)))
+    pv_tv = fcf0 * qn * (1 + term_g) / (discount - term_g)
+    ev = fcf0 * annuity + pv_tv
+    equity = ev - net_debt
+    return DCFResult(ev, equity, equity / shares if shares > 0 else math.nan, pv_tv / ev if ev != 0 else 0.0)
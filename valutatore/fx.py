@@ -0,0 +1,179 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+from .timing import span
+
+log = logging.getLogger(__name__)
+
+# =============================================================
+#  CAMBI (valuta di bilancio -> valuta del prezzo)
+#  Se i prospetti sono in una valuta diversa da quella del prezzo (ADR,
+#  titoli quotati in EUR che riportano in USD, ...) ogni colonna di bilancio
+#  si converte al cambio della SUA data (ultimo cambio disponibile a quella
+#  data: allineamento as-of con una ricerca binaria su tutte le date).
+#  Storico giornaliero per coppia (Yahoo "TWDUSD=X" = USD per 1 TWD):
+#    - cache su disco (FundamentalsStore, chiave fx:<coppia>)
+#    - cache di processo con un solo download in volo per coppia, condivisa
+#      da thread ed event loop diversi: un batch multi-valuta scarica ogni
+#      coppia una volta sola, non una volta per ticker.
+#  Le sottounita' (GBp = pence) si convertono con un fattore fisso.
+# =============================================================
+
+FX_PERIOD = "max"    # anche i bilanci piu' vecchi del backtest trovano un cambio
+SUBUNITS = {"GBp": ("GBP", 100.0), "GBX": ("GBP", 100.0), "ZAc": ("ZAR", 100.0), "ILA": ("ILS", 100.0)}
+# righe dei prospetti che non sono importi (non si convertono)
+NON_MONETARY = frozenset({"Share Issued", "Ordinary Shares Number", "Treasury Shares Number",
+                          "Diluted Average Shares", "Basic Average Shares", "Tax Rate For Calcs", "shares"})
+
+
+def _base(ccy):
+    return SUBUNITS.get(ccy, (ccy, 1.0))
+
+
+def fx_pair(from_ccy, to_ccy):
+    """(simbolo Yahoo della coppia o None, fattore fisso): importo_to = importo_from * cambio * fattore.
+    None, None se non serve conversione o le valute non sono note."""
+    if not from_ccy or not to_ccy or from_ccy == to_ccy:
+        return None, None
+    (a, fa), (b, fb) = _base(from_ccy), _base(to_ccy)
+    factor = fb / fa
+    if a == b:
+        return None, factor          # es. GBP -> GBp: solo il fattore
+    return f"{a}{b}=X", factor
+
+
+def bundle_pair(B):
+    """Coppia e fattore per il bundle (valuta di bilancio -> valuta del prezzo)."""
+    info = B.info or {}
+    return fx_pair(info.get("financialCurrency"), info.get("currency"))
+
+
+def rates_at(fx, dates):
+    """Cambio as-of per ciascuna data (ultimo disponibile a quella data; prima dello storico il primo)."""
+    d = pd.DatetimeIndex(dates)
+    if d.tz is not None:
+        d = d.tz_localize(None)
+    i = np.searchsorted(fx.index.values, d.values.astype("datetime64[ns]"), side="right") - 1
+    return fx.to_numpy(float)[np.clip(i, 0, len(fx) - 1)]
+
+
+def _convert_statement(df, fx, factor):
+    """Prospetto formato yfinance (colonne = date): ogni colonna al cambio della sua data."""
+    if df is None or df.empty:
+        return df
+    r = rates_at(fx, pd.to_datetime(df.columns)) * factor if fx is not None else np.full(df.shape[1], factor)
+    money = ~df.index.isin(NON_MONETARY)
+    out = df.copy()
+    out.loc[money] = df.loc[money].apply(pd.to_numeric, errors="coerce").to_numpy(float) * r
+    return out
+
+
+def _convert_quarterly(Q, fx, factor):
+    """Serie trimestrale (righe = date): importi e somme TTM al cambio di fine trimestre."""
+    if Q is None or Q.empty:
+        return Q
+    r = rates_at(fx, Q.index) * factor if fx is not None else np.full(len(Q), factor)
+    cols = [c for c in Q.columns if c not in NON_MONETARY]
+    out = Q.copy()
+    out[cols] = Q[cols].to_numpy(float) * r[:, None]
+    return out
+
+
+def in_price_currency(B):
+    """Bundle con prospetti (e trimestrali) convertiti nella valuta del prezzo.
+    Stesso bundle se le valute coincidono o il cambio non e' disponibile; nell'info della
+    copia: financialCurrency = valuta del prezzo, reportedCurrency = valuta originale, fxRate = ultimo cambio."""
+    pair, factor = bundle_pair(B)
+    if factor is None:
+        return B
+    fx = B.fx if pair is not None else None
+    if pair is not None and (fx is None or fx.empty):
+        return B   # senza cambio i dati restano come sono (la pagina mostra l'avviso)
+    info = dict(B.info)
+    last = float(fx.iloc[-1]) * factor if fx is not None else factor
+    if info.get("ebitda") is not None:
+        info["ebitda"] = info["ebitda"] * last
+    info.update(reportedCurrency=info.get("financialCurrency"), financialCurrency=info.get("currency"), fxRate=last)
+    return replace(B, info=info, fx=None,
+                   income_stmt=_convert_statement(B.income_stmt, fx, factor),
+                   balance_sheet=_convert_statement(B.balance_sheet, fx, factor),
+                   cashflow=_convert_statement(B.cashflow, fx, factor),
+                   quarterly=_convert_quarterly(B.quarterly, fx, factor))
+
+
+class FxRates:
+    """Storici dei cambi in memoria, con un solo download in volo per coppia (anche fra thread)."""
+
+    def __init__(self, ttl=6 * 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._series = {}     # (provider, coppia) -> (istante, serie)
+        self._inflight = {}   # (provider, coppia) -> concurrent.futures.Future
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    async def series(self, pair, provider, store=None, counter=None):
+        key = (id(provider), pair)
+        with self._lock:
+            hit = self._series.get(key)
+            if hit is not None and time.monotonic() - hit[0] < self.ttl:
+                return hit[1]
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = concurrent.futures.Future()
+        if not owner:   # gia' in download (questo o un altro thread): si aspetta quello
+            return await asyncio.wrap_future(fut)
+        s = None
+        try:
+            s = await self._fetch(pair, provider, store, counter)
+        except Exception as e:
+            log.warning("cambio %s non disponibile (%s)", pair, e)
+        finally:
+            with self._lock:
+                if s is not None:
+                    self._series[key] = (time.monotonic(), s)
+                self._inflight.pop(key, None)
+            fut.set_result(s)
+        return s
+
+    @staticmethod
+    async def _fetch(pair, provider, store, counter):
+        cached = store is not None and provider.cacheable
+
+        async def afetch():
+            if counter is not None:
+                counter.hit("fx")
+            if cached:   # storico locale: solo le sedute mancanti (valutatore.prices)
+                return await store.prices.aupdate(pair, provider, FX_PERIOD)
+            return await provider.history(pair, FX_PERIOD)
+        with span(f"fetch fx {pair}", "fetch"):
+            if not cached:
+                return _rates(await afetch(), pair)
+            got = await store.aget_or_fetch(f"fx:{pair}", "fx", afetch)
+            h = store.prices.frame(pair)
+            if h is None and isinstance(got, pd.Series):   # voce scritta da una versione precedente
+                return got
+            return _rates(h, pair)
+
+
+def _rates(h, pair):
+    if h is None or h.empty or "Close" not in h:
+        return None
+    s = pd.to_numeric(h["Close"], errors="coerce")
+    s = s[s > 0].dropna()
+    if getattr(s.index, "tz", None) is not None:
+        s.index = s.index.tz_localize(None)
+    return s.sort_index().rename(pair)
+
+
+FX = FxRates()
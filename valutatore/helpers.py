@@ -0,0 +1,68 @@
+import numpy as np
+
+# =============================================================
+#  HELPERS
+# =============================================================
+def f(x, default=None):
+    try:
+        v = float(x)
+        return default if (v != v) else v
+    except Exception:
+        return default
+
+def fmt(v, dec=2, suffix=""):
+    return f"{v:,.{dec}f}{suffix}" if v is not None else "N/D"
+
+def fmt_big(v):
+    if v is None: return "N/D"
+    a = abs(v)
+    if a >= 1e12: return f"{v/1e12:,.2f} T"
+    if a >= 1e9:  return f"{v/1e9:,.2f} B"
+    if a >= 1e6:  return f"{v/1e6:,.2f} M"
+    return f"{v:,.0f}"
+
+def row(df, *names):
+    if df is None or df.empty: return None
+    for n in names:
+        if n in df.index:
+            s = df.loc[n].dropna()
+            if not s.empty:
+                return f(s.iloc[0])
+    return None
+
+def full_row(df, *names):
+    """Riga completa (tutti gli anni) come Series indicizzata per data."""
+    if df is None or df.empty: return None
+    for n in names:
+        if n in df.index:
+            s = df.loc[n].dropna()
+            if not s.empty:
+                return s.astype(float)
+    return None
+
+# ColorBrewer RdYlGn a 11 classi: gli stessi punti della mappa "RdYlGn" di matplotlib
+RDYLGN = ("#a50026", "#d73027", "#f46d43", "#fdae61", "#fee08b", "#ffffbf",
+          "#d9ef8b", "#a6d96a", "#66bd63", "#1a9850", "#006837")
+
+def _luminance(rgb):
+    r, g, b = (x / 12.92 if x <= 0.04045 else ((x + 0.055) / 1.055) ** 2.4 for x in rgb)
+    return 0.2126*r + 0.7152*g + 0.0722*b
+
+def gradient_css(values, colors=RDYLGN, text_threshold=0.408):
+    """Stili CSS cella per cella come Styler.background_gradient(axis=None), senza matplotlib:
+    sfondo interpolato fra minimo e massimo, testo chiaro sugli sfondi scuri, celle vuote senza stile.
+    Uso: df.style.apply(gradient_css, axis=None)."""
+    x = np.asarray(values, dtype=float)
+    ok = np.isfinite(x)
+    if not ok.any():
+        return np.full(x.shape, "", dtype=object)
+    lo, hi = x[ok].min(), x[ok].max()
+    t = np.where(ok, (x - lo) / (hi - lo) if hi > lo else 0.5, 0.0)
+    anchors = np.array([[int(c[i:i+2], 16) / 255 for i in (1, 3, 5)] for c in colors])
+    pos = np.linspace(0, 1, len(colors))
+    out = np.full(x.shape, "", dtype=object)
+    for idx in zip(*np.nonzero(ok)):
+        rgb = [float(np.interp(t[idx], pos, anchors[:, k])) for k in range(3)]
+        text = "#f1f1f1" if _luminance(rgb) < text_threshold else "#000000"
+        out[idx] = "background-color: #{:02x}{:02x}{:02x};color: {};".format(*(round(v * 255) for v in rgb), text)
+    return out
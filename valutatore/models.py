@@ -0,0 +1,117 @@
+from .dcf import dcf_scalar
+from .helpers import fmt_big
+from .solver import implied_growth_scalar
+from .timing import timed
+
+# =============================================================
+#  MODELLI
+# =============================================================
+@timed()
+def wacc(beta, rf, erp, kd_pretax, tax, e, d):
+    ke = rf + beta * erp
+    kd = kd_pretax * (1 - tax)
+    v = e + d
+    return ke if v <= 0 else ke*(e/v) + kd*(d/v)
+
+@timed()
+def dcf_fcff(fcf0, g, years, term_g, discount, net_debt, shares):
+    if not all(v is not None for v in [fcf0, discount, shares]) or shares <= 0 or discount <= term_g:
+        return None
+    return float(dcf_scalar(fcf0, g, years, term_g, discount, net_debt or 0, shares).fair_value)
+
+@timed()
+def dcf_diagnose(fcf0, g, years, term_g, discount, net_debt, shares):
+    """Restituisce (enterprise_value, equity_value, fair_value, lista_avvisi).
+    Spiega in modo leggibile perche' il DCF e' negativo o inaffidabile."""
+    warns = []
+    if discount is None or shares in (None, 0):
+        return None, None, None, ["Dati insufficienti (WACC o numero azioni mancante)."]
+    if discount <= term_g:
+        warns.append(f"WACC ({discount*100:.1f}%) <= crescita terminale ({term_g*100:.1f}%): "
+                     f"il valore terminale diventa infinito/negativo. Abbassa la crescita terminale.")
+        return None, None, None, warns
+
+    # Enterprise value (senza togliere il debito)
+    nd = net_debt or 0
+    res = dcf_scalar(fcf0 if fcf0 is not None else 0.0, g, years, term_g, discount, nd, shares)
+    ev, equity, fv = float(res.ev), float(res.equity), float(res.fair_value)
+
+    # diagnosi
+    if fcf0 is None:
+        warns.append("FCF di partenza non disponibile: impossibile calcolare un DCF affidabile.")
+    elif fcf0 < 0:
+        warns.append(f"FCF di partenza NEGATIVO ({fmt_big(fcf0)}): l'azienda sta bruciando cassa. "
+                     f"Su questo profilo il DCF non e' lo strumento adatto - usa i multipli (P/Sales) o scenari.")
+    if ev > 0 and nd > ev:
+        warns.append(f"Debito netto ({fmt_big(nd)}) SUPERA l'enterprise value ({fmt_big(ev)}): "
+                     f"cio' che resta agli azionisti e' negativo. Titolo molto indebitato, "
+                     f"il FCFF qui e' fragile (basta un EV stimato poco diverso per ribaltare il segno).")
+    # term_g vicino al WACC -> TV dominante
+    if 0 < (discount - term_g) < 0.02:
+        peso_tv = float(res.tv_weight)
+        warns.append(f"WACC e crescita terminale molto vicini (spread {(discount-term_g)*100:.1f} punti): "
+                     f"il valore terminale pesa per il {peso_tv*100:.0f}% del totale e rende il risultato instabile.")
+    return ev, equity, fv, warns
+
+@timed()
+def reverse_dcf_growth(price, fcf0, years, term_g, discount, net_debt, shares):
+    if not all(v is not None for v in [price, fcf0, discount, shares]) or shares <= 0:
+        return None
+    if fcf0 <= 0 or discount <= term_g:
+        return None
+    return implied_growth_scalar(float(price), float(fcf0), years, term_g, discount, float(net_debt or 0),
+                                 float(shares), lo=-0.50, hi=0.60)
+
+@timed()
+def ddm_gordon(dps, ke, g):
+    if dps is None or dps <= 0 or ke <= g:
+        return None
+    return dps * (1 + g) / (ke - g)
+
+@timed()
+def multiple_fv(metric, mult):
+    return metric*mult if (metric is not None and mult and mult > 0) else None
+
+# =============================================================
+#  INPUT DEI MODELLI E SINTESI (condivisi da pagina, batch e CLI)
+# =============================================================
+MULTIPLES = ("P/E", "P/BV", "P/Sales", "P/EBITDA", "P/FCF")
+MULTIPLE_FALLBACK = {"P/E": 18.0, "P/BV": 2.5, "P/Sales": 3.0, "P/EBITDA": 12.0, "P/FCF": 18.0}
+
+def hist_default(HM, key, fallback=None):
+    """Default del multiplo = mediana storica del titolo (con fallback prudente). Ritorna (valore, n_anni)."""
+    fallback = MULTIPLE_FALLBACK[key] if fallback is None else fallback
+    v = HM.get(key, (None, 0))
+    return (round(v[0], 1) if v[0] else fallback), (v[1] if v else 0)
+
+def kd_auto(D):
+    """Costo del debito ante imposte stimato da interessi / debito (default 5%)."""
+    return (D["interest"]/D["total_debt"]) if (D["interest"] and D["total_debt"]) else 0.05
+
+def net_debt(D):
+    return (D["total_debt"] or 0) - (D["cash"] or 0)
+
+def fcf_base(D, use_norm=True):
+    return D["fcf_norm"] if (use_norm and D["fcf_norm"]) else D["fcf"]
+
+def per_share_metrics(D, fcf0):
+    """Metriche per azione usate dai multipli, nell'ordine di MULTIPLES."""
+    sh = D["shares"]
+    eps   = D["eps_f"] or D["eps_t"] or ((D["net_income"]/sh) if (D["net_income"] and sh) else None)
+    bvps  = D["bvps"] or ((D["equity_bv"]/sh) if (D["equity_bv"] and sh) else None)
+    salesps  = (D["revenue"]/sh) if (D["revenue"] and sh) else None
+    ebitdaps = (D["ebitda"]/sh) if (D["ebitda"] and sh) else None
+    fcfps    = (fcf0/sh) if (fcf0 and sh) else None
+    return dict(zip(MULTIPLES, (eps, bvps, salesps, ebitdaps, fcfps)))
+
+def ddm_applicable(dps, price):
+    """Il DDM si usa solo con dividend yield >= 0,5%."""
+    return bool(dps and price and dps/price >= 0.005)
+
+def verdict(upside):
+    """Giudizio sintetico dall'upside (%) del fair value mediano. Ritorna (etichetta, classe css)."""
+    if upside <= -20:   return "Sopravvalutata", "fv-dn"
+    elif upside <= -8:  return "Leggermente cara", "fv-dn"
+    elif upside < 10:   return "In linea col prezzo", "muted"
+    elif upside < 25:   return "Potenzialmente sottovalutata", "fv-up"
+    else:               return "Marcatamente sottovalutata", "fv-up"
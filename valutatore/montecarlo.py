@@ -0,0 +1,120 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .dcf import dcf_kernel
+from .models import ddm_applicable, fcf_base, net_debt
+
+# =============================================================
+#  MONTE CARLO SUL FAIR VALUE (DCF e DDM)
+#  Estrazioni congiunte di crescita FCF, rf, ERP, beta, kd, crescita
+#  terminale e crescita dei dividendi, valutate in blocchi vettoriali.
+#  La memoria resta limitata alla dimensione del blocco: per i percentili
+#  si accumula un istogramma fine (bordi fissati sul primo blocco)
+#  invece di tenere tutti i campioni.
+# =============================================================
+
+class Dist(NamedTuple):
+    kind: str        # "normal" | "uniform" | "triangular" | "fixed"
+    a: float
+    b: float = 0.0
+    c: float = 0.0
+
+    def sample(self, rng, n):
+        if self.kind == "normal":
+            return rng.normal(self.a, self.b, n)
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b, n)
+        if self.kind == "triangular":
+            return rng.triangular(self.a, self.b, self.c, n)
+        return np.full(n, float(self.a))
+
+
+def normal(mean, sd):            return Dist("normal", mean, sd) if sd > 0 else fixed(mean)
+def uniform(lo, hi):             return Dist("uniform", lo, hi) if hi > lo else fixed(lo)
+def triangular(lo, mode, hi):    return Dist("triangular", lo, mode, hi) if hi > lo else fixed(mode)
+def fixed(value):                return Dist("fixed", value)
+
+
+def around(family, center, width):
+    """Distribuzione centrata su `center`: normal (sd = width), uniform (+-width), triangular (+-width)."""
+    if family == "uniform":
+        return uniform(center - width, center + width)
+    if family == "triangular":
+        return triangular(center - width, center, center + width)
+    return normal(center, width)
+
+
+VARIABLES = ("g_fcf", "rf", "erp", "beta", "kd", "term_g", "g_ddm")
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+
+class MCResult(NamedTuple):
+    n: int                   # campioni con fair value definito
+    n_total: int
+    mean: float
+    percentiles: dict        # {5: ..., 50: ..., 95: ...}
+    prob_above: float        # P(fair value > prezzo)
+    counts: np.ndarray       # istogramma (senza code)
+    edges: np.ndarray
+
+
+class _Accumulator:
+    def __init__(self, bins):
+        self.bins = bins; self.edges = None; self.counts = None
+        self.under = self.over = self.n = self.above = 0; self.total = 0.0
+
+    def add(self, x, price):
+        x = x[np.isfinite(x)]
+        if x.size == 0:
+            return
+        if self.edges is None:
+            lo, hi = np.percentile(x, [0.5, 99.5])
+            pad = (hi - lo) * 0.5 or abs(hi) * 0.1 or 1.0
+            self.edges = np.linspace(lo - pad, hi + pad, self.bins + 1)
+            self.counts = np.zeros(self.bins, dtype=np.int64)
+        self.counts += np.histogram(x, self.edges)[0]
+        self.under += int((x < self.edges[0]).sum()); self.over += int((x > self.edges[-1]).sum())
+        self.n += x.size; self.total += float(x.sum())
+        if price:
+            self.above += int((x > price).sum())
+
+    def result(self, n_total):
+        if not self.n:
+            return MCResult(0, n_total, float("nan"), {p: float("nan") for p in PERCENTILES}, float("nan"),
+                            np.zeros(0), np.zeros(0))
+        cum = self.under + np.concatenate([[0], np.cumsum(self.counts)])   # CDF ai bordi
+        pct = {p: float(np.interp(p / 100 * self.n, cum, self.edges)) for p in PERCENTILES}
+        return MCResult(self.n, n_total, self.total / self.n, pct, self.above / self.n, self.counts, self.edges)
+
+
+def simulate(D, dists, price, years, use_norm=True, n=1_000_000, chunk=250_000, seed=None, bins=400):
+    """Distribuzione del fair value per DCF-FCFF e DDM.
+    `dists`: {variabile: Dist} per le voci di VARIABLES (beta e kd sono valori assoluti, le altre frazioni).
+    Ritorna {"DCF - FCFF": MCResult, "DDM - Gordon": MCResult | None}."""
+    rng = np.random.default_rng(seed)
+    fcf0 = fcf_base(D, use_norm)
+    sh = D["shares"]
+    nd = net_debt(D)
+    e, d, tax = D["mktcap"] or 0, D["total_debt"] or 0, D["tax_rate"]
+    v = e + d
+    dps = D["dps"]
+    do_dcf = bool(fcf0 and sh)
+    do_ddm = ddm_applicable(dps, price)
+    acc = {"DCF - FCFF": _Accumulator(bins), "DDM - Gordon": _Accumulator(bins)}
+
+    done = 0
+    while done < n:
+        m = min(chunk, n - done); done += m
+        s = {k: dists[k].sample(rng, m) for k in VARIABLES}
+        ke = s["rf"] + s["beta"] * s["erp"]
+        w = ke if v <= 0 else ke * (e / v) + s["kd"] * (1 - tax) * (d / v)
+        if do_dcf:
+            acc["DCF - FCFF"].add(dcf_kernel(fcf0, s["g_fcf"], years, s["term_g"], w, nd, sh).fair_value, price)
+        if do_ddm:
+            g = s["g_ddm"]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                acc["DDM - Gordon"].add(np.where(ke > g, dps * (1 + g) / (ke - g), np.nan), price)
+
+    return {"DCF - FCFF": acc["DCF - FCFF"].result(n) if do_dcf else None,
+            "DDM - Gordon": acc["DDM - Gordon"].result(n) if do_ddm else None}
@@ -0,0 +1,180 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .bundle import fetch_bundles
+from .data import company_data, multiples_from_bundle
+from .models import MULTIPLES, fcf_base, per_share_metrics
+from .provider import default_provider
+from .store import DEFAULT_DIR
+
+# =============================================================
+#  INDICE DI SETTORE (multipli dei peer)
+#  Precalcolato una volta su un universo, poi interrogato senza rete:
+#    current -> multiplo attuale (prezzo / metrica per azione della pagina)
+#    hist    -> mediana storica del titolo (come multiples_from_bundle)
+#  una riga per ticker, una colonna per multiplo (ordine di MULTIPLES),
+#  raggruppate per il `sector` di info. Per ogni (settore, tipo, multiplo)
+#  i valori validi si tengono ordinati: mediana, percentili e posizione di
+#  un titolo nel settore sono ricerche binarie, non scansioni dell'universo.
+#  Su disco: un .npz (<cache>/peers/<nome>.npz) con array numerici e testo.
+# =============================================================
+
+KINDS = ("current", "hist")
+ALL = "*"            # pseudo-settore: tutto l'universo
+MIN_PEERS = 3        # sotto questa soglia le statistiche di settore non si usano
+NO_SECTOR = "N/D"
+
+
+def current_multiples(D, use_norm=True):
+    """Multipli attuali del titolo: prezzo / metrica per azione usata dai modelli (None se non significativo)."""
+    price = D["price"]
+    out = {}
+    for key, metric in per_share_metrics(D, fcf_base(D, use_norm)).items():
+        r = price / metric if (price and metric and metric > 0) else None
+        out[key] = r if (r is not None and 0 < r < 1000) else None   # stessi limiti dei multipli storici
+    return out
+
+
+def peer_index_path(name="default"):
+    """<VALUTATORE_CACHE_DIR>/peers/<nome>.npz (o percorso esplicito)."""
+    p = Path(name)
+    if p.suffix == ".npz" or len(p.parts) > 1:
+        return p
+    return Path(os.environ.get("VALUTATORE_CACHE_DIR") or DEFAULT_DIR) / "peers" / f"{name}.npz"
+
+
+class PeerIndex:
+    """Multipli di un universo raggruppati per settore, con statistiche in tempo logaritmico."""
+
+    def __init__(self, symbols, sectors, current, hist, meta=None):
+        self.symbols = np.asarray(symbols, dtype=str)
+        self.sectors = np.asarray(sectors, dtype=str)
+        self.values = {"current": np.asarray(current, dtype=float).reshape(len(self.symbols), len(MULTIPLES)),
+                       "hist": np.asarray(hist, dtype=float).reshape(len(self.symbols), len(MULTIPLES))}
+        self.meta = dict(meta or {})
+        self._pos = {s: i for i, s in enumerate(self.symbols)}
+        self._sorted = {}
+        for sector in [ALL] + sorted(set(self.sectors)):
+            mask = np.ones(len(self.symbols), bool) if sector == ALL else self.sectors == sector
+            for kind, V in self.values.items():
+                for j, key in enumerate(MULTIPLES):
+                    v = V[mask, j]
+                    self._sorted[sector, kind, key] = np.sort(v[np.isfinite(v) & (v > 0)])
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    # ---------- costruzione ----------
+    @classmethod
+    def from_rows(cls, rows, meta=None):
+        """rows: dict con symbol, sector, current {multiplo: valore}, hist {multiplo: valore}."""
+        rows = list(rows)
+        grid = lambda kind: [[np.nan if r[kind].get(k) is None else r[kind][k] for k in MULTIPLES] for r in rows]
+        return cls([r["symbol"] for r in rows], [r["sector"] or NO_SECTOR for r in rows],
+                   grid("current") if rows else np.zeros((0, len(MULTIPLES))),
+                   grid("hist") if rows else np.zeros((0, len(MULTIPLES))), meta)
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, symbols=self.symbols, sectors=self.sectors, current=self.values["current"],
+                 hist=self.values["hist"], meta=np.asarray(json.dumps(self.meta, default=str)))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            return cls(z["symbols"], z["sectors"], z["current"], z["hist"], json.loads(str(z["meta"])))
+
+    # ---------- interrogazione ----------
+    def sector_of(self, symbol):
+        i = self._pos.get(symbol)
+        return str(self.sectors[i]) if i is not None else None
+
+    def peers(self, sector):
+        """Ticker del settore (ALL = tutto l'universo)."""
+        return list(self.symbols if sector == ALL else self.symbols[self.sectors == (sector or NO_SECTOR)])
+
+    def _values(self, sector, key, kind):
+        return self._sorted.get((sector or NO_SECTOR, kind, key), np.zeros(0))
+
+    def quantile(self, sector, key, q=50, kind="current"):
+        """Percentile `q` (0-100) del multiplo nel settore; None con meno di MIN_PEERS valori."""
+        v = self._values(sector, key, kind)
+        return float(np.percentile(v, q)) if len(v) >= MIN_PEERS else None
+
+    def sector_stats(self, sector, kind="current"):
+        """{multiplo: (mediana, p25, p75, n)} del settore."""
+        out = {}
+        for key in MULTIPLES:
+            v = self._values(sector, key, kind)
+            out[key] = ((float(np.median(v)), float(np.percentile(v, 25)), float(np.percentile(v, 75)), len(v))
+                        if len(v) >= MIN_PEERS else (None, None, None, len(v)))
+        return out
+
+    def percentile_of(self, sector, key, value, kind="current"):
+        """Posizione (0-100) di `value` fra i peer: quota di peer con multiplo piu' basso (rango medio)."""
+        v = self._values(sector, key, kind)
+        if value is None or not len(v) or not value == value:
+            return None
+        lo, hi = np.searchsorted(v, value, "left"), np.searchsorted(v, value, "right")
+        return float((lo + hi) / 2 / len(v) * 100)
+
+    def percentiles(self, sectors, key, values, kind="current"):
+        """percentile_of su colonne intere (settore e valore per riga): una ricerca per settore."""
+        sectors, values = np.asarray(sectors, dtype=str), np.asarray(values, dtype=float)
+        out = np.full(len(values), np.nan)
+        for sector in np.unique(sectors):
+            m = (sectors == sector) & np.isfinite(values)
+            v = self._values(sector or None, key, kind)
+            if len(v) and m.any():
+                lo, hi = np.searchsorted(v, values[m], "left"), np.searchsorted(v, values[m], "right")
+                out[m] = (lo + hi) / 2 / len(v) * 100
+        return out
+
+    def rank(self, symbol, sector=None, multiples=None, kind="current"):
+        """Dove si colloca il titolo nel suo settore: {multiplo: {value, percentile, median, n}}.
+        `multiples` (es. quelli attuali appena calcolati) sostituisce i valori salvati nell'indice;
+        `sector` serve per i titoli non presenti nell'indice."""
+        i = self._pos.get(symbol)
+        sector = sector or (str(self.sectors[i]) if i is not None else None)
+        out = {}
+        for j, key in enumerate(MULTIPLES):
+            val = multiples.get(key) if multiples is not None else \
+                (float(self.values[kind][i, j]) if i is not None else None)
+            val = val if (val is not None and val == val) else None
+            v = self._values(sector, key, kind)
+            out[key] = {"value": val, "percentile": self.percentile_of(sector, key, val, kind),
+                        "median": float(np.median(v)) if len(v) >= MIN_PEERS else None, "n": len(v)}
+        return out
+
+
+def peer_default(index, sector, key, q=50, kind="current"):
+    """Default del multiplo dal settore (percentile `q`), con ripiego su tutto l'universo."""
+    if index is None:
+        return None
+    v = index.quantile(sector, key, q, kind)
+    return v if v is not None else index.quantile(ALL, key, q, kind)
+
+
+def peer_row(B, basis="annual"):
+    D = company_data(B, basis)
+    HM = multiples_from_bundle(B, D["shares"], basis) if D["shares"] else {}
+    return {"symbol": B.symbol, "sector": D["sector"], "current": current_multiples(D) if D["price"] else {},
+            "hist": {k: v[0] for k, v in HM.items()}}
+
+
+def build_peer_index(tickers, store=None, provider=None, max_concurrency=16, basis="annual"):
+    """Scarica (o legge da cache/snapshot) l'universo e calcola l'indice di settore."""
+    provider = provider or default_provider()
+    bundles = fetch_bundles(tickers, store, provider, max_concurrency, quarterly=basis == "ttm")
+    rows = [peer_row(B, basis) for B in bundles if B.info or (B.history is not None and not B.history.empty)]
+    return PeerIndex.from_rows(rows, meta={"created": time.time(), "basis": basis, "tickers": len(rows),
+                                           "source": provider.name})
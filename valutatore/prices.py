@@ -0,0 +1,213 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:   # Windows: basta il lease del negozio
+    fcntl = None
+
+# =============================================================
+#  STORICO PREZZI LOCALE (append-only, in memory-map)
+#  Una cartella per ticker (<cache>/prices/<TICKER>/) con una colonna per
+#  file binario (date in giorni, poi float64) e un meta.json con il numero
+#  di righe valide: chi legge apre i file in memory-map e vede solo le
+#  righe gia' confermate dal meta, anche mentre un altro processo scrive.
+#  Aggiornamento incrementale: al primo uso si scarica il periodo chiesto
+#  (6 anni per la pagina, "max" per il backtest), poi solo
+#  le sedute dall'ultima data salvata (compresa: la seduta in corso si
+#  corregge in place) che si accodano ai file.
+#  I prezzi di Yahoo sono rettificati per dividendi e frazionamenti: se fra
+#  le sedute nuove c'e' uno stacco, le chiusure gia' salvate non valgono
+#  piu' e lo storico si riscarica per intero (nuova generazione di file,
+#  i lettori aperti continuano a vedere la vecchia).
+#  Il fuso orario si toglie qui, una volta sola, alla scrittura.
+# =============================================================
+
+COLUMNS = {"close": "Close", "dividends": "Dividends", "splits": "Stock Splits"}
+DATE = np.dtype("<M8[D]")
+VALUE = np.dtype("<f8")
+UNITS = {"d": 1 / 365, "wk": 7 / 365, "mo": 1 / 12, "y": 1.0}
+
+
+def period_years(period):
+    """Durata di un periodo di Yahoo in anni ("6y" -> 6, "18mo" -> 1.5, "max" -> infinito)."""
+    if period in (None, "max"):
+        return float("inf")
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if period.endswith(unit) and period[:-len(unit)].isdigit():
+            return int(period[:-len(unit)]) * UNITS[unit]
+    raise ValueError(f"periodo non riconosciuto: {period!r}")
+
+
+def _clean(h):
+    """Storico del provider -> (date in giorni, {colonna: float64}) ordinato, senza duplicati."""
+    if h is None or h.empty or "Close" not in h:
+        return np.zeros(0, DATE), {k: np.zeros(0, VALUE) for k in COLUMNS}
+    idx = h.index
+    if getattr(idx, "tz", None) is not None:
+        idx = idx.tz_localize(None)
+    dates = pd.DatetimeIndex(idx).normalize().values.astype(DATE)
+    cols = {k: (pd.to_numeric(h[c], errors="coerce").to_numpy(VALUE) if c in h else np.zeros(len(h), VALUE))
+            for k, c in COLUMNS.items()}
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order]
+    keep = np.append(dates[1:] != dates[:-1], True)   # a parita' di data vale l'ultima riga
+    return dates[keep], {k: v[order][keep] for k, v in cols.items()}
+
+
+class PriceStore:
+    """Storici giornalieri per ticker su disco, aggiornati per accodamento."""
+
+    def __init__(self, directory):
+        self.dir = Path(directory)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _path(self, symbol):
+        return self.dir / symbol.upper().replace("/", "_")
+
+    def meta(self, symbol):
+        """{gen, rows, period, first, last, updated} oppure None se il ticker non e' salvato."""
+        try:
+            return json.loads((self._path(symbol) / "meta.json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, symbol, meta):
+        p = self._path(symbol) / "meta.json"
+        tmp = p.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(dict(meta, updated=time.time())))
+        os.replace(tmp, p)   # atomico: i lettori vedono il vecchio o il nuovo
+
+    @contextmanager
+    def _locked(self, symbol):
+        """Un solo scrittore per ticker: fra thread (lock) e fra processi (flock, dove c'e')."""
+        with self._lock:
+            lock = self._locks.setdefault(symbol, threading.Lock())
+        with lock:
+            d = self._path(symbol)
+            d.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(d / ".lock", "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ---------- lettura ----------
+    def _array(self, symbol, name, gen, dtype, rows):
+        if not rows:
+            return np.zeros(0, dtype)
+        return np.memmap(self._path(symbol) / f"{name}.{gen}.bin", dtype=dtype, mode="r", shape=(rows,))
+
+    def frame(self, symbol):
+        """Storico salvato come DataFrame (Close, Dividends, Stock Splits; indice tz-naive)
+        con le colonne in memory-map, oppure None."""
+        m = self.meta(symbol)
+        if m is None or not m["rows"]:
+            return None
+        gen, n = m["gen"], m["rows"]
+        idx = pd.DatetimeIndex(self._array(symbol, "date", gen, DATE, n).astype("M8[us]"), name="Date")
+        return pd.DataFrame({c: self._array(symbol, k, gen, VALUE, n) for k, c in COLUMNS.items()},
+                            index=idx, copy=False)
+
+    def covers(self, symbol, period):
+        """True se lo storico salvato e' stato scaricato su almeno `period`."""
+        m = self.meta(symbol)
+        return bool(m and m["rows"]) and period_years(m["period"]) >= period_years(period)
+
+    def last_date(self, symbol):
+        m = self.meta(symbol)
+        return m["last"] if m and m["rows"] else None
+
+    # ---------- scrittura ----------
+    def write(self, symbol, h, period):
+        """Sostituisce lo storico del ticker (nuova generazione di file) scaricato su `period`.
+        Ritorna le righe."""
+        dates, cols = _clean(h)
+        with self._locked(symbol):
+            old = self.meta(symbol)
+            gen = old["gen"] + 1 if old else 1
+            d = self._path(symbol)
+            dates.tofile(d / f"date.{gen}.bin")
+            for k, v in cols.items():
+                v.tofile(d / f"{k}.{gen}.bin")
+            self._write_meta(symbol, {"gen": gen, "rows": len(dates), "period": period,
+                                      "first": str(dates[0]) if len(dates) else None,
+                                      "last": str(dates[-1]) if len(dates) else None})
+            if old:
+                for p in d.glob(f"*.{old['gen']}.bin"):
+                    p.unlink(missing_ok=True)   # i memory-map gia' aperti restano validi
+        return len(dates)
+
+    def append(self, symbol, h):
+        """Accoda le sedute di `h` successive all'ultima salvata (l'ultima si riscrive).
+        Ritorna le righe nuove, oppure None se serve riscaricare tutto (stacco o
+        frazionamento fra le sedute nuove, o ticker non ancora salvato)."""
+        dates, cols = _clean(h)
+        with self._locked(symbol):
+            m = self.meta(symbol)
+            if m is None or not m["rows"]:
+                return None
+            gen, n = m["gen"], m["rows"]
+            last = np.datetime64(m["last"], "D")
+            new = dates >= last
+            if not new.any():
+                return 0
+            dates, cols = dates[new], {k: v[new] for k, v in cols.items()}
+            same = dates[0] == last
+            action = (cols["dividends"] > 0) | ((cols["splits"] != 0) & np.isfinite(cols["splits"]))
+            if same:
+                stored = [self._array(symbol, k, gen, VALUE, n)[-1] for k in ("dividends", "splits")]
+                if stored[0] > 0 or (stored[1] != 0 and np.isfinite(stored[1])):
+                    action[0] = False   # stacco gia' salvato con la seduta
+            if action.any():
+                return None
+            d = self._path(symbol)
+            start = n - 1 if same else n
+            for name, v in [("date", dates)] + list(cols.items()):
+                with open(d / f"{name}.{gen}.bin", "r+b") as fh:
+                    fh.seek(start * v.dtype.itemsize)
+                    fh.write(v.tobytes())
+                    fh.truncate()
+            self._write_meta(symbol, dict(m, rows=start + len(dates), last=str(dates[-1])))
+            return len(dates) - same
+
+    async def aupdate(self, symbol, provider, period, fetched=None):
+        """Porta lo storico del ticker alla seduta piu' recente: solo le sedute dall'ultima
+        data salvata, oppure tutto `period` al primo uso, dopo uno stacco o se quello
+        salvato copre un periodo piu' corto (es. "max" del backtest dopo i "6y" della pagina).
+        `fetched` gia' scaricato (download multiplo del batch) evita la richiesta."""
+        m = self.meta(symbol)
+        if self.covers(symbol, period):
+            h = fetched if fetched is not None else await provider.history(symbol, period, start=m["last"])
+            if self.append(symbol, h) is not None:
+                return self.marker(symbol)
+            period = max(period, m["period"], key=period_years)   # si riscarica tutto quanto c'era
+            first = _clean(fetched)[0] if fetched is not None else None
+            if first is None or not len(first) or first[0] > np.datetime64(m["first"], "D"):
+                fetched = None   # il download del batch era solo incrementale
+        h = fetched if fetched is not None else await provider.history(symbol, period)
+        if h is None or h.empty or "Close" not in h:
+            return {}   # niente da salvare: la voce del negozio resta un marcatore vuoto
+        self.write(symbol, h, period)
+        return self.marker(symbol)
+
+    def marker(self, symbol):
+        """Riassunto dello storico salvato (la voce <ticker>:history del negozio)."""
+        m = self.meta(symbol) or {}
+        return {k: m.get(k) for k in ("rows", "last", "gen")}
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
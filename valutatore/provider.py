@@ -0,0 +1,272 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from .timing import span
+
+log = logging.getLogger(__name__)
+
+# =============================================================
+#  PROVIDER DI DATI (asyncio)
+#  Interfaccia unica dietro al bundle: info, prospetti annuali, storico prezzi.
+#  - YahooProvider: yfinance con sessione HTTP condivisa, limite di richieste
+#    al secondo, concorrenza massima, timeout per richiesta e retry con backoff.
+#    Il timeout sta nella sessione HTTP (e nelle chiamate che lo accettano):
+#    e' il thread del pool a smettere di aspettare, non solo la coroutine.
+#    Un yf.Ticker per simbolo si riusa per TICKER_TTL secondi, cioe' per
+#    tutte le richieste del bundle, che partono insieme
+#  - LocalProvider: stessi dati letti da file (fixture), con latenza simulata
+#    opzionale, per test di carico senza rete
+#  Lo stato condiviso (limiter, pool) non dipende dall'event loop, cosi' lo
+#  stesso provider serve piu' thread che eseguono ciascuno il proprio loop.
+# =============================================================
+
+STATEMENTS = ("income_stmt", "balance_sheet", "cashflow")
+TICKER_TTL = 60.0   # yfinance tiene le risposte nel Ticker: oltre, se ne crea uno nuovo
+
+
+class ProviderError(RuntimeError):
+    """Richiesta fallita dopo tutti i tentativi."""
+
+
+class RateLimiter:
+    """Token bucket thread-safe: `rate` richieste al secondo, raffiche fino a `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+            self._t = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class Provider:
+    """Interfaccia dei backend. Tutti i metodi sono coroutine."""
+
+    name = "base"
+    cacheable = True   # False = non passare dalla cache su disco (es. snapshot registrati)
+
+    async def info(self, symbol):
+        raise NotImplementedError
+
+    async def statement(self, symbol, kind):
+        raise NotImplementedError
+
+    async def history(self, symbol, period, start=None):
+        """Storico giornaliero: ultimi `period` (es. "6y"), oppure dalla data `start` in poi."""
+        raise NotImplementedError
+
+    async def histories(self, symbols, period, start=None):
+        """Storici di piu' ticker; i backend possono usare un download multiplo."""
+        res = await asyncio.gather(*(self.history(s, period, start) for s in symbols), return_exceptions=True)
+        return {s: h for s, h in zip(symbols, res) if isinstance(h, pd.DataFrame) and not h.empty}
+
+
+class YahooProvider(Provider):
+    """yfinance. Con una `session` propria il timeout delle richieste e' quello della sessione."""
+
+    name = "yahoo"
+
+    def __init__(self, rate=4.0, burst=8, max_concurrency=8, timeout=20.0, retries=3, backoff=0.5, session=None):
+        self.limiter = RateLimiter(rate, burst)
+        self.timeout, self.retries, self.backoff = timeout, retries, backoff
+        self.session = session if session is not None else self._default_session(timeout)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="yahoo")
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_session(timeout):
+        # yfinance recenti usano curl_cffi: una sessione condivisa riusa le connessioni
+        try:
+            from curl_cffi import requests as creq
+            return creq.Session(impersonate="chrome", timeout=timeout)
+        except Exception:
+            return None
+
+    def _ticker(self, symbol):
+        import yfinance as yf
+        now = time.monotonic()
+        with self._lock:
+            hit = self._tickers.get(symbol)
+            if hit is not None and now - hit[0] < TICKER_TTL:
+                return hit[1]
+            for k in [k for k, (t0, _) in self._tickers.items() if now - t0 >= TICKER_TTL]:
+                del self._tickers[k]
+            t = yf.Ticker(symbol, session=self.session) if self.session is not None else yf.Ticker(symbol)
+            self._tickers[symbol] = (now, t)
+            return t
+
+    async def _call(self, what, fn):
+        loop = asyncio.get_running_loop()
+        last = None
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            try:
+                with span(what, "network", attempt=attempt + 1):
+                    # rete di sicurezza: il timeout vero e' nella sessione (info puo' fare
+                    # piu' richieste in fila, ognuna entro `timeout`)
+                    return await asyncio.wait_for(loop.run_in_executor(self._pool, fn), 3 * self.timeout)
+            except asyncio.TimeoutError:
+                # thread ancora bloccato nonostante il timeout della sessione: un altro
+                # tentativo occuperebbe un secondo posto del pool
+                raise ProviderError(f"{what}: nessuna risposta in {3 * self.timeout:g} s") from None
+            except Exception as e:
+                last = e
+                log.warning("%s: tentativo %d/%d fallito (%s)", what, attempt + 1, self.retries + 1, e or type(e).__name__)
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+        raise ProviderError(f"{what}: {last or type(last).__name__}")
+
+    async def info(self, symbol):
+        return await self._call(f"{symbol} info", lambda: self._ticker(symbol).info or {})
+
+    async def statement(self, symbol, kind):
+        return await self._call(f"{symbol} {kind}", lambda: getattr(self._ticker(symbol), kind, None))
+
+    async def history(self, symbol, period, start=None):
+        kw = {"start": start} if start else {"period": period}
+        return await self._call(f"{symbol} history", lambda: self._ticker(symbol).history(timeout=self.timeout, **kw))
+
+    async def histories(self, symbols, period, start=None, chunk=100):
+        import yfinance as yf
+        out = {}
+        for i in range(0, len(symbols), chunk):
+            part = list(symbols[i:i+chunk])
+            kw = dict({"start": start} if start else {"period": period}, group_by="ticker", actions=True,
+                      auto_adjust=True, threads=True, progress=False, timeout=self.timeout)
+            if self.session is not None:
+                kw["session"] = self.session
+            try:
+                df = await self._call(f"download {len(part)} ticker", lambda: yf.download(part, **kw))
+            except ProviderError:
+                continue
+            if df is None or df.empty:
+                continue
+            for t in part:
+                if isinstance(df.columns, pd.MultiIndex):
+                    if t not in df.columns.get_level_values(0):
+                        continue
+                    h = df[t]
+                else:
+                    h = df  # un solo ticker: colonne piatte
+                h = h.dropna(how="all")
+                if not h.empty and "Close" in h:
+                    out[t] = h
+        return out
+
+
+class LocalProvider(Provider):
+    """Dati da una cartella di fixture:  <dir>/<TICKER>/info.json, <prospetto>.pkl, history.pkl.
+    `latency` (secondi, con jitter) simula la rete nei test di carico."""
+
+    name = "local"
+
+    def __init__(self, directory, latency=0.0, jitter=0.0):
+        self.dir = Path(directory)
+        self.latency, self.jitter = latency, jitter
+
+    async def _wait(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _path(self, symbol, name):
+        return self.dir / symbol.upper() / name
+
+    def _load(self, symbol, name):
+        p = self._path(symbol, name)
+        if not p.exists():
+            return None
+        if p.suffix == ".json":
+            return json.loads(p.read_text())
+        with open(p, "rb") as fh:
+            return pickle.load(fh)
+
+    async def info(self, symbol):
+        await self._wait()
+        return self._load(symbol, "info.json") or {}
+
+    async def statement(self, symbol, kind):
+        await self._wait()
+        return self._load(symbol, f"{kind}.pkl")
+
+    async def history(self, symbol, period, start=None):
+        await self._wait()
+        h = self._load(symbol, "history.pkl")
+        if h is None or start is None:
+            return h
+        idx = h.index.tz_localize(None) if getattr(h.index, "tz", None) is not None else h.index
+        return h[idx >= pd.Timestamp(start)]
+
+
+def save_fixture(bundle, directory):
+    """Scrive un CompanyBundle nel formato letto da LocalProvider (per registrare fixture).
+    Lo storico del cambio, se presente, va nella cartella della coppia (es. TWDUSD=X/history.pkl)."""
+    d = Path(directory) / bundle.symbol.upper()
+    d.mkdir(parents=True, exist_ok=True)
+    (d / "info.json").write_text(json.dumps(bundle.info, default=str))
+    for name in STATEMENTS + ("history",):
+        v = getattr(bundle, name)
+        if v is not None:
+            with open(d / f"{name}.pkl", "wb") as fh:
+                pickle.dump(v, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    fx = getattr(bundle, "fx", None)
+    if fx is not None and not fx.empty:
+        p = Path(directory) / str(fx.name).upper()
+        p.mkdir(parents=True, exist_ok=True)
+        with open(p / "history.pkl", "wb") as fh:
+            pickle.dump(fx.to_frame("Close"), fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_provider():
+    """Provider di processo da variabili d'ambiente:
+    VALUTATORE_PROVIDER = yahoo (default) | local:<cartella fixture> | snapshot:<nome o cartella>
+    VALUTATORE_RATE (richieste/s), VALUTATORE_TIMEOUT (s), VALUTATORE_RETRIES, VALUTATORE_LATENCY (s, solo local)."""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            spec = os.environ.get("VALUTATORE_PROVIDER", "yahoo")
+            if spec.startswith("snapshot:"):
+                from .snapshot import SnapshotProvider
+                _DEFAULT = SnapshotProvider(spec[len("snapshot:"):])
+            elif spec.startswith("local:"):
+                _DEFAULT = LocalProvider(spec[len("local:"):], latency=float(os.environ.get("VALUTATORE_LATENCY", 0)))
+            else:
+                _DEFAULT = YahooProvider(rate=float(os.environ.get("VALUTATORE_RATE", 4.0)),
+                                         timeout=float(os.environ.get("VALUTATORE_TIMEOUT", 20.0)),
+                                         retries=int(os.environ.get("VALUTATORE_RETRIES", 3)))
+        return _DEFAULT
+
+
+def set_default_provider(provider):
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        _DEFAULT = provider
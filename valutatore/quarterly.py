@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+# =============================================================
+#  TRIMESTRALI E METRICHE TTM (ultimi dodici mesi)
+#  Yahoo restituisce solo gli ultimi 4-6 trimestri: la serie si conserva
+#  nella cache su disco e a ogni aggiornamento si aggiungono (o si
+#  correggono) solo i trimestri nuovi. Le somme mobili a 4 trimestri si
+#  ricalcolano solo dalla prima riga cambiata in poi.
+#  Una riga per trimestre (data di chiusura, crescente):
+#    flussi   -> valore del trimestre + colonna ttm_<voce>
+#    consistenze (debito, cassa, patrimonio, azioni) -> valore a fine trimestre
+# =============================================================
+
+QUARTERLY = {"income_stmt": "quarterly_income_stmt", "balance_sheet": "quarterly_balance_sheet",
+             "cashflow": "quarterly_cashflow"}
+
+FLOWS = {
+    "revenue":    ("Total Revenue", "Operating Revenue"),
+    "ebit":       ("EBIT", "Operating Income"),
+    "ebitda":     ("EBITDA", "Normalized EBITDA"),
+    "net_income": ("Net Income", "Net Income Common Stockholders"),
+    "pretax":     ("Pretax Income",),
+    "tax":        ("Tax Provision",),
+    "interest":   ("Interest Expense", "Interest Expense Non Operating"),
+    "cfo":        ("Operating Cash Flow", "Cash Flow From Continuing Operating Activities"),
+    "capex":      ("Capital Expenditure", "Purchase Of PPE"),
+}
+STOCKS = {
+    "total_debt": ("Total Debt",),
+    "cash":       ("Cash And Cash Equivalents", "Cash Cash Equivalents And Short Term Investments"),
+    "equity_bv":  ("Stockholders Equity", "Total Equity Gross Minority Interest"),
+    "shares":     ("Ordinary Shares Number", "Share Issued"),
+}
+TTM = tuple(FLOWS) + ("fcf",)
+MAX_WINDOW_DAYS = 300   # 4 trimestri consecutivi: fra la prima e l'ultima chiusura ~ 9 mesi
+
+
+def _pick(df, names):
+    if df is None or df.empty:
+        return None
+    for n in names:
+        if n in df.index:
+            s = pd.to_numeric(df.loc[n], errors="coerce")
+            if s.notna().any():
+                return s
+    return None
+
+
+def quarter_frame(inc, bs, cf):
+    """Prospetti trimestrali di Yahoo -> una riga per trimestre con flussi e consistenze."""
+    cols = {}
+    for src, spec in ((inc, FLOWS), (cf, FLOWS), (bs, STOCKS)):
+        for key, names in spec.items():
+            s = _pick(src, names)
+            if s is not None and key not in cols:
+                cols[key] = s
+    if not cols:
+        return None
+    Q = pd.DataFrame(cols)
+    Q.index = pd.to_datetime(Q.index)
+    if Q.index.tz is not None:
+        Q.index = Q.index.tz_localize(None)
+    Q = Q.reindex(columns=list(FLOWS) + list(STOCKS)).sort_index()
+    Q = Q[~Q.index.duplicated(keep="last")]
+    Q["fcf"] = Q["cfo"] + Q["capex"]
+    return Q
+
+
+def _ttm_from(Q, start):
+    """Somme mobili a 4 trimestri per le righe da `start` in poi (le precedenti restano).
+    Tutte le voci in un solo passaggio numpy; una finestra con buchi o non consecutiva e' NaN."""
+    cols = [f"ttm_{k}" for k in TTM]
+    missing = [c for c in cols if c not in Q]
+    if missing:
+        Q = Q.reindex(columns=list(Q.columns) + missing)
+    lo = max(0, start - 3)
+    x = Q[list(TTM)].to_numpy(dtype=float)[lo:]
+    d = Q.index.values[lo:]
+    out = np.full(x.shape, np.nan)
+    if len(x) >= 4:
+        consecutive = (d[3:] - d[:-3]) <= np.timedelta64(MAX_WINDOW_DAYS, "D")
+        out[3:] = np.where(consecutive[:, None], x[3:] + x[2:-1] + x[1:-2] + x[:-3], np.nan)
+    Q.iloc[start:, [Q.columns.get_loc(c) for c in cols]] = out[start - lo:]
+    return Q
+
+
+def merge_quarters(stored, fresh):
+    """Unisce i trimestri appena scaricati alla serie conservata.
+    I trimestri gia' presenti vengono sostituiti solo se i valori sono cambiati (revisioni).
+    Ritorna (serie aggiornata, date dei trimestri nuovi o modificati)."""
+    if fresh is None or fresh.empty:
+        return stored, []
+    if stored is None or stored.empty:
+        return _ttm_from(fresh.copy(), 0), list(fresh.index)
+    old = stored.reindex(fresh.index)[fresh.columns]
+    same = ((old == fresh) | (old.isna() & fresh.isna())).all(axis=1)
+    changed = list(fresh.index[~same])
+    if not changed:
+        return stored, []
+    Q = pd.concat([stored.drop(index=stored.index.intersection(changed)), fresh.loc[changed]]).sort_index()
+    return _ttm_from(Q, int(Q.index.get_indexer([min(changed)])[0])), changed
+
+
+def ttm_values(Q):
+    """Ultimi valori TTM (e consistenze dell'ultimo trimestre) come dict, o None se meno di 4 trimestri."""
+    if Q is None or Q.empty or "ttm_revenue" not in Q:
+        return None
+    ok = Q[[f"ttm_{k}" for k in TTM]].notna().any(axis=1)
+    if not ok.any():
+        return None
+    last = Q[ok].iloc[-1]
+    out = {"ttm_date": Q[ok].index[-1]}
+    for k in TTM:
+        v = last[f"ttm_{k}"]
+        out[k] = float(v) if v == v else None
+    tail = Q.iloc[-1]
+    for k in STOCKS:
+        v = tail[k] if tail[k] == tail[k] else Q[k].dropna().iloc[-1] if Q[k].notna().any() else None
+        out[k] = float(v) if v is not None else None
+    return out
+
+
+def ttm_series(Q, key):
+    """Serie TTM di una voce indicizzata per data di chiusura (solo finestre complete)."""
+    if Q is None or Q.empty or f"ttm_{key}" not in Q:
+        return None
+    s = Q[f"ttm_{key}"].dropna()
+    return s if not s.empty else None
@@ -0,0 +1,282 @@
+import warnings
+from dataclasses import astuple, dataclass, fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .dcf import dcf_kernel
+from .models import MULTIPLE_FALLBACK, MULTIPLES, verdict
+from .solver import implied_growth
+
+# =============================================================
+#  RECORD DELLA SOCIETA' E TABELLA COLONNARE
+#  Company      -> un titolo: dataclass con __slots__, immutabile, campi tipizzati.
+#                  Si legge anche come il vecchio dict (D["price"], D.get(...)),
+#                  quindi modelli e pagina non cambiano. Essendo immutabile si
+#                  puo' condividere dalla cache senza copie.
+#  CompanyTable -> molti titoli: struct-of-arrays, una colonna numpy per campo
+#                  (float64 con NaN = dato mancante, testo a larghezza fissa),
+#                  piu' i multipli storici (n x 5). ~250 byte di numeri per titolo:
+#                  10.000 societa', testi compresi, stanno in pochi MB.
+#  value_table  -> gli stessi modelli di value_company, in forma vettoriale
+#                  sulle colonne (nessun ciclo per titolo).
+# =============================================================
+
+def _slotted(cls):
+    """dataclass(slots=True) anche su Python 3.9: ricrea la classe con __slots__ sui campi
+    (senza i valori di default come attributi di classe, che __init__ conosce gia')."""
+    names = tuple(fl.name for fl in fields(cls))
+    ns = {k: v for k, v in cls.__dict__.items() if k not in names and k not in ("__dict__", "__weakref__")}
+    ns["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, ns)
+
+
+@_slotted
+@dataclass(frozen=True)
+class Company:
+    symbol: str
+    name: str
+    sector: str = None
+    currency: str = ""
+    fin_currency: str = ""
+    fx_rate: float = None
+    price: float = None
+    shares: float = None
+    mktcap: float = None
+    beta: float = 1.0
+    revenue: float = None
+    ebit: float = None
+    ebitda: float = None
+    net_income: float = None
+    interest: float = None
+    tax_rate: float = 0.25
+    total_debt: float = None
+    cash: float = None
+    equity_bv: float = None
+    cfo: float = None
+    capex: float = None
+    fcf: float = None
+    fcf_norm: float = None
+    dps: float = None
+    eps_t: float = None
+    eps_f: float = None
+    bvps: float = None
+    basis: str = "annual"
+    ttm_date: pd.Timestamp = None
+
+    # ---------- accesso come dict (compatibilita') ----------
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return FIELDS
+
+    def as_dict(self):
+        return dict(zip(FIELDS, astuple(self)))
+
+    # pickle (cache su disco, processi dei report): con __slots__ e frozen serve esplicito
+    def __getstate__(self):
+        return tuple(getattr(self, k) for k in FIELDS)
+
+    def __setstate__(self, state):
+        for k, v in zip(FIELDS, state):
+            object.__setattr__(self, k, v)
+
+
+FIELDS = tuple(fl.name for fl in fields(Company))
+TEXT = ("symbol", "name", "sector", "currency", "fin_currency", "basis")
+NUMERIC = tuple(k for k in FIELDS if k not in TEXT and k != "ttm_date")
+
+
+class CompanyTable:
+    """Molti titoli in colonne: `num` (n x campi numerici), testo, multipli storici (mediana e n)."""
+
+    __slots__ = ("num", "text", "ttm_date", "hm", "hm_n", "_col", "_pos")
+
+    def __init__(self, num, text, ttm_date=None, hm=None, hm_n=None):
+        self.num = np.asarray(num, dtype=np.float64).reshape(-1, len(NUMERIC))
+        n = len(self.num)
+        self.text = {k: np.asarray(text[k], dtype=str) for k in TEXT}
+        self.ttm_date = np.asarray(ttm_date if ttm_date is not None else np.full(n, "NaT"), dtype="datetime64[ns]")
+        self.hm = np.asarray(hm if hm is not None else np.full((n, len(MULTIPLES)), np.nan), dtype=np.float64)
+        self.hm_n = np.asarray(hm_n if hm_n is not None else np.zeros((n, len(MULTIPLES))), dtype=np.int32)
+        self._col = {k: j for j, k in enumerate(NUMERIC)}
+        self._pos = {s: i for i, s in enumerate(self.text["symbol"])}
+
+    @classmethod
+    def from_records(cls, records, hms=None):
+        """Da una lista di Company (e dei rispettivi multipli storici {multiplo: (mediana, n)})."""
+        records = list(records)
+        hms = list(hms) if hms is not None else [{}] * len(records)
+        num = np.array([[np.nan if (v := getattr(r, k)) is None else v for k in NUMERIC] for r in records],
+                       dtype=np.float64).reshape(len(records), len(NUMERIC))
+        text = {k: ["" if (v := getattr(r, k)) is None else v for r in records] for k in TEXT}
+        ttm = [np.datetime64("NaT") if r.ttm_date is None else np.datetime64(pd.Timestamp(r.ttm_date), "ns")
+               for r in records]
+        hm = [[np.nan if (HM.get(k) or (None, 0))[0] is None else HM[k][0] for k in MULTIPLES] for HM in hms]
+        hm_n = [[(HM.get(k) or (None, 0))[1] for k in MULTIPLES] for HM in hms]
+        return cls(num, text, ttm, np.array(hm, dtype=float).reshape(-1, len(MULTIPLES)),
+                   np.array(hm_n, dtype=np.int32).reshape(-1, len(MULTIPLES)))
+
+    def __len__(self):
+        return len(self.num)
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    @property
+    def nbytes(self):
+        return (self.num.nbytes + self.ttm_date.nbytes + self.hm.nbytes + self.hm_n.nbytes
+                + sum(a.nbytes for a in self.text.values()))
+
+    def col(self, name):
+        """Colonna per nome (vista, senza copia, per i campi numerici)."""
+        if name in self._col:
+            return self.num[:, self._col[name]]
+        if name == "ttm_date":
+            return self.ttm_date
+        return self.text[name]
+
+    def __getitem__(self, name):
+        return self.col(name)
+
+    def record(self, key):
+        """Company di una riga (indice o ticker)."""
+        i = self._pos[key] if isinstance(key, str) else int(key)
+        kw = {k: (None if v != v else float(v)) for k, v in zip(NUMERIC, self.num[i])}
+        kw.update({k: (str(self.text[k][i]) or None) if k == "sector" else str(self.text[k][i]) for k in TEXT})
+        t = self.ttm_date[i]
+        kw["ttm_date"] = None if np.isnat(t) else pd.Timestamp(t)
+        return Company(**kw)
+
+    def historical(self, key):
+        """Multipli storici di una riga nel formato di multiples_from_bundle."""
+        i = self._pos[key] if isinstance(key, str) else int(key)
+        return {k: (None if self.hm[i, j] != self.hm[i, j] else float(self.hm[i, j]), int(self.hm_n[i, j]))
+                for j, k in enumerate(MULTIPLES)}
+
+    def to_frame(self):
+        df = pd.DataFrame(self.num, columns=list(NUMERIC))
+        for k in TEXT:
+            df.insert(0 if k == "symbol" else len(df.columns), k, self.text[k])
+        df["ttm_date"] = self.ttm_date
+        return df
+
+    # ---------- disco: .npz di array nativi (nessun pickle) ----------
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, num=self.num, ttm_date=self.ttm_date, hm=self.hm, hm_n=self.hm_n,
+                 **{f"text_{k}": v for k, v in self.text.items()})
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["num"], {k: z[f"text_{k}"] for k in TEXT}, z["ttm_date"], z["hm"], z["hm_n"])
+
+# =============================================================
+#  MODELLI SULLE COLONNE (stesse regole di value_company)
+# =============================================================
+def _ok(x):
+    """Come la verita' di un valore del dict: presente e diverso da zero."""
+    return np.isfinite(x) & (x != 0)
+
+
+def _or(*xs):
+    """`a or b or c` elemento per elemento (NaN = None)."""
+    out = xs[-1]
+    for x in reversed(xs[:-1]):
+        out = np.where(_ok(x), x, out)
+    return out
+
+
+def _sector_defaults(T, peers, key, q):
+    """Multiplo di default dal settore di ogni riga (un percentile per settore, non per titolo)."""
+    from .peers import peer_default
+    sectors = T.text["sector"]
+    out = np.full(len(T), np.nan)
+    for s in np.unique(sectors):
+        v = peer_default(peers, s or None, key, q)
+        out[sectors == s] = np.nan if v is None else v
+    return out
+
+
+def value_table(T, p=None, peers=None):
+    """Valutazione vettoriale di tutta la tabella: un DataFrame con le colonne di value_company
+    (NaN dove value_company mette None). Con `peers` anche la posizione nel settore."""
+    from .valuation import ValuationParams
+    p = p or ValuationParams()
+    c = T.col
+    price, sh = c("price"), c("shares")
+    n = len(T)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        beta = np.full(n, p.beta, dtype=float) if p.beta is not None else c("beta")
+        interest, debt = c("interest"), c("total_debt")
+        kd_auto = np.where(_ok(interest) & _ok(debt), interest / debt, 0.05)
+        kd = np.full(n, p.kd) if p.kd is not None else np.round(np.clip(kd_auto * 100, 1.0, 12.0), 1) / 100
+        ke = p.rf + beta * p.erp
+        e, d = np.nan_to_num(_or(c("mktcap"), np.zeros(n))), np.nan_to_num(_or(debt, np.zeros(n)))
+        v = e + d
+        w = np.where(v <= 0, ke, ke * (e / v) + kd * (1 - c("tax_rate")) * (d / v))
+        nd = np.nan_to_num(debt) - np.nan_to_num(c("cash"))
+        fcf0 = _or(c("fcf_norm"), c("fcf")) if p.use_norm else c("fcf")
+
+        fv = {}
+        dcf_ok = np.isfinite(fcf0) & np.isfinite(w) & (sh > 0) & (w > p.term_g)
+        fv["DCF - FCFF"] = np.where(dcf_ok, dcf_kernel(fcf0, p.g_fcf, p.years, p.term_g, w, nd, sh).fair_value, np.nan)
+        dps = c("dps")
+        ddm_ok = _ok(dps) & _ok(price) & (dps / price >= 0.005) & (dps > 0) & (ke > p.g_ddm)
+        fv["DDM - Gordon"] = np.where(ddm_ok, dps * (1 + p.g_ddm) / (ke - p.g_ddm), np.nan)
+
+        has_sh = _ok(sh)
+        per_share = lambda x: np.where(_ok(x) & has_sh, x / sh, np.nan)
+        metrics = (_or(c("eps_f"), c("eps_t"), per_share(c("net_income"))), _or(c("bvps"), per_share(c("equity_bv"))),
+                   per_share(c("revenue")), per_share(c("ebitda")), per_share(fcf0))
+        for j, (key, m) in enumerate(zip(MULTIPLES, metrics)):
+            mult = p.multiples.get(key)
+            if not mult:
+                hm = T.hm[:, j]
+                mult = np.where(_ok(hm), np.round(hm, 1), MULTIPLE_FALLBACK[key])
+                if p.multiple_default == "sector":
+                    sd = _sector_defaults(T, peers, key, p.sector_q)
+                    mult = np.where(_ok(sd), sd, mult)
+            mult = np.broadcast_to(np.asarray(mult, dtype=float), (n,))
+            fv[key] = np.where(np.isfinite(m) & (mult > 0), m * mult, np.nan)
+
+        g_ok = _ok(price) & (fcf0 > 0) & (sh > 0) & (w > p.term_g)
+        res = implied_growth(np.where(g_ok, price, np.nan), np.where(g_ok, fcf0, np.nan), p.years, p.term_g,
+                             w, nd, np.where(g_ok, sh, np.nan), lo=-0.50, hi=0.60)
+        g_impl = np.where(g_ok & res.converged, res.value, np.nan)
+
+    out = pd.DataFrame({"symbol": T.text["symbol"], "name": T.text["name"],
+                        "sector": [s or None for s in T.text["sector"]], "currency": T.text["currency"],
+                        "price": price, "wacc": w, "ke": ke, "fcf_base": fcf0})
+    for k, a in fv.items():
+        out[f"fv {k}"] = a
+    out["g_implied"] = g_impl
+    F = np.column_stack(list(fv.values()))
+    out["n_models"] = np.isfinite(F).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)   # righe senza alcun modello: NaN
+        med = np.nanmedian(F, axis=1)
+    med = np.where(_ok(price), med, np.nan)
+    out["fv_median"] = med
+    out["upside"] = (med / price - 1) * 100
+    out["verdict"] = [verdict(u)[0] if u == u else None for u in out["upside"]]
+    if peers is not None:
+        # senza settore nei dati vale quello registrato nell'indice (come PeerIndex.rank)
+        sectors = [s or peers.sector_of(sym) or "" for s, sym in zip(T.text["sector"], T.text["symbol"])]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for key, m in zip(MULTIPLES, metrics):
+                r = np.where(_ok(price) & (m > 0), price / m, np.nan)
+                r = np.where((r > 0) & (r < 1000), r, np.nan)   # come current_multiples
+                out[f"pct {key}"] = peers.percentiles(sectors, key, r)
+    return out
@@ -0,0 +1,328 @@
+import html
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+
+from .bundle import fetch_bundles
+from .data import company_data, multiples_from_bundle
+from .helpers import fmt, fmt_big, gradient_css
+from .models import dcf_diagnose, fcf_base, hist_default, net_debt, per_share_metrics
+from .surface import sensitivity_grid
+from .valuation import ValuationParams, multiples_used, value_company
+
+# =============================================================
+#  REPORT STATICI (HTML, opzionale PDF) DI UNA WATCHLIST
+#  Le stesse sezioni della pagina Valutazione con i parametri di default
+#  (o quelli passati): dati di bilancio letti, fair value per modello,
+#  diagnostica DCF, reverse DCF, sensitivity e sintesi. Un file HTML
+#  autosufficiente per ticker (grafici in SVG inline, nessuna risorsa
+#  esterna) piu' un index.html con la tabella riassuntiva.
+#  Il processo principale scarica i bundle (cache su disco / snapshot,
+#  a blocchi, con il limite di richieste del provider); calcolo, grafici,
+#  HTML e PDF girano in un pool di processi, uno per core.
+#  PDF: richiede weasyprint (extra "report").
+# =============================================================
+
+MODEL_NOTES = {
+    "DCF - FCFF": "Sconta i flussi di cassa liberi al WACC. Cardine per societa mature con FCF positivo.",
+    "DDM - Gordon": "Sconta i dividendi al costo dell'equity. Solo se yield >=0,5%.",
+    "P/E": "EPS x P/E (default = mediana storica).",
+    "P/BV": "Book value/azione x P/BV. Rilevante per banche/assicurazioni.",
+    "P/Sales": "Ricavi/azione x P/Sales. Per growth o societa in perdita.",
+    "P/EBITDA": "EBITDA/azione x multiplo. Per business capital-intensive.",
+    "P/FCF": "FCF/azione x multiplo.",
+}
+
+CSS = """
+:root{ --ink:#0b1f3a; --accent:#2563eb; --soft:#eef4ff; --line:#dbe4f0; --muted:#5b6b82; }
+body{ font-family:system-ui,-apple-system,"Segoe UI",sans-serif; color:var(--ink); background:#f7f9fc;
+      max-width:980px; margin:24px auto; padding:0 16px; }
+h1,h2,h3{ color:var(--ink); } h2{ border-bottom:1px solid var(--line); padding-bottom:4px; margin-top:28px; }
+.card{ background:#fff; border:1px solid var(--line); border-radius:12px; padding:14px 18px; }
+.kpis{ display:flex; gap:10px; flex-wrap:wrap; }
+.kpi{ flex:1; min-width:140px; background:var(--soft); border:1px solid var(--line); border-radius:10px; padding:8px 12px; }
+.kpi .v{ font-size:1.2rem; font-weight:700; } .kpi .l{ font-size:.75rem; color:var(--muted); text-transform:uppercase; }
+.cols{ display:flex; gap:24px; } .cols > div{ flex:1; }
+.pill{ display:inline-block; background:var(--soft); color:var(--accent); border:1px solid #c7d8f5;
+       padding:.15rem .6rem; border-radius:999px; font-size:.8rem; }
+.muted{ color:var(--muted); font-size:.9rem; } .warn{ color:#b45309; }
+.fv-up{ color:#15803d; font-weight:700; } .fv-dn{ color:#b91c1c; font-weight:700; }
+table{ border-collapse:collapse; } td,th{ border:1px solid var(--line); padding:4px 8px; text-align:right; }
+th{ background:var(--soft); }
+"""
+
+
+def pdf_available():
+    try:
+        import weasyprint  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def growth_reading(g):
+    """Lettura della crescita implicita del reverse DCF (come la pagina)."""
+    return "molto aggressiva" if g > 0.15 else ("ambiziosa" if g > 0.08 else
+           ("moderata" if g > 0.02 else "conservativa/pessimista"))
+
+
+# ---------- calcolo ----------
+def report_context(B, p=None, peers=None):
+    """Tutti i numeri del report di un bundle (None se manca il prezzo)."""
+    p = p or ValuationParams()
+    D = company_data(B, p.basis)
+    if D["price"] is None:
+        return None
+    HM = multiples_from_bundle(B, D["shares"], p.basis) if D["shares"] else {}
+    row = value_company(D, HM, p, peers)
+    fcf0, nd, sh = fcf_base(D, p.use_norm), net_debt(D), D["shares"]
+    ev, equity, fv_check, warns = dcf_diagnose(fcf0, p.g_fcf, p.years, p.term_g, row["wacc"], nd, sh)
+    grid = sensitivity_grid(fcf0, p.g_fcf, p.years, p.term_g, row["wacc"], nd, sh) if (fcf0 and sh) else None
+    mults = multiples_used(D, HM, p, peers)
+    metrics = per_share_metrics(D, fcf0)
+    unit = "punti" if D["basis"] == "ttm" else "anni"
+    models = [(name, row[f"fv {name}"], MODEL_NOTES[name] + (
+        f" Multiplo {fmt(mults[name], 1)} su {fmt(metrics[name])} per azione "
+        f"(storico: {fmt(HM.get(name, (None, 0))[0], 1)}, {hist_default(HM, name)[1]} {unit})." if name in mults else ""))
+        for name in MODEL_NOTES]
+    return {"D": D, "p": p, "row": row, "models": models, "fcf0": fcf0, "net_debt": nd,
+            "diag": (ev, equity, fv_check, warns), "grid": grid, "close": B.close_since(years=1),
+            "created": time.strftime("%d/%m/%Y %H:%M")}
+
+
+# ---------- grafici (SVG inline) ----------
+def svg_line(s, width=900, height=200, pad=32):
+    """Serie temporale (es. chiusure dell'ultimo anno) come polilinea SVG."""
+    if s is None or len(s) < 2:
+        return ""
+    y = np.asarray(s, dtype=float)
+    lo, hi = float(np.nanmin(y)), float(np.nanmax(y))
+    span_y = (hi - lo) or 1.0
+    xs = pad + np.arange(len(y)) * (width - 2 * pad) / (len(y) - 1)
+    ys = height - pad - (y - lo) / span_y * (height - 2 * pad)
+    pts = " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(xs, ys) if b == b)
+    first, last = s.index[0], s.index[-1]
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%">'
+            f'<polyline fill="none" stroke="#2563eb" stroke-width="1.5" points="{pts}"/>'
+            f'<text x="{pad}" y="{height - 8}" font-size="11" fill="#5b6b82">{first:%d/%m/%Y}</text>'
+            f'<text x="{width - pad}" y="{height - 8}" font-size="11" fill="#5b6b82" text-anchor="end">{last:%d/%m/%Y}</text>'
+            f'<text x="4" y="{pad}" font-size="11" fill="#5b6b82">{fmt(hi)}</text>'
+            f'<text x="4" y="{height - pad}" font-size="11" fill="#5b6b82">{fmt(lo)}</text></svg>')
+
+
+def svg_bars(labels, values, ref, width=900, row=26, label_w=150):
+    """Barre orizzontali dei fair value con una linea verticale al prezzo `ref`."""
+    if not values:
+        return ""
+    top = max(max(values), ref) * 1.1 or 1.0
+    scale = lambda v: label_w + max(v, 0) / top * (width - label_w - 70)
+    height = row * len(values) + 20
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="100%">']
+    for i, (l, v) in enumerate(zip(labels, values)):
+        y = 10 + i * row
+        color = "#15803d" if v >= ref else "#b91c1c"
+        parts.append(f'<text x="{label_w - 8}" y="{y + 16}" font-size="12" text-anchor="end">{html.escape(l)}</text>'
+                     f'<rect x="{label_w}" y="{y + 4}" width="{scale(v) - label_w:.1f}" height="{row - 8}" fill="{color}" opacity=".75"/>'
+                     f'<text x="{scale(v) + 6:.1f}" y="{y + 16}" font-size="11">{fmt(v)}</text>')
+    parts.append(f'<line x1="{scale(ref):.1f}" x2="{scale(ref):.1f}" y1="4" y2="{height - 4}" stroke="#0b1f3a" '
+                 f'stroke-dasharray="4 3"/><text x="{scale(ref) + 4:.1f}" y="{height - 6}" font-size="11">prezzo</text></svg>')
+    return "".join(parts)
+
+
+# ---------- HTML ----------
+def _kpis(items):
+    return '<div class="kpis">' + "".join(f'<div class="kpi"><div class="l">{l}</div><div class="v">{v}</div></div>'
+                                          for l, v in items) + "</div>"
+
+
+def _delta(fv, price, ccy):
+    if fv is None or not price:
+        return '<span class="muted">N/D</span>'
+    up = (fv / price - 1) * 100
+    return f'<b>{fmt(fv)} {ccy}</b> &nbsp;<span class="{"fv-up" if up >= 0 else "fv-dn"}">({up:+.1f}%)</span>'
+
+
+def _sensitivity_table(grid, price, ccy):
+    fv = grid.fair_value
+    styles = gradient_css(fv)
+    head = "".join(f"<th>g {tg * 100:.1f}%</th>" for tg in grid.x)
+    body = "".join(f"<tr><th>WACC {w * 100:.1f}%</th>" + "".join(
+        f'<td style="{styles[i, j]}">{fmt(v) if v == v else "N/D"}</td>' for j, v in enumerate(fv[i])) + "</tr>"
+        for i, w in enumerate(grid.y))
+    return (f"<table><tr><th></th>{head}</tr>{body}</table>"
+            f'<p class="muted">Prezzo attuale di confronto: <b>{fmt(price)} {ccy}</b>. '
+            f"Celle verdi = fair value sopra prezzo, rosse = sotto.</p>")
+
+
+def render_html(ctx):
+    """Pagina HTML autosufficiente del report."""
+    D, p, row = ctx["D"], ctx["p"], ctx["row"]
+    price, ccy, e = D["price"], D["currency"], html.escape
+    out = [f'<!doctype html><html lang="it"><head><meta charset="utf-8"><title>{e(D["symbol"])} - {e(D["name"] or "")}'
+           f"</title><style>{CSS}</style></head><body>",
+           f'<h1>{e(D["name"] or D["symbol"])} - <code>{e(D["symbol"])}</code></h1>',
+           f'<p class="muted">Report del {ctx["created"]}. Base {"TTM" if D["basis"] == "ttm" else "ultimo esercizio"}; '
+           f"WACC {row['wacc'] * 100:.2f}%, crescita FCF {p.g_fcf * 100:.1f}% per {p.years} anni, "
+           f"terminale {p.term_g * 100:.2f}%. Strumento informativo, non consulenza.</p>",
+           _kpis([("Prezzo", f"{fmt(price)} {e(ccy or '')}"), ("Cap.", fmt_big(D["mktcap"])),
+                  ("Settore", e(D["sector"] or "N/D")), ("Beta", fmt(D["beta"])),
+                  ("Aliquota", fmt(D["tax_rate"] * 100, 1, "%"))]),
+           svg_line(ctx["close"])]
+
+    # ---------- dati di bilancio ----------
+    block = lambda title, items: f"<div><b>{title}</b><br>" + "<br>".join(f"{l}: {fmt_big(D[k])}" for l, k in items) + "</div>"
+    out.append('<h2>Dati di bilancio letti</h2><div class="card cols">'
+               + block("Conto economico", [("Ricavi", "revenue"), ("EBIT", "ebit"), ("EBITDA", "ebitda"),
+                                           ("Utile netto", "net_income")])
+               + block("Stato patrimoniale", [("Debito", "total_debt"), ("Cassa", "cash"),
+                                              ("Patrim. netto", "equity_bv"), ("Azioni", "shares")])
+               + block("Flussi di cassa", [("CFO", "cfo"), ("Capex", "capex"), ("FCF ultimo", "fcf"),
+                                           ("FCF medio", "fcf_norm")]) + "</div>")
+    if D["fin_currency"] and ccy and D["fin_currency"] != ccy:
+        out.append(f'<p class="muted">Bilanci in {e(D["fin_currency"])} convertiti in {e(ccy)} '
+                   f"(ultimo cambio: {fmt(D['fx_rate'], 4)}).</p>" if D["fx_rate"] else
+                   f'<p class="warn">Bilanci in {e(D["fin_currency"])}, prezzo in {e(ccy)}: cambio non disponibile.</p>')
+
+    # ---------- fair value ----------
+    out.append('<h2>Fair Value per modello</h2><div class="card">')
+    for name, fv, note in ctx["models"]:
+        out.append(f"<p><b>{e(name)}</b> - {_delta(fv, price, e(ccy or ''))}<br><span class=\"muted\">{e(note)}</span></p>")
+    out.append("</div>")
+
+    # ---------- diagnostica DCF ----------
+    ev, equity, fv_check, warns = ctx["diag"]
+    out.append("<h2>Diagnostica DCF</h2>")
+    if ev is not None:
+        out.append(_kpis([("Enterprise Value", fmt_big(ev)), ("- Debito netto", fmt_big(ctx["net_debt"])),
+                          ("= Equity / azioni", f"{fmt(fv_check)} {e(ccy or '')}")]))
+        out.append(f'<p class="muted">FCF base <b>{fmt_big(ctx["fcf0"])}</b>, cresce al <b>{p.g_fcf * 100:.1f}%</b>/anno '
+                   f"per <b>{p.years} anni</b>, scontato al WACC <b>{row['wacc'] * 100:.1f}%</b>, + valore terminale "
+                   f"(crescita perpetua <b>{p.term_g * 100:.1f}%</b>) = Enterprise Value. Tolto il debito netto e "
+                   f"diviso per <b>{fmt_big(D['shares'])}</b> azioni.</p>")
+    out += [f'<p class="warn">{e(w)}</p>' for w in warns] or [
+        '<p class="muted">Nessuna anomalia rilevata: il DCF e\' calcolabile e i parametri sono coerenti.</p>']
+
+    # ---------- reverse DCF ----------
+    out.append("<h2>Reverse DCF - cosa sta scontando il mercato</h2>")
+    g = row["g_implied"]
+    if g is not None:
+        out.append(_kpis([("Crescita FCF implicita", f"{g * 100:+.1f}%/anno"),
+                          (f"Per {p.years} anni, poi", f"{p.term_g * 100:.1f}% perpetua"), ("Lettura", growth_reading(g))]))
+        out.append(f'<p class="muted">Al WACC del {row["wacc"] * 100:.1f}%, il prezzo di {fmt(price)} {e(ccy or "")} e '
+                   f"coerente con una crescita del FCF del {g * 100:.1f}% annuo per {p.years} anni.</p>")
+    else:
+        out.append('<p class="muted">Reverse DCF non calcolabile con i dati/parametri attuali (es. FCF non positivo).</p>')
+
+    # ---------- sensitivity ----------
+    out.append("<h2>Sensitivity - fragilita del DCF</h2>")
+    out.append(_sensitivity_table(ctx["grid"], price, e(ccy or "")) if ctx["grid"] is not None else
+               '<p class="muted">Sensitivity non disponibile (FCF non utilizzabile).</p>')
+
+    # ---------- sintesi ----------
+    out.append("<h2>Sintesi</h2>")
+    valid = [(n, fv) for n, fv, _ in ctx["models"] if fv is not None]
+    if valid and row["fv_median"] is not None:
+        fvs = [v for _, v in valid]
+        cls = "fv-up" if row["upside"] >= 0 else "fv-dn"
+        out.append(_kpis([("Prezzo", f"{fmt(price)} {e(ccy or '')}"), ("FV mediano", f"{fmt(row['fv_median'])} {e(ccy or '')}"),
+                          ("Range", f"{fmt(min(fvs))}-{fmt(max(fvs))}"),
+                          ("Upside", f'<span class="{cls}">{row["upside"]:+.1f}%</span>')]))
+        out.append(f'<p><span class="pill">{e(row["verdict"])}</span> <span class="muted">Mediana di {len(valid)} '
+                   f"modelli. Range ampio = i metodi non concordano = maggiore incertezza.</span></p>")
+        out.append(svg_bars([n for n, _ in valid], fvs, price))
+    else:
+        out.append('<p class="muted">Nessun modello applicabile con i dati disponibili.</p>')
+    out.append("</body></html>")
+    return "\n".join(out)
+
+
+def _index_link(r):
+    if not r.get("html"):
+        return html.escape(r["symbol"])
+    return f'<a href="{html.escape(quote(Path(r["html"]).name))}">{html.escape(r["symbol"])}</a>'
+
+
+def render_index(rows, title="Report valutazioni"):
+    """index.html: una riga per ticker, con link al report se e' stato scritto (niente per gli errori)."""
+    e = html.escape
+    body = "".join(
+        f'<tr><td style="text-align:left">{_index_link(r)}</td>'
+        f'<td style="text-align:left">{e(r.get("name") or "")}</td><td>{fmt(r.get("price"))}</td>'
+        f'<td>{fmt(r.get("fv_median"))}</td><td>{fmt(r.get("upside"), 1, "%")}</td>'
+        f'<td style="text-align:left">{e(r.get("verdict") or r.get("error") or "")}</td></tr>' for r in rows)
+    return (f'<!doctype html><html lang="it"><head><meta charset="utf-8"><title>{e(title)}</title><style>{CSS}</style>'
+            f"</head><body><h1>{e(title)}</h1><p class=\"muted\">{len(rows)} titoli, {time.strftime('%d/%m/%Y %H:%M')}."
+            f"</p><table><tr><th>Ticker</th><th>Nome</th><th>Prezzo</th><th>FV mediano</th><th>Upside</th>"
+            f"<th>Giudizio</th></tr>{body}</table></body></html>")
+
+
+# ---------- processi ----------
+_WORKER = {}
+
+
+def _init_worker(params, peers, outdir, pdf):
+    _WORKER.update(params=params, peers=peers, outdir=Path(outdir), pdf=pdf)
+
+
+def _render_one(B):
+    """Nel processo del pool: calcolo, HTML (e PDF) di un bundle. Ritorna la riga dell'indice."""
+    t = time.perf_counter()
+    out = {"symbol": B.symbol}
+    try:
+        ctx = report_context(B, _WORKER["params"], _WORKER["peers"])
+        if ctx is None:
+            return dict(out, error="prezzo non disponibile")
+        page = render_html(ctx)
+        path = _WORKER["outdir"] / f"{B.symbol}.html"
+        path.write_text(page, encoding="utf-8")
+        out.update({k: ctx["row"][k] for k in ("name", "price", "fv_median", "upside", "verdict")}, html=str(path))
+        if _WORKER["pdf"]:
+            from weasyprint import HTML
+            HTML(string=page).write_pdf(path.with_suffix(".pdf"))
+            out["pdf"] = str(path.with_suffix(".pdf"))
+    except Exception as e:
+        out["error"] = str(e) or type(e).__name__
+    out["seconds"] = time.perf_counter() - t
+    return out
+
+
+def write_reports(tickers, outdir, params=None, store=None, provider=None, peers=None, pdf=False, processes=None,
+                  max_concurrency=16, chunk=64):
+    """Generatore: scrive <outdir>/<TICKER>.html (e .pdf) per ogni ticker e una riga per report,
+    nell'ordine di completamento; alla fine scrive <outdir>/index.html.
+    I bundle si scaricano a blocchi di `chunk` mentre il pool lavora sui blocchi precedenti."""
+    from .batch import read_tickers
+    if pdf and not pdf_available():
+        raise ImportError("il PDF richiede weasyprint:  pip install weasyprint")
+    params = params or ValuationParams()
+    tickers = read_tickers(tickers)
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    processes = processes or os.cpu_count() or 1
+    rows, pending = [], set()
+    # "spawn": i thread del processo principale (cache, provider) non passano ai figli
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(processes, mp_context=ctx, initializer=_init_worker,
+                             initargs=(params, peers, str(outdir), pdf)) as pool:
+        for i in range(0, len(tickers), chunk):
+            for B in fetch_bundles(tickers[i:i + chunk], store, provider, max_concurrency,
+                                   quarterly=params.basis == "ttm"):
+                pending.add(pool.submit(_render_one, B))
+            # al piu' due blocchi in coda: i bundle non si accumulano in memoria
+            while len(pending) > 2 * chunk:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    rows.append(fut.result())
+                    yield rows[-1]
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                rows.append(fut.result())
+                yield rows[-1]
+    rows.sort(key=lambda r: tickers.index(r["symbol"]))
+    (outdir / "index.html").write_text(render_index(rows), encoding="utf-8")
@@ -0,0 +1,262 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .bundle import CompanyBundle, fetch_bundles
+from .provider import STATEMENTS, Provider, default_provider
+from .store import DEFAULT_DIR
+
+# =============================================================
+#  SNAPSHOT REGISTRATI (replay senza rete)
+#  Un'istantanea con nome di tutto cio' che serve a load_company e
+#  historical_multiples per un universo di ticker. Una cartella:
+#    meta.json                      nome, data di riferimento, ticker, vocabolari
+#    info.json                      info di ciascun ticker
+#    <prospetto>.{offsets,item,date,value}.npy   formato lungo, colonnare
+#    history.{offsets,date,close,dividends}.npy
+#    fx.{offsets,date,rate}.npy     storici dei cambi usati (una fetta per coppia)
+#  Le righe sono ordinate per ticker: `offsets` (n_ticker + 1) delimita la fetta
+#  di ciascuno. I .npy si aprono in memory-map: leggere un ticker tocca solo
+#  le sue pagine, anche su snapshot di migliaia di titoli.
+# =============================================================
+
+HISTORY_COLUMNS = {"close": "Close", "dividends": "Dividends"}   # le sole colonne usate dai modelli
+# con una data di riferimento di info si tengono solo i dati descrittivi: prezzo, capitalizzazione,
+# EPS, book value, azioni, dividendo, beta, EBITDA sono valori di oggi. I modelli li ricavano
+# allora da bilanci e prezzi troncati (azioni e per-azione dai prospetti, dividendo dagli stacchi);
+# la beta non si ricostruisce e vale il default 1.0
+STATIC_INFO = ("shortName", "longName", "sector", "industry", "country", "exchange", "quoteType",
+               "currency", "financialCurrency")
+
+
+def snapshot_root():
+    """Cartella degli snapshot: VALUTATORE_SNAPSHOT_DIR, default <cache>/snapshots."""
+    env = os.environ.get("VALUTATORE_SNAPSHOT_DIR")
+    if env:
+        return Path(env)
+    return Path(os.environ.get("VALUTATORE_CACHE_DIR") or DEFAULT_DIR) / "snapshots"
+
+
+def snapshot_path(name, root=None):
+    """Percorso di uno snapshot dal nome (o percorso esplicito se contiene un separatore)."""
+    p = Path(name)
+    if p.is_absolute() or len(p.parts) > 1:
+        return p
+    return Path(root or snapshot_root()) / name
+
+
+def list_snapshots(root=None):
+    """[(nome, meta)] degli snapshot disponibili, dal piu' recente."""
+    root = Path(root or snapshot_root())
+    out = []
+    for m in root.glob("*/meta.json") if root.exists() else []:
+        try:
+            out.append((m.parent.name, json.loads(m.read_text())))
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda x: x[1].get("created", 0), reverse=True)
+
+# =============================================================
+#  SCRITTURA
+# =============================================================
+def _concat(parts, dtype):
+    return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype)
+
+
+def write_snapshot(path, bundles, name=None, as_of=None, source=None):
+    """Scrive una lista di CompanyBundle come snapshot colonnare in `path`."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    as_of = pd.Timestamp(as_of) if as_of is not None else None
+    bundles = sorted(bundles, key=lambda b: b.symbol)
+    vocab = {}
+
+    for kind in STATEMENTS:
+        ids, offsets, items, dates, values = {}, [0], [], [], []
+        for B in bundles:
+            n = 0
+            df = getattr(B, kind)
+            if df is not None and not df.empty:
+                cols = pd.to_datetime(df.columns)
+                keep = np.asarray(cols <= as_of) if as_of is not None else np.ones(len(cols), bool)
+                sub = df.loc[:, keep].apply(pd.to_numeric, errors="coerce")
+                sub.columns = cols[keep]
+                s = sub.stack().dropna()
+                if not s.empty:
+                    items.append(np.fromiter((ids.setdefault(k, len(ids)) for k in s.index.get_level_values(0)),
+                                             np.int32, len(s)))
+                    dates.append(s.index.get_level_values(1).values.astype("datetime64[ns]"))
+                    values.append(s.to_numpy(dtype=np.float64))
+                    n = len(s)
+            offsets.append(offsets[-1] + n)
+        np.save(path / f"{kind}.offsets.npy", np.asarray(offsets, np.int64))
+        np.save(path / f"{kind}.item.npy", _concat(items, np.int32))
+        np.save(path / f"{kind}.date.npy", _concat(dates, "datetime64[ns]"))
+        np.save(path / f"{kind}.value.npy", _concat(values, np.float64))
+        vocab[kind] = list(ids)
+
+    offsets, cols = [0], {k: [] for k in ("date",) + tuple(HISTORY_COLUMNS)}
+    for B in bundles:
+        h = B.history
+        n = 0
+        if h is not None and not h.empty and "Close" in h:
+            if as_of is not None:
+                h = h[h.index <= as_of]
+            n = len(h)
+            cols["date"].append(h.index.values.astype("datetime64[ns]"))
+            for k, c in HISTORY_COLUMNS.items():
+                cols[k].append(h[c].to_numpy(np.float64) if c in h else np.zeros(n))
+        offsets.append(offsets[-1] + n)
+    np.save(path / "history.offsets.npy", np.asarray(offsets, np.int64))
+    np.save(path / "history.date.npy", _concat(cols["date"], "datetime64[ns]"))
+    for k in HISTORY_COLUMNS:
+        np.save(path / f"history.{k}.npy", _concat(cols[k], np.float64))
+
+    pairs = {}
+    for B in bundles:
+        if B.fx is not None and not B.fx.empty:
+            pairs.setdefault(str(B.fx.name), B.fx if as_of is None else B.fx[B.fx.index <= as_of])
+    offsets, fdates, rates = [0], [], []
+    for s in pairs.values():
+        fdates.append(s.index.values.astype("datetime64[ns]"))
+        rates.append(s.to_numpy(np.float64))
+        offsets.append(offsets[-1] + len(s))
+    np.save(path / "fx.offsets.npy", np.asarray(offsets, np.int64))
+    np.save(path / "fx.date.npy", _concat(fdates, "datetime64[ns]"))
+    np.save(path / "fx.rate.npy", _concat(rates, np.float64))
+
+    # con una data di riferimento niente valori live (prezzo = ultima chiusura entro quella data)
+    infos = {B.symbol: {k: v for k, v in (B.info or {}).items() if as_of is None or k in STATIC_INFO}
+             for B in bundles}
+    (path / "info.json").write_text(json.dumps(infos, default=str))
+    meta = {"name": name or path.name, "as_of": str(as_of.date()) if as_of is not None else None,
+            "info": "live" if as_of is None else "descrittive",
+            "created": time.time(), "source": source, "tickers": [B.symbol for B in bundles], "items": vocab, "fx": list(pairs)}
+    (path / "meta.json").write_text(json.dumps(meta, indent=1))
+    return path
+
+
+def record_snapshot(name, tickers, root=None, provider=None, as_of=None, max_concurrency=16):
+    """Scarica l'universo dal provider (default: quello di processo) e lo salva come snapshot.
+    Con `as_of` si tengono solo bilanci e prezzi fino a quella data e di info solo i campi
+    descrittivi (STATIC_INFO), per non usare dati successivi. Ritorna (percorso, ticker mancanti)."""
+    provider = provider or default_provider()
+    tickers = list(dict.fromkeys(tickers))
+    bundles = fetch_bundles(tickers, provider=provider, max_concurrency=max_concurrency)
+    ok = [B for B in bundles if B.info or (B.history is not None and not B.history.empty)]
+    missing = sorted(set(tickers) - {B.symbol for B in ok})
+    path = write_snapshot(snapshot_path(name, root), ok, name=name, as_of=as_of, source=provider.name)
+    return path, missing
+
+# =============================================================
+#  LETTURA
+# =============================================================
+class Snapshot:
+    """Snapshot aperto in sola lettura; gli array si mappano in memoria alla prima lettura."""
+
+    def __init__(self, name_or_path, root=None):
+        self.path = snapshot_path(name_or_path, root)
+        if not (self.path / "meta.json").exists():
+            raise FileNotFoundError(f"snapshot non trovato: {self.path}")
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        self.name = self.meta.get("name") or self.path.name
+        self.as_of = self.meta.get("as_of")
+        self.tickers = self.meta["tickers"]
+        self._pos = {t: i for i, t in enumerate(self.tickers)}
+        self._fx_pos = {p: i for i, p in enumerate(self.meta.get("fx", []))}
+        self._arrays = {}
+        self._info = None
+
+    def __contains__(self, symbol):
+        return symbol in self._pos
+
+    def _array(self, name):
+        a = self._arrays.get(name)
+        if a is None:
+            try:
+                a = np.load(self.path / f"{name}.npy", mmap_mode="r")
+            except ValueError:   # array vuoto: non mappabile
+                a = np.load(self.path / f"{name}.npy")
+            self._arrays[name] = a
+        return a
+
+    def _slice(self, prefix, symbol):
+        i = self._pos.get(symbol)
+        if i is None:
+            return None
+        off = self._array(f"{prefix}.offsets")
+        return slice(int(off[i]), int(off[i + 1]))
+
+    def info(self, symbol):
+        if self._info is None:
+            self._info = json.loads((self.path / "info.json").read_text())
+        return dict(self._info.get(symbol) or {})
+
+    def statement(self, symbol, kind):
+        """Prospetto nel formato yfinance: righe = voci, colonne = date dalla piu' recente."""
+        if kind not in self.meta["items"]:   # es. trimestrali: non registrati nello snapshot
+            return None
+        sl = self._slice(kind, symbol)
+        if sl is None or sl.start == sl.stop:
+            return None
+        items = np.asarray(self._array(f"{kind}.item")[sl])
+        dates = np.asarray(self._array(f"{kind}.date")[sl])
+        values = np.asarray(self._array(f"{kind}.value")[sl])
+        uitems, r = np.unique(items, return_inverse=True)
+        udates, c = np.unique(dates, return_inverse=True)
+        grid = np.full((len(uitems), len(udates)), np.nan)
+        grid[r, c] = values
+        names = self.meta["items"][kind]
+        df = pd.DataFrame(grid[:, ::-1], index=[names[k] for k in uitems], columns=pd.DatetimeIndex(udates[::-1]))
+        return df
+
+    def fx(self, pair):
+        """Storico del cambio registrato (Serie) o None."""
+        i = self._fx_pos.get(pair)
+        if i is None:
+            return None
+        off = self._array("fx.offsets")
+        sl = slice(int(off[i]), int(off[i + 1]))
+        return pd.Series(np.asarray(self._array("fx.rate")[sl]),
+                         index=pd.DatetimeIndex(np.asarray(self._array("fx.date")[sl])), name=pair)
+
+    def history(self, symbol):
+        if symbol in self._fx_pos:   # coppie di cambio: stessa interfaccia di uno storico prezzi
+            return self.fx(symbol).to_frame("Close")
+        sl = self._slice("history", symbol)
+        if sl is None or sl.start == sl.stop:
+            return None
+        idx = pd.DatetimeIndex(np.asarray(self._array("history.date")[sl]), name="Date")
+        return pd.DataFrame({c: np.asarray(self._array(f"history.{k}")[sl]) for k, c in HISTORY_COLUMNS.items()},
+                            index=idx)
+
+    def bundle(self, symbol):
+        return CompanyBundle(symbol, self.info(symbol), *(self.statement(symbol, k) for k in STATEMENTS),
+                             history=self.history(symbol))
+
+
+class SnapshotProvider(Provider):
+    """Provider che legge solo da uno snapshot: nessuna rete, risultati riproducibili.
+    I ticker assenti dallo snapshot risultano senza dati (come un ticker inesistente)."""
+
+    name = "snapshot"
+    cacheable = False   # la cache su disco non deve mescolare dati live e registrati
+
+    def __init__(self, name_or_path, root=None):
+        self.snapshot = Snapshot(name_or_path, root)
+
+    async def info(self, symbol):
+        return self.snapshot.info(symbol)
+
+    async def statement(self, symbol, kind):
+        return self.snapshot.statement(symbol, kind)
+
+    async def history(self, symbol, period, start=None):
+        return self.snapshot.history(symbol)
+
+    async def histories(self, symbols, period, start=None):
+        return {s: h for s in symbols if (h := self.snapshot.history(s)) is not None}
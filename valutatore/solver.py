@@ -0,0 +1,154 @@
+import math
+import numpy as np
+from typing import NamedTuple
+
+from .dcf import dcf_kernel
+
+# =============================================================
+#  PARAMETRI IMPLICITI (reverse DCF vettoriale)
+#  Per ogni riga (ticker o scenario) trova il parametro che rende
+#  l'EV del DCF uguale a prezzo * azioni + debito netto.
+#  Metodo: Newton salvaguardato - il passo di Newton viene accettato solo
+#  se resta dentro il bracket corrente, altrimenti si biseca. Il bracket
+#  si restringe a ogni iterazione, quindi la convergenza e' garantita.
+#  Per un solo titolo (pagina, value_company) c'e' implied_growth_scalar:
+#  stesso metodo in aritmetica Python con la derivata analitica, senza
+#  il costo fisso degli array di lunghezza 1.
+# =============================================================
+
+class ImpliedResult(NamedTuple):
+    value: np.ndarray      # parametro implicito (NaN se non trovato)
+    converged: np.ndarray  # True dove la tolleranza e' stata raggiunta
+    no_root: np.ndarray    # True dove il bracket non contiene una radice
+    iterations: int
+
+    def without_root(self, labels):
+        """Etichette (es. ticker) le cui righe non hanno radice nel bracket."""
+        return [l for l, bad in zip(labels, np.ravel(self.no_root)) if bad]
+
+
+def _solve(residual, lo, hi, tol, maxiter):
+    lo, hi = np.array(lo, dtype=float), np.array(hi, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        flo, fhi = residual(lo), residual(hi)
+        valid = np.isfinite(flo) & np.isfinite(fhi)
+        no_root = valid & (flo * fhi > 0)
+        active = valid & ~no_root
+        # orienta il bracket in modo che residual(lo) <= 0 <= residual(hi)
+        swap = flo > 0
+        lo, hi = np.where(swap, hi, lo), np.where(swap, lo, hi)
+        flo, fhi = np.where(swap, fhi, flo), np.where(swap, flo, fhi)
+        # primo punto: regula falsi
+        x = np.where(active, lo - flo * (hi - lo) / (fhi - flo), np.nan)
+        x = np.where(np.isfinite(x), x, (lo + hi) / 2)
+        converged = np.zeros_like(active)
+        it = 0
+        for it in range(1, maxiter + 1):
+            fx = residual(x)
+            neg = fx < 0
+            lo = np.where(active & neg, x, lo)
+            hi = np.where(active & ~neg, x, hi)
+            h = 1e-7 * np.maximum(1.0, np.abs(x))
+            dfx = (residual(x + h) - fx) / h
+            step = fx / dfx
+            xn = x - step
+            outside = ~np.isfinite(xn) | ((xn - lo) * (xn - hi) > 0)
+            xn = np.where(outside, (lo + hi) / 2, xn)
+            done = active & ((np.abs(xn - x) <= tol) | (fx == 0) | (np.abs(hi - lo) <= tol))
+            x = np.where(active, xn, x)
+            converged |= done
+            active &= ~done
+            if not active.any():
+                break
+    value = np.where(converged, x, np.nan)
+    return ImpliedResult(value, converged, no_root, it)
+
+
+def _prep(price, fcf0, net_debt, shares, *others):
+    arrs = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (price, fcf0, net_debt, shares) + others))
+    price, fcf0, nd, sh = arrs[:4]
+    target = price * sh + nd
+    ok = (sh > 0) & (fcf0 > 0) & np.isfinite(target)
+    return target, ok, arrs
+
+
+def implied_growth(price, fcf0, years, term_g, discount, net_debt=0.0, shares=1.0,
+                   lo=-0.50, hi=0.60, tol=1e-10, maxiter=60):
+    """Crescita del FCF (anni espliciti) implicita nel prezzo."""
+    target, ok, (_, fcf0, nd, sh, n, tg, r) = _prep(price, fcf0, net_debt, shares, years, term_g, discount)
+    ok &= r > tg
+    fcf0 = np.where(ok, fcf0, np.nan)
+    return _solve(lambda x: dcf_kernel(fcf0, x, n, tg, r).ev - target,
+                  np.full(target.shape, lo), np.full(target.shape, hi), tol, maxiter)
+
+
+def implied_wacc(price, fcf0, g, years, term_g, net_debt=0.0, shares=1.0,
+                 hi=0.50, tol=1e-10, maxiter=60):
+    """Tasso di sconto (WACC) implicito nel prezzo. Il bracket parte appena sopra term_g."""
+    target, ok, (_, fcf0, nd, sh, g, n, tg) = _prep(price, fcf0, net_debt, shares, g, years, term_g)
+    fcf0 = np.where(ok, fcf0, np.nan)
+    return _solve(lambda x: dcf_kernel(fcf0, g, n, tg, x).ev - target,
+                  tg + 1e-6, np.maximum(hi, tg + 2e-6), tol, maxiter)
+
+
+def implied_terminal_growth(price, fcf0, g, years, discount, net_debt=0.0, shares=1.0,
+                            lo=-0.10, tol=1e-10, maxiter=60):
+    """Crescita perpetua implicita nel prezzo. Il bracket finisce appena sotto il WACC."""
+    target, ok, (_, fcf0, nd, sh, g, n, r) = _prep(price, fcf0, net_debt, shares, g, years, discount)
+    fcf0 = np.where(ok, fcf0, np.nan)
+    return _solve(lambda x: dcf_kernel(fcf0, g, n, x, r).ev - target,
+                  np.minimum(lo, r - 2e-6), r - 1e-6, tol, maxiter)
+
+
+# ---------- un solo titolo ----------
+def _ev_growth(fcf0, g, n, tg, r):
+    """(EV, dEV/dg) del DCF in forma chiusa (come dcf_kernel), con q = (1+g)/(1+r)."""
+    d = (g - r) / (1 + r)                             # q - 1
+    q = 1 + d
+    qn = math.exp(n * math.log1p(d))
+    k = (1 + tg) / (r - tg)
+    if d == 0:
+        annuity, dannuity = n, n * (n + 1) / 2
+    else:
+        annuity = q * math.expm1(n * math.log1p(d)) / d
+        dannuity = (n * qn * q - (n + 1) * qn + 1) / (d * d)   # d/dq sum_{t=1..n} q^t
+    ev = fcf0 * (annuity + qn * k)
+    dev = fcf0 * (dannuity + n * qn / q * k) / (1 + r)
+    return ev, dev
+
+
+def implied_growth_scalar(price, fcf0, years, term_g, discount, net_debt=0.0, shares=1.0,
+                          lo=-0.50, hi=0.60, tol=1e-10, maxiter=60):
+    """implied_growth per un solo titolo: float, oppure None senza radice nel bracket o convergenza."""
+    target = price * shares + net_debt
+    if not (shares > 0 and fcf0 > 0 and math.isfinite(target) and discount > term_g):
+        return None
+
+    def residual(x):
+        try:
+            ev, dev = _ev_growth(fcf0, x, years, term_g, discount)
+        except (OverflowError, ValueError, ZeroDivisionError):
+            return math.nan, math.nan
+        return ev - target, dev
+
+    flo, fhi = residual(lo)[0], residual(hi)[0]
+    if not (math.isfinite(flo) and math.isfinite(fhi)) or flo * fhi > 0:
+        return None
+    if flo > 0:
+        lo, hi, flo, fhi = hi, lo, fhi, flo
+    x = lo - flo * (hi - lo) / (fhi - flo) if fhi != flo else math.nan
+    if not math.isfinite(x):
+        x = (lo + hi) / 2
+    for _ in range(maxiter):
+        fx, dfx = residual(x)
+        if fx < 0:
+            lo = x
+        else:
+            hi = x
+        xn = x - fx / dfx if dfx else math.nan
+        if not math.isfinite(xn) or (xn - lo) * (xn - hi) > 0:
+            xn = (lo + hi) / 2
+        if abs(xn - x) <= tol or fx == 0 or abs(hi - lo) <= tol:
+            return xn
+        x = xn
+    return None
@@ -0,0 +1,344 @@
+import asyncio
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+# =============================================================
+#  CACHE PERSISTENTE SU DISCO (SQLite)
+#  Una riga per (chiave, tipo di dato). Ogni tipo ha la sua politica:
+#    fresh     -> entro questo tempo il dato si usa senza rete
+#    max_stale -> oltre "fresh" ma entro questo tempo il dato si usa subito
+#                 e si rinfresca in background (stale-while-revalidate)
+#  Oltre max_stale il dato si riscarica in modo sincrono.
+#  Anche le risposte vuote (societa' senza dividendi, prospetto mancante, info
+#  vuota) si salvano, come marcatore negativo: fresche per al piu' EMPTY_FRESH,
+#  poi si riprovano. Un rinfresco in background vuoto non sovrascrive un
+#  dato pieno (di solito e' un errore momentaneo del fornitore).
+#  Dimensione totale limitata: si eliminano le voci usate meno di recente.
+#  Condivisa fra processi (repliche Streamlit, batch, CLI) che puntano alla
+#  stessa cartella. Un solo download per chiave alla volta (single-flight):
+#  chi trova la voce mancante prende un lease nella tabella `leases`; gli
+#  altri processi (e thread) aspettano che la voce compaia invece di
+#  scaricarla di nuovo. Un lease non rilasciato entro LEASE_TTL (processo
+#  morto) si considera abbandonato e lo prende il primo che aspetta.
+#  Contatori: hit, stale, miss (download), dedup (atteso il download di un
+#  altro), error; per processo (stats) e sommati su tutti (shared_stats).
+#  Gli storici prezzi stanno a parte, in <dir>/prices (valutatore.prices):
+#  la voce <ticker>:history ne tiene solo il riassunto, per freschezza e
+#  single-flight dell'aggiornamento incrementale.
+# =============================================================
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+
+POLICY = {
+    "statements": (3 * DAY, 120 * DAY),   # bilanci annuali: cambiano una volta a trimestre
+    "info":       (6 * HOUR, 7 * DAY),
+    "dividends":  (1 * DAY, 30 * DAY),
+    "prices":     (10 * MINUTE, 7 * DAY),
+    "fx":         (12 * HOUR, 30 * DAY),      # storici dei cambi (valuta di bilancio -> prezzo)
+}
+
+DEFAULT_DIR = Path.home() / ".cache" / "valutatore"
+DEFAULT_MAX_MB = 256
+EMPTY_FRESH = 12 * HOUR      # tetto alla freschezza delle risposte vuote
+LEASE_TTL = 60.0             # un download piu' lungo di cosi' si considera abbandonato
+POLL = (0.05, 0.5)           # attesa fra due controlli: da 50 ms, raddoppia fino a 0.5 s
+STATS_FLUSH = 5.0            # secondi fra due scritture dei contatori condivisi
+COUNTERS = ("hit", "stale", "miss", "dedup", "error")
+
+
+def _is_empty(v):
+    if v is None:
+        return True
+    empty = getattr(v, "empty", None)
+    if isinstance(empty, bool):
+        return empty
+    return isinstance(v, dict) and not v
+
+
+class FundamentalsStore:
+    """Cache chiave -> oggetto Python (DataFrame, Series, dict) persistita in SQLite."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, policy=None):
+        self.dir = Path(directory or DEFAULT_DIR)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.dir / "fundamentals.sqlite"
+        self.max_bytes = max_bytes
+        self.policy = dict(POLICY, **(policy or {}))
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="store-revalidate")
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self.lease_ttl = LEASE_TTL
+        self._counts = Counter()
+        self._owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._flushed = 0.0
+        self._prices = None
+        with self._conn() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("""CREATE TABLE IF NOT EXISTS entries(
+                key TEXT PRIMARY KEY, kind TEXT NOT NULL, fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL, size INTEGER NOT NULL, payload BLOB NOT NULL)""")
+            c.execute("CREATE TABLE IF NOT EXISTS leases(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+            c.execute(f"""CREATE TABLE IF NOT EXISTS stats(owner TEXT PRIMARY KEY, updated REAL NOT NULL,
+                {", ".join(f"{k} INTEGER NOT NULL" for k in COUNTERS)})""")
+
+    @classmethod
+    def from_env(cls):
+        """Configurazione da variabili d'ambiente VALUTATORE_CACHE_DIR / VALUTATORE_CACHE_MAX_MB."""
+        mb = float(os.environ.get("VALUTATORE_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        return cls(os.environ.get("VALUTATORE_CACHE_DIR") or None, int(mb * 1024 * 1024))
+
+    @property
+    def prices(self):
+        """Storici prezzi giornalieri della stessa cartella (valutatore.prices.PriceStore)."""
+        if self._prices is None:
+            from .prices import PriceStore
+            self._prices = PriceStore(self.dir / "prices")
+        return self._prices
+
+    @contextmanager
+    def _conn(self):
+        c = sqlite3.connect(self.path, timeout=30)
+        try:
+            with c:  # commit / rollback
+                yield c
+        finally:
+            c.close()
+
+    # ---------- lettura / scrittura ----------
+    def get(self, key):
+        """(valore, eta' in secondi) oppure (None, None) se assente."""
+        with self._conn() as c:
+            r = c.execute("SELECT fetched_at, payload FROM entries WHERE key=?", (key,)).fetchone()
+            if r is None:
+                return None, None
+            c.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+        return pickle.loads(r[1]), time.time() - r[0]
+
+    def is_fresh(self, key, kind):
+        """True se la voce esiste ed e' entro la finestra "fresh" del suo tipo (senza leggerla)."""
+        with self._conn() as c:
+            r = c.execute("SELECT fetched_at FROM entries WHERE key=?", (key,)).fetchone()
+        return r is not None and time.time() - r[0] <= self.policy[kind][0]
+
+    def fetched_at(self, keys):
+        """{chiave: istante del download} delle voci presenti (senza leggerle)."""
+        keys = list(keys)
+        with self._conn() as c:
+            rows = c.execute(f"SELECT key, fetched_at FROM entries WHERE key IN ({','.join('?' * len(keys))})",
+                             keys).fetchall() if keys else []
+        return dict(rows)
+
+    def put(self, key, kind, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._conn() as c:
+            c.execute("INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?)",
+                      (key, kind, now, now, len(blob), blob))
+        self.evict()
+
+    def evict(self):
+        """Rispetta il tetto di dimensione eliminando le voci meno usate (LRU)."""
+        with self._conn() as c:
+            total = c.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            target = int(self.max_bytes * 0.9)
+            removed = 0
+            for key, size in c.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+                if total <= target:
+                    break
+                c.execute("DELETE FROM entries WHERE key=?", (key,))
+                total -= size; removed += 1
+        return removed
+
+    def clear(self):
+        with self._conn() as c:
+            c.execute("DELETE FROM entries")
+            c.execute("DELETE FROM leases")
+        self.prices.clear()
+
+    # ---------- contatori ----------
+    def _count(self, what, flush=False):
+        with self._lock:
+            self._counts[what] += 1
+        if flush or time.time() - self._flushed >= STATS_FLUSH:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Scrive i contatori di questo processo nella tabella condivisa."""
+        with self._lock:
+            self._flushed = time.time()
+            row = [self._counts[k] for k in COUNTERS]
+        with self._conn() as c:
+            c.execute(f"INSERT OR REPLACE INTO stats VALUES (?,?,{','.join('?' * len(COUNTERS))})",
+                      (self._owner, time.time(), *row))
+
+    def stats(self):
+        """Contatori di questo processo: {hit, stale, miss, dedup, error}."""
+        with self._lock:
+            return {k: self._counts[k] for k in COUNTERS}
+
+    def shared_stats(self):
+        """Contatori sommati su tutti i processi che usano la cartella
+        (gli altri processi li aggiornano al piu' ogni STATS_FLUSH secondi)."""
+        self.flush_stats()
+        with self._conn() as c:
+            r = c.execute(f"SELECT {', '.join(f'COALESCE(SUM({k}),0)' for k in COUNTERS)}, COUNT(*) FROM stats").fetchone()
+        return dict(zip(COUNTERS + ("processes",), r))
+
+    # ---------- single-flight fra processi ----------
+    def _claim(self, key):
+        """Prende il lease del download di `key`: token se riuscito, None se lo tiene un altro."""
+        token, now = uuid.uuid4().hex, time.time()
+        with self._conn() as c:
+            cur = c.execute("""INSERT INTO leases VALUES (?,?,?) ON CONFLICT(key) DO UPDATE
+                               SET owner=excluded.owner, expires=excluded.expires WHERE leases.expires < ?""",
+                            (key, token, now + self.lease_ttl, now))
+        return token if cur.rowcount == 1 else None
+
+    def _release(self, key, token):
+        with self._conn() as c:
+            c.execute("DELETE FROM leases WHERE key=? AND owner=?", (key, token))
+
+    def _poll(self, key, since):
+        """Download in corso altrove: ("done", valore) se la voce e' stata scritta dopo `since`,
+        ("free", None) se il lease e' stato rilasciato (o e' scaduto) senza risultato, ("wait", None)."""
+        with self._conn() as c:
+            r = c.execute("SELECT fetched_at FROM entries WHERE key=?", (key,)).fetchone()
+            lease = c.execute("SELECT expires FROM leases WHERE key=?", (key,)).fetchone()
+        if r is not None and r[0] >= since:
+            return "done", self.get(key)[0]
+        if lease is None or lease[0] < time.time():
+            return "free", None
+        return "wait", None
+
+    def _flight(self, key, kind, since):
+        """Un passo del single-flight: ("own", token) -> scaricare e poi rilasciare il lease;
+        ("done", valore) -> scritto da un altro; ("wait" | "free", None) -> riprovare."""
+        token = self._claim(key)
+        if token is not None:
+            state, value = self._lookup(key, kind)
+            if state != "fresh":
+                return "own", token
+            self._release(key, token)   # scritto da un altro fra la lettura e il lease
+            return "done", value
+        status, value = self._poll(key, since)
+        return status, value
+
+    # ---------- politica di freschezza ----------
+    def _lookup(self, key, kind):
+        """("fresh" | "stale" | "expired" | "missing", valore)"""
+        fresh, max_stale = self.policy[kind]
+        value, age = self.get(key)
+        if age is None:
+            return "missing", None
+        if _is_empty(value):
+            fresh = min(fresh, EMPTY_FRESH)
+        if age <= fresh:
+            return "fresh", value
+        return ("stale" if age <= max_stale else "expired"), value
+
+    def get_or_fetch(self, key, kind, fetch):
+        """Ritorna il dato in cache se fresco; se scaduto ma entro max_stale lo ritorna
+        subito e lo rinfresca in background; altrimenti chiama fetch() e lo salva.
+        Se un altro processo lo sta gia' scaricando, aspetta quel risultato.
+        Se fetch() fallisce e c'e' una copia vecchia, ritorna quella."""
+        state, value = self._lookup(key, kind)
+        if state == "fresh":
+            self._count("hit")
+            return value
+        if state == "stale":
+            self._count("stale")
+            self._revalidate(key, kind, fetch, value)
+            return value
+        since, delay = time.time(), POLL[0]
+        while True:
+            step, got = self._flight(key, kind, since)
+            if step == "own":
+                break
+            if step == "done":
+                self._count("dedup", flush=True)
+                return got
+            if step == "wait":
+                time.sleep(delay)
+                delay = min(delay * 2, POLL[1])
+        try:
+            self._count("miss", flush=True)
+            try:
+                new = fetch()
+            except Exception:
+                self._count("error", flush=True)
+                if state == "expired":
+                    return value
+                raise
+            self.put(key, kind, new)
+            return new
+        finally:
+            self._release(key, got)
+
+    async def aget_or_fetch(self, key, kind, afetch):
+        """Come get_or_fetch, con `afetch` coroutine function. Il rinfresco in background
+        gira nel pool del negozio, con un proprio event loop."""
+        state, value = self._lookup(key, kind)
+        if state == "fresh":
+            self._count("hit")
+            return value
+        if state == "stale":
+            self._count("stale")
+            self._revalidate(key, kind, lambda: asyncio.run(afetch()), value)
+            return value
+        since, delay = time.time(), POLL[0]
+        while True:
+            step, got = self._flight(key, kind, since)
+            if step == "own":
+                break
+            if step == "done":
+                self._count("dedup", flush=True)
+                return got
+            if step == "wait":
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, POLL[1])
+        try:
+            self._count("miss", flush=True)
+            try:
+                new = await afetch()
+            except Exception:
+                self._count("error", flush=True)
+                if state == "expired":
+                    return value
+                raise
+            self.put(key, kind, new)
+            return new
+        finally:
+            self._release(key, got)
+
+    def _revalidate(self, key, kind, fetch, old=None):
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def job():
+            token = self._claim(key)   # un altro processo sta gia' rinfrescando: niente da fare
+            try:
+                if token is not None:
+                    new = fetch()
+                    if not _is_empty(new) or _is_empty(old):
+                        self.put(key, kind, new)
+            except Exception:
+                pass  # la copia vecchia resta valida fino a max_stale
+            finally:
+                if token is not None:
+                    self._release(key, token)
+                with self._lock:
+                    self._inflight.discard(key)
+        self._pool.submit(job)
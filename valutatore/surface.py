@@ -0,0 +1,96 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from .dcf import dcf_kernel
+
+# =============================================================
+#  SUPERFICIE DI SENSITIVITA' DEL DCF
+#  Due parametri qualsiasi fra WACC, crescita terminale, crescita FCF e
+#  anni espliciti su una griglia fitta, in un'unica chiamata vettoriale.
+# =============================================================
+
+VARIABLES = {"wacc": "WACC", "term_g": "Crescita terminale", "g_fcf": "Crescita FCF", "years": "Anni espliciti"}
+
+
+class Surface(NamedTuple):
+    x_var: str
+    y_var: str
+    x: np.ndarray
+    y: np.ndarray
+    fair_value: np.ndarray   # forma (len(y), len(x)); NaN dove WACC <= crescita terminale
+
+
+def default_range(var, base):
+    """Intervallo di default attorno al valore corrente del parametro."""
+    if var == "wacc":
+        return max(0.005, base["wacc"] - 0.03), base["wacc"] + 0.03
+    if var == "term_g":
+        return max(0.0, base["term_g"] - 0.02), base["term_g"] + 0.02
+    if var == "g_fcf":
+        return base["g_fcf"] - 0.10, base["g_fcf"] + 0.10
+    return 3, 20
+
+
+def sensitivity_surface(fcf0, base, net_debt, shares, x_var, y_var, n=120, ranges=None):
+    """Fair value per azione su una griglia n x n. `base`: {"wacc", "term_g", "g_fcf", "years"}.
+    Gli anni sono interi: l'asse ha al massimo un punto per anno."""
+    if x_var == y_var:
+        raise ValueError("Servono due parametri diversi")
+    ranges = ranges or {}
+    axes = {}
+    for v in (x_var, y_var):
+        lo, hi = ranges.get(v) or default_range(v, base)
+        axes[v] = np.unique(np.round(np.linspace(lo, hi, n)).astype(int)) if v == "years" else np.linspace(lo, hi, n)
+    p = {k: base[k] for k in VARIABLES}
+    p[x_var] = axes[x_var][None, :]
+    p[y_var] = axes[y_var][:, None]
+    fv = dcf_kernel(fcf0, p["g_fcf"], p["years"], p["term_g"], p["wacc"], net_debt, shares).fair_value
+    return Surface(x_var, y_var, axes[x_var], axes[y_var], fv)
+
+
+def sensitivity_grid(fcf0, g, years, term_g, discount, net_debt, shares,
+                     wacc_steps=(-0.015, -0.0075, 0, 0.0075, 0.015), tg_steps=(-0.01, -0.005, 0, 0.005, 0.01)):
+    """Griglia 5x5 della pagina: righe = WACC, colonne = crescita terminale (non sotto zero)."""
+    wacc_range = discount + np.asarray(wacc_steps)
+    tg_range = np.maximum(0.0, term_g + np.asarray(tg_steps))
+    fv = dcf_kernel(fcf0, g, years, tg_range[None, :], wacc_range[:, None], net_debt, shares).fair_value
+    return Surface("term_g", "wacc", tg_range, wacc_range, fv)
+
+
+def surface_figure(surf, price, kind="heatmap", currency=""):
+    """Figura Plotly: mappa di calore (o superficie 3D) con la curva di livello al prezzo attuale."""
+    import plotly.graph_objects as go  # solo quando serve il grafico
+
+    def axis(var, values):
+        return (values * 100, f"{VARIABLES[var]} (%)") if var != "years" else (values, VARIABLES[var])
+
+    x, xt = axis(surf.x_var, surf.x)
+    y, yt = axis(surf.y_var, surf.y)
+    z = surf.fair_value
+    finite = z[np.isfinite(z)]
+    # scala centrata sul prezzo: verde sopra, rosso sotto
+    span = float(np.nanpercentile(np.abs(finite - price), 95)) if finite.size and price else None
+    color = dict(colorscale="RdYlGn", zmid=price) if price else dict(colorscale="RdYlGn")
+    if span:
+        color.update(zmin=price - span, zmax=price + span)
+    hover = f"{xt}: %{{x:.2f}}<br>{yt}: %{{y:.2f}}<br>Fair value: %{{z:,.2f}} {currency}<extra></extra>"
+    if kind == "surface":
+        surf3d = go.Surface(x=x, y=y, z=z, cmin=color.get("zmin"), cmax=color.get("zmax"), colorscale="RdYlGn",
+                            colorbar=dict(title=f"FV {currency}"), hovertemplate=hover)
+        if price:
+            surf3d.update(contours_z=dict(show=True, start=price, end=price, size=max(abs(price), 1.0),
+                                          color="black", width=4))
+        fig = go.Figure(surf3d)
+        fig.update_layout(scene=dict(xaxis_title=xt, yaxis_title=yt, zaxis_title=f"Fair value {currency}"))
+    else:
+        fig = go.Figure(go.Heatmap(x=x, y=y, z=z, colorbar=dict(title=f"FV {currency}"),
+                                   hovertemplate=hover, **color))
+        if price:
+            fig.add_trace(go.Contour(x=x, y=y, z=z, showscale=False, hoverinfo="skip",
+                                     contours=dict(start=price, end=price, size=1, coloring="lines",
+                                                   showlabels=True),
+                                     line=dict(color="black", width=2), name="= prezzo"))
+        fig.update_layout(xaxis_title=xt, yaxis_title=yt)
+    fig.update_layout(height=480, margin=dict(l=10, r=10, t=30, b=10))
+    return fig
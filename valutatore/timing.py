@@ -0,0 +1,130 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# =============================================================
+#  TEMPI DI ESECUZIONE PER FASE (span)
+#  Ogni fase (richiesta di rete, lettura da cache, multipli storici,
+#  modelli, sezioni della pagina) apre uno span con nome, categoria e
+#  argomenti. Gli span si leggono come riepilogo per nome, o si esportano
+#  in JSON / formato Chrome trace (chrome://tracing, ui.perfetto.dev).
+#  Disattivato (default) uno span costa un controllo di flag: nessuna
+#  misura, nessuna allocazione.
+#  Attivazione: VALUTATORE_TRACE=1 oppure TRACE.enabled = True.
+# =============================================================
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def note(self, **args):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "cat", "args", "t0")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        t1 = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer._record(self.name, self.cat, self.t0, t1 - self.t0, self.args)
+        return False
+
+    def note(self, **args):
+        """Aggiunge argomenti allo span aperto (es. esito cache noto solo alla fine)."""
+        self.args.update(args)
+
+
+class Tracer:
+    """Raccoglitore di span thread-safe. Un'istanza di processo: TRACE."""
+
+    def __init__(self, enabled=False, max_spans=100_000):
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self._spans = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+
+    def span(self, name, cat="app", **args):
+        """Context manager che misura il blocco. Se disattivato ritorna un contesto vuoto."""
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, cat, args)
+
+    def timed(self, name=None, cat="model"):
+        """Decoratore: uno span per ogni chiamata della funzione."""
+        def deco(fn):
+            label = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*a, **kw):
+                if not self.enabled:
+                    return fn(*a, **kw)
+                with _Span(self, label, cat, {}):
+                    return fn(*a, **kw)
+            return wrapper
+        return deco
+
+    def _record(self, name, cat, t0, dur, args):
+        rec = (name, cat, t0 - self._origin, dur, threading.get_ident(), dict(args))
+        with self._lock:
+            if len(self._spans) < self.max_spans:
+                self._spans.append(rec)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._origin = time.perf_counter_ns()
+
+    # ---------- lettura / esportazione ----------
+    def spans(self):
+        """Lista di dict (tempi in millisecondi dall'ultimo reset)."""
+        with self._lock:
+            recs = list(self._spans)
+        return [{"name": n, "cat": c, "start_ms": t0 / 1e6, "dur_ms": d / 1e6, "thread": tid, "args": dict(a)}
+                for n, c, t0, d, tid, a in recs]
+
+    def summary(self):
+        """Riepilogo per (categoria, nome): chiamate, totale, media e massimo in ms, ordinato per totale."""
+        agg = {}
+        for s in self.spans():
+            k = (s["cat"], s["name"])
+            n, tot, mx = agg.get(k, (0, 0.0, 0.0))
+            agg[k] = (n + 1, tot + s["dur_ms"], max(mx, s["dur_ms"]))
+        rows = [{"cat": c, "name": nm, "calls": n, "total_ms": tot, "mean_ms": tot / n, "max_ms": mx}
+                for (c, nm), (n, tot, mx) in agg.items()]
+        return sorted(rows, key=lambda r: -r["total_ms"])
+
+    def to_json(self, indent=None):
+        return json.dumps({"spans": self.spans(), "summary": self.summary()}, default=str, indent=indent)
+
+    def to_chrome_trace(self):
+        """Eventi completi ("ph": "X", microsecondi) per chrome://tracing / Perfetto."""
+        pid = os.getpid()
+        events = [{"name": s["name"], "cat": s["cat"], "ph": "X", "ts": s["start_ms"] * 1000,
+                   "dur": s["dur_ms"] * 1000, "pid": pid, "tid": s["thread"], "args": s["args"]}
+                  for s in self.spans()]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+
+TRACE = Tracer(enabled=os.environ.get("VALUTATORE_TRACE", "").lower() in ("1", "true", "yes", "on"))
+span = TRACE.span
+timed = TRACE.timed
@@ -0,0 +1,75 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .models import (MULTIPLES, ddm_applicable, ddm_gordon, dcf_fcff, fcf_base, hist_default, kd_auto,
+                     multiple_fv, net_debt, per_share_metrics, reverse_dcf_growth, verdict, wacc)
+from .peers import current_multiples, peer_default
+
+# =============================================================
+#  VALUTAZIONE COMPLETA DI UN TITOLO (senza interfaccia)
+#  Stessi modelli e stessi default della pagina Valutazione.
+# =============================================================
+
+@dataclass
+class ValuationParams:
+    rf: float = 0.035
+    erp: float = 0.055
+    beta: float = None        # None = beta del titolo
+    kd: float = None          # None = interessi / debito, limitato a 1-12% (come lo slider)
+    use_norm: bool = True
+    g_fcf: float = 0.06
+    years: int = 7
+    term_g: float = 0.02
+    g_ddm: float = 0.025
+    multiples: dict = field(default_factory=dict)   # es. {"P/E": 15.0}; mancanti = mediana storica
+    basis: str = "annual"     # "ttm" = ultimi 4 trimestri (vedi valutatore.quarterly)
+    multiple_default: str = "hist"   # "sector" = percentile `sector_q` dei peer (serve un PeerIndex)
+    sector_q: float = 50.0
+
+
+def multiples_used(D, HM, p, peers=None):
+    """{multiplo: valore usato}: forzato nei parametri, poi settore (se richiesto), poi mediana storica."""
+    out = {}
+    for key in MULTIPLES:
+        mult = p.multiples.get(key)
+        if not mult and p.multiple_default == "sector":
+            mult = peer_default(peers, D["sector"], key, p.sector_q)
+        out[key] = mult or hist_default(HM, key)[0]
+    return out
+
+
+def value_company(D, HM, p=None, peers=None):
+    """Una riga piatta con fair value per modello, reverse DCF e giudizio mediano.
+    Con `peers` (PeerIndex) aggiunge la posizione del titolo nel settore per ogni multiplo."""
+    p = p or ValuationParams()
+    price, sh = D["price"], D["shares"]
+    beta = p.beta if p.beta is not None else D["beta"]
+    kd = p.kd if p.kd is not None else round(min(max(kd_auto(D)*100, 1.0), 12.0), 1)/100  # come lo slider
+    ke = p.rf + beta*p.erp
+    wacc_val = wacc(beta, p.rf, p.erp, kd, D["tax_rate"], D["mktcap"] or 0, D["total_debt"] or 0)
+    nd = net_debt(D)
+    fcf0 = fcf_base(D, p.use_norm)
+
+    fv = {"DCF - FCFF": dcf_fcff(fcf0, p.g_fcf, p.years, p.term_g, wacc_val, nd, sh),
+          "DDM - Gordon": ddm_gordon(D["dps"], ke, p.g_ddm) if ddm_applicable(D["dps"], price) else None}
+    mults = multiples_used(D, HM, p, peers)
+    for key, metric in per_share_metrics(D, fcf0).items():
+        fv[key] = multiple_fv(metric, mults[key])
+
+    out = {"symbol": D["symbol"], "name": D["name"], "sector": D["sector"], "currency": D["currency"],
+           "price": price, "wacc": wacc_val, "ke": ke, "fcf_base": fcf0}
+    out.update({f"fv {k}": v for k, v in fv.items()})
+    out["g_implied"] = reverse_dcf_growth(price, fcf0, p.years, p.term_g, wacc_val, nd, sh) if price else None
+    fvs = [v for v in fv.values() if v is not None]
+    out["n_models"] = len(fvs)
+    out["fv_median"] = out["upside"] = out["verdict"] = None
+    if fvs and price:
+        out["fv_median"] = float(np.median(fvs))
+        out["upside"] = (out["fv_median"]/price - 1)*100
+        out["verdict"] = verdict(out["upside"])[0]
+    if peers is not None:
+        for key, r in peers.rank(D["symbol"], D["sector"], current_multiples(D, p.use_norm)).items():
+            out[f"pct {key}"] = r["percentile"]
+    return out
+
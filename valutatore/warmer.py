@@ -0,0 +1,196 @@
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .store import FundamentalsStore, MINUTE
+
+log = logging.getLogger(__name__)
+
+# =============================================================
+#  PRE-RISCALDAMENTO DELLA CACHE (watchlist)
+#  Un thread di pianificazione tiene calda la cache su disco per una lista
+#  di ticker (default PRESET): all'avvio li scarica tutti, poi rinfresca
+#  ogni ticker poco prima che la sua voce piu' vicina alla scadenza esca
+#  dalla finestra "fresh" (quota `lead` della finestra, meno un ritardo
+#  casuale fino a `jitter` secondi, per non allineare le repliche).
+#  Il rinfresco passa per una vista del negozio con finestra accorciata:
+#  le voci prossime alla scadenza risultano scadute e si riscaricano con lo
+#  stesso single-flight fra processi, le altre restano lette da cache.
+#  Limiti: `workers` ticker in volo, al massimo `budget` richieste di rete
+#  all'ora (oltre, il ticker si rimanda a quando il budget lo consente).
+#  Il modulo non importa pandas: con il pre-riscaldamento spento la pagina
+#  non paga l'import dei motori (vedi benchmarks/coldstart.py).
+# =============================================================
+
+LEAD = 0.2           # si rinfresca nell'ultimo 20% della finestra "fresh"
+JITTER = 30.0        # secondi
+RETRY = 15 * MINUTE  # voci mancanti (dato non disponibile): nuovo tentativo dopo
+MIN_GAP = MINUTE     # mai due giri sullo stesso ticker piu' vicini di cosi'
+
+
+class CacheWarmer:
+    """Tiene calda la cache su disco per una watchlist, in un thread in background."""
+
+    def __init__(self, store, tickers=None, provider=None, workers=4, budget=600, lead=LEAD, jitter=JITTER,
+                 quarterly=False):
+        from .batch import PRESET, read_tickers
+        self.store = store
+        self.tickers = read_tickers(tickers if tickers is not None else PRESET)
+        self.provider = provider
+        self.workers = workers
+        self.budget = float(budget)          # richieste all'ora
+        self.lead, self.jitter, self.quarterly = lead, jitter, quarterly
+        # stessa cartella, finestra "fresh" accorciata e niente stale: vicino alla scadenza si riscarica
+        self._warm_store = FundamentalsStore(store.dir, store.max_bytes, policy={
+            k: (fresh * (1 - lead),) * 2 for k, (fresh, _) in store.policy.items()})
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._heap = []
+        self._thread = None
+        self._tokens, self._t = self.budget, time.monotonic()
+        self.counts = {"warmed": 0, "requests": 0, "deferred": 0, "errors": 0}
+
+    @classmethod
+    def from_env(cls, store):
+        """VALUTATORE_WARM (ticker separati da virgola o spazio; vuoto = PRESET; 0 = spento),
+        VALUTATORE_WARM_WORKERS, VALUTATORE_WARM_BUDGET (richieste/ora). None se spento."""
+        spec = os.environ.get("VALUTATORE_WARM", "").strip()
+        if spec == "0":
+            return None
+        return cls(store, spec or None, workers=int(os.environ.get("VALUTATORE_WARM_WORKERS", 4)),
+                   budget=float(os.environ.get("VALUTATORE_WARM_BUDGET", 600)))
+
+    # ---------- pianificazione ----------
+    def _keys(self, symbol):
+        from .provider import STATEMENTS
+        from .quarterly import QUARTERLY
+        keys = {f"{symbol}:info": "info", f"{symbol}:history": "prices"}
+        attrs = list(STATEMENTS) + (list(QUARTERLY.values()) if self.quarterly else [])
+        keys.update({f"{symbol}:{a}": "statements" for a in attrs})
+        return keys
+
+    def _plan(self, symbol):
+        """(istante del prossimo rinfresco, richieste stimate se si rinfrescasse adesso)."""
+        keys = self._keys(symbol)
+        fetched = self.store.fetched_at(keys)
+        now = time.time()
+        dues = [fetched[k] + self.store.policy[kind][0] * (1 - self.lead) for k, kind in keys.items() if k in fetched]
+        missing = len(keys) - len(fetched)
+        due = min(dues + ([now + RETRY] if missing else []))
+        need = missing + sum(d <= now for d in dues)
+        return due - random.uniform(0, self.jitter), need
+
+    def _schedule(self, symbol, at):
+        with self._lock:
+            heapq.heappush(self._heap, (at, symbol))
+        self._wake.set()
+
+    def _spend(self, n):
+        """Prenota `n` richieste dal budget orario: 0 se disponibili, altrimenti secondi di attesa."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.budget, self._tokens + (now - self._t) * self.budget / 3600)
+            self._t = now
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            return (n - self._tokens) * 3600 / self.budget if self.budget > 0 else float("inf")
+
+    # ---------- lavoro ----------
+    def warm(self, symbol):
+        """Rinfresca subito le voci del ticker prossime alla scadenza. Ritorna le richieste di rete fatte."""
+        from .bundle import RequestCounter, fetch_bundle
+        counter = RequestCounter()
+        try:
+            fetch_bundle(symbol, self._warm_store, counter, provider=self.provider, quarterly=self.quarterly)
+        except Exception as e:
+            log.warning("warm %s: %s", symbol, e)
+            with self._lock:
+                self.counts["errors"] += 1
+        with self._lock:
+            self.counts["warmed"] += 1
+            self.counts["requests"] += counter.total
+        return counter.total
+
+    def run_once(self):
+        """Un giro sincrono su tutta la watchlist (solo i ticker con voci da rinfrescare)."""
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="warm") as pool:
+            return sum(pool.map(self.warm, [t for t in self.tickers if self._plan(t)[1]]))
+
+    def _job(self, symbol, estimate, slots):
+        try:
+            used = self.warm(symbol)
+            with self._lock:
+                self._tokens -= used - estimate   # conguaglio fra stima e richieste effettive
+        finally:
+            slots.release()
+            due, _ = self._plan(symbol)
+            self._schedule(symbol, max(due, time.time() + MIN_GAP))
+
+    def _loop(self):
+        slots = threading.BoundedSemaphore(self.workers)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="warm") as pool:
+            for t in self.tickers:   # avvio scaglionato
+                self._schedule(t, time.time() + random.uniform(0, min(self.jitter, 5.0)))
+            while not self._stop.is_set():
+                with self._lock:
+                    at, symbol = self._heap[0] if self._heap else (time.time() + 60, None)
+                wait = at - time.time()
+                if symbol is None or wait > 0:
+                    self._wake.clear()
+                    self._wake.wait(min(max(wait, 0.0), 60))
+                    continue
+                with self._lock:
+                    heapq.heappop(self._heap)
+                due, need = self._plan(symbol)
+                if need == 0:   # gia' rinfrescato (altra replica o visite degli utenti)
+                    self._schedule(symbol, max(due, time.time() + MIN_GAP))
+                    continue
+                wait = self._spend(need)
+                if wait:
+                    with self._lock:
+                        self.counts["deferred"] += 1
+                    self._schedule(symbol, time.time() + min(wait, RETRY))
+                    continue
+                slots.acquire()
+                if self._stop.is_set():
+                    slots.release()
+                    break
+                try:
+                    pool.submit(self._job, symbol, need, slots)
+                except RuntimeError:   # interprete in chiusura
+                    slots.release()
+                    break
+
+    def start(self):
+        """Avvia il thread in background (nessuno con provider non memorizzabili, es. snapshot)."""
+        from .provider import default_provider
+        provider = self.provider or default_provider()
+        if self._thread is None and provider.cacheable and self.tickers:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        with self._lock:
+            nxt = self._heap[0] if self._heap else None
+            return dict(self.counts, tickers=len(self.tickers), running=self.running,
+                        next_symbol=nxt[1] if nxt else None,
+                        next_in_s=max(0.0, nxt[0] - time.time()) if nxt else None)